@@ -0,0 +1,353 @@
+import sqlite3
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from indicators import (
+    PANEL_FIELDS,
+    compute_indicators as compute_technical,
+    format_indicator_specs,
+    history_rows,
+    indicator_columns,
+    parse_indicator_specs,
+    seed_columns,
+)
+# read back through query.StockQuery.rollups (the server's /rollups)
+from query import ROLLUP_TABLES
+
+INDICATORS_TABLE = "stock_indicators_daily"
+# the indicators of config.INDICATORS (see indicators.py)
+TECHNICAL_TABLE = "stock_technical_indicators"
+
+SMA_WINDOWS = (20, 50)
+EMA_SPANS = (12, 26)
+VOLATILITY_WINDOW = 20
+
+INDICATOR_COLUMNS = (
+    ["log_return"]
+    + [f"sma_{w}" for w in SMA_WINDOWS]
+    + [f"ema_{s}" for s in EMA_SPANS]
+    + [f"rolling_std_{VOLATILITY_WINDOW}"]
+)
+
+# closes needed before the first changed date to fill every window
+TAIL_ROWS = max(max(SMA_WINDOWS), VOLATILITY_WINDOW + 1)
+
+
+def create_tables(conn: sqlite3.Connection):
+    indicator_columns = ",\n        ".join(f"{name} REAL" for name in INDICATOR_COLUMNS)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {INDICATORS_TABLE} (
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        close_price REAL NOT NULL,
+        {indicator_columns},
+        PRIMARY KEY(symbol, date)
+    ) WITHOUT ROWID
+    """)
+
+    create_technical_table(conn, technical_specs())
+
+    for table in ROLLUP_TABLES.values():
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            symbol TEXT NOT NULL,
+            period_start DATE NOT NULL,
+            open_price REAL NOT NULL,
+            high_price REAL NOT NULL,
+            low_price REAL NOT NULL,
+            close_price REAL NOT NULL,
+            volume INTEGER NOT NULL,
+            trading_days INTEGER NOT NULL,
+            PRIMARY KEY(symbol, period_start)
+        ) WITHOUT ROWID
+        """)
+
+
+def technical_specs() -> list:
+    return parse_indicator_specs(config.INDICATORS)
+
+
+def _quoted(columns: List[str]) -> List[str]:
+    # indicator names such as "return" are not safe as bare identifiers
+    return [f'"{column}"' for column in columns]
+
+
+def create_technical_table(conn: sqlite3.Connection, specs: list):
+    """
+        One REAL column per output of the configured indicators. A table
+        made for another set of indicators is dropped and recreated, and
+        every symbol is computed in full on its next load; with none
+        configured an existing table is left alone.
+    """
+    columns = indicator_columns(specs)
+    if not columns:
+        return
+
+    stored = [row[1] for row in conn.execute(f"PRAGMA table_info({TECHNICAL_TABLE})")]
+    if stored[2:] == columns:
+        return
+    if stored:
+        print(f"indicators changed to {format_indicator_specs(specs)}: recreating {TECHNICAL_TABLE}")
+        conn.execute(f"DROP TABLE {TECHNICAL_TABLE}")
+
+    technical_columns = ",\n        ".join(f"{name} REAL" for name in _quoted(columns))
+    conn.execute(f"""
+    CREATE TABLE {TECHNICAL_TABLE} (
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        {technical_columns},
+        PRIMARY KEY(symbol, date)
+    ) WITHOUT ROWID
+    """)
+
+
+def _read_rows(conn: sqlite3.Connection, symbol: str, from_date: Optional[str], columns: List[str],
+               tail_rows: int) -> pd.DataFrame:
+    select = ", ".join(["date", *columns])
+    if from_date is None:
+        rows = conn.execute(
+            f"SELECT {select} FROM {config.TABLE_NAME} WHERE symbol = ? ORDER BY date",
+            (symbol,)
+        ).fetchall()
+        return pd.DataFrame(rows, columns=["date", *columns])
+
+    tail = conn.execute(
+        f"SELECT {select} FROM {config.TABLE_NAME} "
+        f"WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT ?",
+        (symbol, from_date, tail_rows)
+    ).fetchall()
+    changed = conn.execute(
+        f"SELECT {select} FROM {config.TABLE_NAME} "
+        f"WHERE symbol = ? AND date >= ? ORDER BY date",
+        (symbol, from_date)
+    ).fetchall()
+    return pd.DataFrame(tail[::-1] + changed, columns=["date", *columns])
+
+
+def _read_closes(conn: sqlite3.Connection, symbol: str, from_date: Optional[str]) -> pd.DataFrame:
+    return _read_rows(conn, symbol, from_date, ["close_price"], TAIL_ROWS)
+
+
+def compute_indicators(closes: pd.DataFrame, ema_seed: Optional[dict] = None, first_changed: int = 0) -> pd.DataFrame:
+    """
+        Indicators for closes[first_changed:]; the rows before it are the
+        window tail. With ema_seed (EMA values of the last row before
+        first_changed) the EMAs continue that recursion instead of
+        restarting, so an incremental update matches a full recompute.
+    """
+    close = closes["close_price"]
+    out = closes[["date", "close_price"]].copy()
+
+    out["log_return"] = np.log(close).diff()
+
+    for window in SMA_WINDOWS:
+        out[f"sma_{window}"] = close.rolling(window, min_periods=window).mean()
+
+    for span in EMA_SPANS:
+        seed = ema_seed.get(f"ema_{span}") if ema_seed else None
+        if seed is None:
+            out[f"ema_{span}"] = close.ewm(span=span, adjust=False).mean()
+        else:
+            seeded = pd.concat([pd.Series([seed]), close.iloc[first_changed:]], ignore_index=True)
+            ema = np.full(len(close), np.nan)
+            ema[first_changed:] = seeded.ewm(span=span, adjust=False).mean().to_numpy()[1:]
+            out[f"ema_{span}"] = ema
+
+    out[f"rolling_std_{VOLATILITY_WINDOW}"] = (
+        out["log_return"].rolling(VOLATILITY_WINDOW, min_periods=VOLATILITY_WINDOW).std()
+    )
+    return out.iloc[first_changed:]
+
+
+def update_indicators(conn: sqlite3.Connection, symbol: str, from_date: Optional[str]) -> int:
+    seed = None
+
+    if from_date is not None:
+        ema_columns = [f"ema_{s}" for s in EMA_SPANS]
+        row = conn.execute(
+            f"SELECT {', '.join(ema_columns)} FROM {INDICATORS_TABLE} "
+            f"WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT 1",
+            (symbol, from_date)
+        ).fetchone()
+
+        if row is not None:
+            seed = dict(zip(ema_columns, row))
+        elif conn.execute(
+            f"SELECT 1 FROM {config.TABLE_NAME} WHERE symbol = ? AND date < ? LIMIT 1",
+            (symbol, from_date)
+        ).fetchone():
+            # older rows exist but were never processed: start from scratch
+            from_date = None
+
+    closes = _read_closes(conn, symbol, from_date)
+    if closes.empty:
+        return 0
+
+    first_changed = int((closes["date"] < from_date).sum()) if from_date is not None else 0
+    indicators = compute_indicators(closes, seed, first_changed)
+
+    # NaN (windows not yet full) is stored as NULL by sqlite3
+    columns = ["date", "close_price"] + INDICATOR_COLUMNS
+    placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {INDICATORS_TABLE} (symbol, {', '.join(columns)}) VALUES ({placeholders})",
+        [(symbol, *values) for values in indicators[columns].itertuples(index=False)]
+    )
+    return len(indicators)
+
+
+def _technical_seed(conn: sqlite3.Connection, symbol: str, from_date: Optional[str], seeded: List[str]):
+    """
+        (from_date, seed) to compute the symbol's technical indicators from:
+        the seed_columns values stored for the bar before from_date, or
+        from_date None (recompute the whole symbol) if that bar was never
+        processed or its averages have not started yet.
+    """
+    if from_date is None:
+        return None, None
+
+    previous = conn.execute(
+        f"SELECT MAX(date) FROM {config.TABLE_NAME} WHERE symbol = ? AND date < ?",
+        (symbol, from_date)
+    ).fetchone()[0]
+    if previous is None:
+        return from_date, None
+
+    row = conn.execute(
+        f"SELECT {', '.join(_quoted(seeded)) or '1'} FROM {TECHNICAL_TABLE} WHERE symbol = ? AND date = ?",
+        (symbol, previous)
+    ).fetchone()
+    if row is None or None in row:
+        return None, None
+    return from_date, dict(zip(seeded, row))
+
+
+def update_technical(conn: sqlite3.Connection, starts: Dict[str, Optional[str]]) -> Dict[str, int]:
+    """
+        The configured indicators for the rows of each symbol on or after
+        its start date (None: all of them), computed from the stored
+        history: the windows read the bars before it, and ATR/RSI continue
+        from their values stored for the previous bar (so the result
+        matches a full recompute, whatever an incremental extract fetched).
+        All the symbols are stacked into one panel and computed together
+        (see indicators.compute_indicators). Returns the rows written per
+        symbol.
+    """
+    specs = technical_specs()
+    columns = indicator_columns(specs)
+    if not columns:
+        return {}
+
+    seeded = seed_columns(specs)
+    frames, seeds, first_changed = [], {}, {}
+
+    for symbol, from_date in starts.items():
+        from_date, seed = _technical_seed(conn, symbol, from_date, seeded)
+        bars = _read_rows(conn, symbol, from_date, list(PANEL_FIELDS), history_rows(specs))
+        if bars.empty:
+            continue
+
+        first_changed[symbol] = int((bars["date"] < from_date).sum()) if from_date is not None else 0
+        if seed is not None:
+            seeds[symbol] = seed
+        frames.append(bars.assign(symbol=symbol))
+
+    if not frames:
+        return {}
+
+    panel = pd.concat(frames, ignore_index=True)
+    values = compute_technical(panel, specs, seeds, first_changed)
+    # the history rows before each symbol's first changed bar are only read
+    changed = (panel.groupby("symbol", sort=False).cumcount() >= panel["symbol"].map(first_changed)).to_numpy()
+
+    # NaN (windows not yet full) is stored as NULL by sqlite3
+    placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {TECHNICAL_TABLE} (symbol, date, {', '.join(_quoted(columns))}) "
+        f"VALUES ({placeholders})",
+        [(symbol, day, *row) for symbol, day, row in zip(panel["symbol"][changed], panel["date"][changed],
+                                                          values.loc[changed, columns].itertuples(index=False))]
+    )
+    written = panel.loc[changed, "symbol"].value_counts()
+    print(f"   technical indicators ({format_indicator_specs(specs)}): "
+          f"{int(changed.sum())} rows for {len(first_changed)} symbols")
+    return {symbol: int(written.get(symbol, 0)) for symbol in first_changed}
+
+
+def _period_start(dates: pd.Series, period: str) -> pd.Series:
+    if period == "weekly":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+    return dates.dt.to_period("M").dt.start_time
+
+
+def update_rollups(conn: sqlite3.Connection, symbol: str, from_date: Optional[str]) -> int:
+    written = 0
+
+    for period, table in ROLLUP_TABLES.items():
+        start = None
+        if from_date is not None:
+            start = _period_start(pd.Series(pd.to_datetime([from_date])), period).iloc[0]
+            start = start.strftime("%Y-%m-%d")
+
+        # recompute every period from the first one touched
+        query = (f"SELECT date, open_price, high_price, low_price, close_price, volume "
+                 f"FROM {config.TABLE_NAME} WHERE symbol = ?")
+        params = [symbol]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start)
+        rows = conn.execute(query + " ORDER BY date", params).fetchall()
+        if not rows:
+            continue
+
+        bars = pd.DataFrame(rows, columns=["date", "open_price", "high_price", "low_price", "close_price", "volume"])
+        bars["period_start"] = _period_start(pd.to_datetime(bars["date"]), period).dt.strftime("%Y-%m-%d")
+        grouped = bars.groupby("period_start", sort=True).agg(
+            open_price=("open_price", "first"),
+            high_price=("high_price", "max"),
+            low_price=("low_price", "min"),
+            close_price=("close_price", "last"),
+            volume=("volume", "sum"),
+            trading_days=("date", "count"),
+        ).reset_index()
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} "
+            f"(symbol, period_start, open_price, high_price, low_price, close_price, volume, trading_days) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(symbol, *values) for values in grouped.itertuples(index=False)]
+        )
+        written += len(grouped)
+
+    return written
+
+
+def update_symbol(conn: sqlite3.Connection, symbol: str, from_date: Optional[str] = None):
+    """
+        Brings the per-symbol derived tables (indicators and rollups) up to
+        date after rows on or after from_date changed (None recomputes the
+        whole symbol). Only the changed rows plus the window tail before
+        them are read. The technical indicators are computed for a batch of
+        symbols at once, see update_technical.
+    """
+    indicator_rows = update_indicators(conn, symbol, from_date)
+    rollup_rows = update_rollups(conn, symbol, from_date)
+    print(f"   analytics for {symbol}: {indicator_rows} indicator rows, {rollup_rows} rollup periods")
+
+
+def get_indicators(conn: sqlite3.Connection, symbol: str, start: Optional[date] = None,
+                   end: Optional[date] = None) -> pd.DataFrame:
+    query = f"SELECT * FROM {INDICATORS_TABLE} WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date"
+    params = (symbol, str(start or "0000-01-01"), str(end or "9999-12-31"))
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def get_technical(conn: sqlite3.Connection, symbol: str, start: Optional[date] = None,
+                  end: Optional[date] = None) -> pd.DataFrame:
+    query = f"SELECT * FROM {TECHNICAL_TABLE} WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date"
+    params = (symbol, str(start or "0000-01-01"), str(end or "9999-12-31"))
+    return pd.read_sql_query(query, conn, params=params)
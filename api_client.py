@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from metrics import metrics
+
+# Alpha Vantage answers HTTP 200 with one of these keys when it throttles us
+THROTTLE_KEYS = ("Note", "Information")
+
+
+class ApiRequestError(Exception):
+    pass
+
+
+class QuotaExhaustedError(ApiRequestError):
+    pass
+
+
+class LatencyStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = []
+            self.retries = 0
+            self.failures = 0
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            samples = sorted(self.samples)
+            retries = self.retries
+            failures = self.failures
+
+        if not samples:
+            return {"requests": 0, "retries": retries, "failures": failures}
+
+        def percentile(p: float) -> float:
+            index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return samples[index] * 1000
+
+        return {
+            "requests": len(samples),
+            "retries": retries,
+            "failures": failures,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+latency_stats = LatencyStats()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared keep-alive session, so each worker reuses pooled connections."""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=config.HTTP_POOL_SIZE,
+                pool_maxsize=config.HTTP_POOL_SIZE,
+                max_retries=0
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+
+        return _session
+
+
+def close_session():
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def backoff_delay(attempt: int) -> float:
+    # "full jitter": uniform over [0, min(cap, base * 2^attempt)]
+    ceiling = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def get_json(params: dict, limiter=None, label: str = "") -> dict:
+    """GET the API with retries on timeouts, connection errors, 5xx and throttle payloads.
+
+    Every attempt takes a token from `limiter` (if given), so retries count
+    against the same quota as first tries. Raises ApiRequestError once the
+    retries are used up and QuotaExhaustedError if the daily quota is spent.
+    """
+    session = get_session()
+    label = label or params.get("symbol", "")
+    last_error = None
+
+    for attempt in range(config.HTTP_MAX_RETRIES + 1):
+        if attempt > 0:
+            delay = backoff_delay(attempt - 1)
+            latency_stats.record_retry()
+            print(f"retrying {label} in {delay:.1f}s (attempt {attempt + 1}): {last_error}")
+            time.sleep(delay)
+
+        if limiter is not None and not limiter.acquire():
+            raise QuotaExhaustedError("daily request quota reached")
+
+        started = time.perf_counter()
+        try:
+            response = session.get(
+                config.API_BASE_URL,
+                params=params,
+                timeout=config.HTTP_TIMEOUT
+            )
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            _record_attempt(label, time.perf_counter() - started)
+            last_error = f"{type(e).__name__}: {e}"
+            continue
+        _record_attempt(label, time.perf_counter() - started)
+        metrics.add(label, "bytes_downloaded", len(response.content))
+
+        if response.status_code >= 500:
+            last_error = f"HTTP {response.status_code}"
+            continue
+
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            latency_stats.record_failure()
+            raise ApiRequestError(str(e)) from e
+
+        throttle = _throttle_message(data)
+        if throttle:
+            last_error = f"rate limit: {throttle}"
+            continue
+
+        return data
+
+    latency_stats.record_failure()
+    raise ApiRequestError(f"gave up after {config.HTTP_MAX_RETRIES + 1} attempts ({last_error})")
+
+
+def _record_attempt(label: str, elapsed: float):
+    # failed attempts count too, so http_seconds / http_requests stays a per-request mean
+    latency_stats.record(elapsed)
+    metrics.add(label, "http_seconds", elapsed)
+    metrics.add(label, "http_requests")
+
+
+def _throttle_message(data) -> Optional[str]:
+    if not isinstance(data, dict):
+        return None
+
+    for key in THROTTLE_KEYS:
+        if key in data:
+            return data[key]
+
+    return None
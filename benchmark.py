@@ -0,0 +1,1069 @@
+"""Benchmarks for the ETL stages, run against synthetic Alpha Vantage payloads.
+
+    python benchmark.py [section ...] [--symbols N] [--days M] [--repeat R]
+                        [--panel-symbols P] [--clients C] [--output FILE]
+    python benchmark.py --compare BASE.json NEW.json [--threshold PCT]
+
+Sections: parse, validate, insert, pipeline, sqlite, archive, indicators, serve,
+          intraday, lake, storage, panel
+
+The pipeline section runs main.run_etl_pipeline end to end (staged and
+streaming) against a local stub of the Alpha Vantage API and a temporary
+database. --output writes every timing as JSON; --compare reads two such
+files and flags timings that got more than PCT percent (default 10)
+slower, exiting with status 1 if any did.
+
+The indicators section runs on a panel of P symbols x M days (default
+500 x 5000), generated directly as columns rather than as payloads.
+The serve section load-tests a local server.py instance with --clients
+concurrent keep-alive clients. The intraday section appends M trading
+days of 1-minute bars to an intraday_store.IntradayStore and reads a day
+and a week back. The lake section loads the same P x M panel into SQLite
+and into lake.DataLake (Parquet and Arrow IPC) and compares panel reads.
+The storage section loads it through every storage.py backend (SQLite,
+DuckDB) and times typical analytical queries on each. The panel section
+compares the memory of P x M transformed rows held as a dict of
+DataFrames and as a panel.StockPanel.
+"""
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+# benchmarks never call the real API, but the pipeline section sends its
+# requests (to a local stub) through config.require_api_key
+os.environ.setdefault("ALPHA_VANTAGE_API_KEY", "benchmark")
+
+import config
+import indicators
+import intraday_store
+import lake
+import load
+import panel as stock_panel
+import main as pipeline
+import raw_archive
+import server
+import storage
+import transform
+from query import StockQuery
+
+DEFAULT_SYMBOLS = 5
+DEFAULT_DAYS = 5000
+DEFAULT_REPEAT = 5
+DEFAULT_PANEL_SYMBOLS = 500
+DEFAULT_CLIENTS = 8
+DEFAULT_THRESHOLD = 10.0
+SERVE_REQUESTS_PER_CLIENT = 200
+
+
+def make_payload(symbol: str, days: int, seed: int = 0, end: date = date(2025, 10, 3)) -> dict:
+    """Alpha Vantage shaped TIME_SERIES_DAILY payload: a random walk over business days, newest first."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=days)[::-1]
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    open_ = close * (1 + rng.normal(0, 0.01, days))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, days))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, days))
+    volume = rng.integers(100_000, 100_000_000, days)
+
+    time_series = {
+        d.strftime("%Y-%m-%d"): {
+            "1. open": f"{o:.4f}",
+            "2. high": f"{h:.4f}",
+            "3. low": f"{lo:.4f}",
+            "4. close": f"{c:.4f}",
+            "5. volume": str(v)
+        }
+        for d, o, h, lo, c, v in zip(dates, open_, high, low, close, volume)
+    }
+
+    return {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": dates[0].strftime("%Y-%m-%d"),
+            "4. Output Size": "Full size",
+            "5. Time Zone": "US/Eastern"
+        },
+        "Time Series (Daily)": time_series
+    }
+
+
+@lru_cache(maxsize=1)
+def make_payloads(symbols: int, days: int) -> dict:
+    print(f"generating {symbols} symbols x {days} days...")
+    return {f"SYM{i:04d}": make_payload(f"SYM{i:04d}", days, seed=i) for i in range(symbols)}
+
+
+def make_panel(symbols: int, days: int, seed: int = 0, end: date = date(2025, 10, 3)) -> pd.DataFrame:
+    """Stacked transformed-frame panel (symbol, date, prices, volume), the random walk of make_payload."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=days).date
+    shape = (symbols, days)
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=1))
+    open_ = close * (1 + rng.normal(0, 0.01, shape))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, shape))
+
+    return pd.DataFrame({
+        "symbol": np.repeat([f"SYM{i:04d}" for i in range(symbols)], days),
+        "date": np.tile(dates, symbols),
+        "open_price": open_.ravel(),
+        "high_price": high.ravel(),
+        "low_price": low.ravel(),
+        "close_price": close.ravel(),
+        "volume": rng.integers(100_000, 100_000_000, symbols * days),
+    })
+
+
+def time_call(func, repeat: int, setup: Optional[Callable] = None) -> dict:
+    """Best and mean wall time of `repeat` calls; setup() runs untimed before each one."""
+    timings = []
+
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+    return {"best_s": min(timings), "mean_s": sum(timings) / len(timings)}
+
+
+def report(name: str, result: dict, rows: int = 0):
+    line = f"  {name:<44} best {result['best_s'] * 1000:9.2f}ms  mean {result['mean_s'] * 1000:9.2f}ms"
+    if rows:
+        line += f"  ({rows / result['best_s']:,.0f} rows/s)"
+    print(line)
+
+
+def parse_rowwise(data: dict, symbol: str) -> pd.DataFrame:
+    # the original dict-per-row parser, kept as the baseline
+    rows = []
+
+    for date_str, values in data["Time Series (Daily)"].items():
+        rows.append({
+            "date": date_str,
+            "open": float(values["1. open"]),
+            "high": float(values["2. high"]),
+            "low": float(values["3. low"]),
+            "close": float(values["4. close"]),
+            "volume": int(values["5. volume"])
+        })
+
+    df = pd.DataFrame(rows)
+    df["date"] = pd.to_datetime(df["date"])
+    return df.sort_values("date").reset_index(drop=True)
+
+
+def bench_parse(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("parse_alpha_vantage_data")
+    rows = sum(len(p["Time Series (Daily)"]) for p in payloads.values())
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for symbol, payload in payloads.items():
+            pd.testing.assert_frame_equal(
+                transform.parse_alpha_vantage_data(payload, symbol),
+                parse_rowwise(payload, symbol)
+            )
+
+    results = {
+        "rowwise": time_call(lambda: [parse_rowwise(p, s) for s, p in payloads.items()], repeat),
+        "columnar": time_call(
+            lambda: [transform.parse_alpha_vantage_data(p, s) for s, p in payloads.items()], repeat
+        ),
+    }
+    for name, result in results.items():
+        report(name, result, rows)
+
+    print(f"  speedup: {results['rowwise']['best_s'] / results['columnar']['best_s']:.1f}x")
+    return results
+
+
+def make_frames(payloads: dict) -> dict:
+    frames = {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for symbol, payload in payloads.items():
+            df = transform.parse_alpha_vantage_data(payload, symbol)
+            df["symbol"] = symbol
+            df = transform.calculate_daily_change(df)
+            frames[symbol], _ = transform.validate_columns(df, symbol)
+
+    return frames
+
+
+def make_unvalidated_frames(payloads: dict) -> dict:
+    # what validate_columns / validate_with_pydantic receive in transform_stock_data
+    frames = {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for symbol, payload in payloads.items():
+            df = transform.parse_alpha_vantage_data(payload, symbol)
+            df["symbol"] = symbol
+            frames[symbol] = transform.calculate_daily_change(df)
+
+    return frames
+
+
+def bench_validate(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("validation (columnar checks vs Pydantic model)")
+    frames = make_unvalidated_frames(payloads)
+    rows = sum(len(df) for df in frames.values())
+    stamp = datetime.now()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for symbol, df in frames.items():
+            columnar, _ = transform.validate_columns(df, symbol, stamp)
+            pydantic = transform.records_to_frame(transform.validate_with_pydantic(df, symbol, stamp))
+            pd.testing.assert_frame_equal(columnar, pydantic)
+
+    results = {
+        "columnar": time_call(lambda: [transform.validate_columns(df, s) for s, df in frames.items()], repeat),
+        # the model path is slow enough that fewer runs are representative
+        "pydantic": time_call(
+            lambda: [transform.validate_with_pydantic(df, s) for s, df in frames.items()], max(repeat // 5, 1)
+        ),
+    }
+    for name, result in results.items():
+        report(name, result, rows)
+
+    print(f"  speedup: {results['pydantic']['best_s'] / results['columnar']['best_s']:.1f}x")
+    return results
+
+
+def bench_insert(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("insert_data into an empty database (one transaction)")
+    frames = make_frames(payloads)
+    rows = sum(len(df) for df in frames.values())
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "insert.db"
+        connections = []
+
+        def setup():
+            connections.append(create_database(db_path))
+
+        def insert_all():
+            conn = connections.pop()
+            try:
+                for symbol, df in frames.items():
+                    load.insert_data(conn, df, symbol, commit=False)
+                conn.commit()
+            finally:
+                conn.close()
+
+        with patched_config(ANALYTICS_ENABLED=False):
+            results["insert"] = time_call(insert_all, repeat, setup)
+        report("insert", results["insert"], rows)
+
+    return results
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Answers every query with the pre-encoded payload of its symbol."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        symbol = parse_qs(urlsplit(self.path).query).get("symbol", [""])[0]
+        body = self.server.bodies.get(symbol, b'{"Error Message": "Invalid API call."}')
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_api(payloads: dict) -> ThreadingHTTPServer:
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+    stub.daemon_threads = True
+    stub.bodies = {symbol: json.dumps(payload).encode("utf-8") for symbol, payload in payloads.items()}
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    return stub
+
+
+def bench_pipeline(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("end-to-end pipeline (stub API, temporary database)")
+    rows = sum(len(p["Time Series (Daily)"]) for p in payloads.values())
+    results = {}
+    stub = start_stub_api(payloads)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            overrides = {
+                "API_BASE_URL": f"http://127.0.0.1:{stub.server_port}/query",
+                "STOCK_SYMBOLS": list(payloads),
+                "RAW_DATA_DIR": root / "raw_data",
+                "DATABASE_PATH": root / "database" / "stock_data.db",
+                "LOGS_DIR": root / "logs",
+                # no rate limiting against the stub
+                "API_REQUESTS_PER_MINUTE": 10 ** 9,
+                "API_REQUESTS_PER_DAY": 0,
+                "API_BURST": len(payloads),
+                "HTTP_MAX_RETRIES": 0,
+                "METRICS_PROMETHEUS": False,
+            }
+
+            def setup():
+                # every run starts from an empty database and raw_data/
+                shutil.rmtree(root, ignore_errors=True)
+                for name in ("RAW_DATA_DIR", "LOGS_DIR", "DATABASE_PATH"):
+                    path = overrides[name]
+                    (path.parent if name == "DATABASE_PATH" else path).mkdir(parents=True, exist_ok=True)
+
+            for mode in ("staged", "stream"):
+                def run():
+                    if not pipeline.run_etl_pipeline(stream=mode == "stream"):
+                        raise RuntimeError(f"{mode} pipeline run failed")
+
+                with patched_config(**overrides):
+                    results[mode] = time_call(run, repeat, setup)
+                report(mode, results[mode], rows)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+    return results
+
+
+@contextlib.contextmanager
+def patched_config(**overrides):
+    saved = {name: getattr(config, name) for name in overrides}
+
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+# the SQLite defaults plus the indexes the loader used to create
+LEGACY_PROFILE = {
+    "SQLITE_JOURNAL_MODE": "DELETE",
+    "SQLITE_SYNCHRONOUS": "FULL",
+    "SQLITE_MMAP_SIZE": 0,
+    "SQLITE_CACHE_SIZE": -2000,
+    "SQLITE_TEMP_STORE": "DEFAULT",
+    "SQLITE_WITHOUT_ROWID": False,
+}
+LEGACY_INDEXES = {
+    "idx_symbol": "(symbol)",
+    "idx_symbol_date": "(symbol, date)",
+}
+
+STORAGE_PROFILES = {
+    "legacy": LEGACY_PROFILE,
+    "tuned": {"SQLITE_WITHOUT_ROWID": False},
+    "tuned_without_rowid": {"SQLITE_WITHOUT_ROWID": True},
+}
+
+
+def create_database(db_path: Path, legacy: bool = False) -> sqlite3.Connection:
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    conn = load.get_database_connection(db_path)
+    load.create_table_if_not_exists(conn)
+    load.create_index_if_not_exists(conn)
+
+    if legacy:
+        for name, columns in LEGACY_INDEXES.items():
+            conn.execute(f"CREATE INDEX {name} ON {config.TABLE_NAME}{columns}")
+        conn.commit()
+
+    return conn
+
+
+def fill_database(db_path: Path, frames: dict, legacy: bool = False):
+    conn = create_database(db_path, legacy)
+
+    try:
+        # one commit per symbol, so the durability settings show up
+        for symbol, df in frames.items():
+            load.insert_data(conn, df, symbol)
+    finally:
+        conn.close()
+
+
+def storage_queries(frames: dict) -> dict:
+    symbol = next(iter(frames))
+    dates = frames[symbol]["date"]
+    middle = dates.iloc[len(dates) // 2].isoformat()
+    start = dates.iloc[max(len(dates) // 2 - 250, 0)].isoformat()
+
+    return {
+        "one_symbol_year": (
+            f"SELECT date, close_price FROM {config.TABLE_NAME} "
+            f"WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (symbol, start, middle)
+        ),
+        "latest_per_symbol": (
+            f"SELECT symbol, MAX(date), close_price FROM {config.TABLE_NAME} GROUP BY symbol",
+            ()
+        ),
+        "cross_section_one_date": (
+            f"SELECT symbol, close_price FROM {config.TABLE_NAME} WHERE date = ?",
+            (middle,)
+        ),
+    }
+
+
+def bench_sqlite(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("sqlite storage profiles")
+    frames = make_frames(payloads)
+    rows = sum(len(df) for df in frames.values())
+    queries = storage_queries(frames)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile, overrides in STORAGE_PROFILES.items():
+            legacy = profile == "legacy"
+            db_path = Path(tmp) / f"{profile}.db"
+
+            with patched_config(**overrides):
+                result = {"insert": time_call(lambda: fill_database(db_path, frames, legacy), repeat)}
+                report(f"{profile}: insert", result["insert"], rows)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    conn = load.get_database_connection(db_path)
+                try:
+                    for name, (sql, params) in queries.items():
+                        result[name] = time_call(lambda: conn.execute(sql, params).fetchall(), repeat * 10)
+                        report(f"{profile}: {name}", result[name])
+                finally:
+                    conn.close()
+
+            results[profile] = result
+
+    return results
+
+
+def archive_round_trip(directory: Path, payloads: dict, frames: dict, archive_format: str) -> List[Path]:
+    if archive_format in raw_archive.COLUMNAR_FORMATS:
+        return [raw_archive.write_columns(directory, s, df, archive_format) for s, df in frames.items()]
+    return [raw_archive.write_payload(directory, s, p, archive_format) for s, p in payloads.items()]
+
+
+def replay_archive(paths: List[Path]):
+    for path in paths:
+        symbol = raw_archive.split_archive_name(path)[0]
+        if raw_archive.is_columnar(path):
+            transform.load_parsed_columns(path, symbol)
+        else:
+            transform.parse_alpha_vantage_data(raw_archive.read_payload(path), symbol)
+
+
+def bench_archive(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    repeat = options["repeat"]
+    print("raw archive formats (disk size, write, replay = read + parse)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        frames = {s: transform.parse_alpha_vantage_data(p, s) for s, p in payloads.items()}
+    rows = sum(len(df) for df in frames.values())
+    results = {}
+
+    for archive_format in list(raw_archive.JSON_FORMATS) + list(raw_archive.COLUMNAR_FORMATS):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            try:
+                paths = archive_round_trip(directory, payloads, frames, archive_format)
+            except ImportError as e:
+                print(f"  {archive_format}: skipped ({e})")
+                continue
+
+            size = sum(p.stat().st_size for p in paths)
+            result = {
+                "bytes": size,
+                "write": time_call(lambda: archive_round_trip(directory, payloads, frames, archive_format), repeat),
+                "replay": time_call(lambda: replay_archive(paths), repeat),
+            }
+            print(f"  {archive_format}: {size / 1024 ** 2:.2f} MiB")
+            report(f"{archive_format}: write", result["write"], rows)
+            report(f"{archive_format}: replay", result["replay"], rows)
+            results[archive_format] = result
+
+    return results
+
+
+def indicators_per_symbol(panel: pd.DataFrame, specs: list):
+    # the same kernels, called once per symbol: the cost the panel layout avoids
+    for _, df in panel.groupby("symbol", sort=False):
+        indicators.compute_indicators(df, specs)
+
+
+def bench_indicators(options: dict) -> dict:
+    symbols, days, repeat = options["panel_symbols"], options["days"], options["repeat"]
+    print(f"technical indicators on a {symbols} x {days} panel")
+    panel = make_panel(symbols, days)
+    rows = len(panel)
+    results = {}
+
+    results["to_wide"] = time_call(lambda: indicators.to_wide(panel), repeat)
+    report("to_wide (scatter to bar x symbol)", results["to_wide"], rows)
+
+    # each kernel on its own, over the already scattered panel
+    fields, _, _ = indicators.to_wide(panel)
+    for name, period in indicators.DEFAULT_PERIODS.items():
+        label = indicators.format_indicator_specs([(name, period)])
+        results[label] = time_call(lambda: indicators.KERNELS[name](fields, period), repeat)
+        report(f"kernel: {label}", results[label], rows)
+
+    every = list(indicators.DEFAULT_PERIODS.items())
+    results["all"] = time_call(lambda: indicators.compute_indicators(panel, every), repeat)
+    report("all indicators, one panel (with scatter)", results["all"], rows)
+
+    # per-symbol calls are slow enough that one run is representative
+    results["all_per_symbol"] = time_call(lambda: indicators_per_symbol(panel, every), 1)
+    report("all indicators, per symbol", results["all_per_symbol"], rows)
+    print(f"  speedup: {results['all_per_symbol']['best_s'] / results['all']['best_s']:.1f}x")
+    return results
+
+
+def serve_urls(frames: dict) -> List[str]:
+    symbols = list(frames)
+    dates = frames[symbols[0]]["date"]
+    start = dates.iloc[max(len(dates) - 250, 0)].isoformat()
+    middle = dates.iloc[len(dates) // 2].isoformat()
+    joined = ",".join(symbols)
+
+    return [
+        "/latest",
+        f"/range?symbol={symbols[0]}&start={start}",
+        f"/as_of?symbols={joined}&date={middle}",
+        f"/panel?symbols={joined}&start={start}",
+        f"/panel?symbols={joined}&start={start}&format=arrow",
+    ]
+
+
+def run_clients(port: int, urls: List[str], clients: int, requests: int, revalidate: bool) -> dict:
+    """Each client sends `requests` GETs over one keep-alive connection; returns latency percentiles."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(offset: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        etags = {}
+        timings = []
+
+        try:
+            for i in range(requests):
+                url = urls[(offset + i) % len(urls)]
+                headers = {"If-None-Match": etags[url]} if revalidate and url in etags else {}
+
+                started = time.perf_counter()
+                conn.request("GET", url, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                timings.append(time.perf_counter() - started)
+
+                if response.status not in (200, 304):
+                    raise RuntimeError(f"{url}: HTTP {response.status}")
+                etags[url] = response.getheader("ETag")
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            conn.close()
+
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} clients failed, first: {errors[0]}")
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "requests_per_s": len(latencies) / elapsed,
+    }
+
+
+def bench_serve(options: dict) -> dict:
+    payloads = make_payloads(options["symbols"], options["days"])
+    clients = options["clients"]
+    print(f"server.py load test ({clients} clients x {SERVE_REQUESTS_PER_CLIENT} requests)")
+    frames = make_frames(payloads)
+    urls = serve_urls(frames)
+    results = {}
+
+    scenarios = {
+        "uncached": {"cache_size": 0, "revalidate": False},
+        "cached": {"cache_size": config.QUERY_CACHE_SIZE, "revalidate": False},
+        "cached + If-None-Match": {"cache_size": config.QUERY_CACHE_SIZE, "revalidate": True},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "serve.db"
+        with contextlib.redirect_stdout(io.StringIO()):
+            fill_database(db_path, frames)
+
+        for name, scenario in scenarios.items():
+            with patched_config(QUERY_CACHE_SIZE=scenario["cache_size"]):
+                instance = server.QueryServer(("127.0.0.1", 0), StockQuery(db_path), quiet=True)
+            thread = threading.Thread(target=instance.serve_forever, daemon=True)
+            thread.start()
+
+            try:
+                result = run_clients(instance.server_port, urls, clients, SERVE_REQUESTS_PER_CLIENT,
+                                     scenario["revalidate"])
+            finally:
+                instance.shutdown()
+                instance.server_close()
+
+            print(f"  {name:<44} p50 {result['p50_ms']:7.2f}ms  p99 {result['p99_ms']:7.2f}ms  "
+                  f"({result['requests_per_s']:,.0f} req/s)")
+            results[name] = result
+
+    return results
+
+
+def make_intraday_records(days: int, seed: int = 0) -> np.ndarray:
+    # 390 regular-session 1-minute bars per weekday, starting 2000-01-03
+    rng = np.random.default_rng(seed)
+    weekdays = np.busday_offset("2000-01-03", np.arange(days), roll="forward")
+    session = np.datetime64("2000-01-01T09:30", "s") - np.datetime64("2000-01-01", "s")
+    minutes = np.arange(390) * 60
+    timestamps = (weekdays.astype("datetime64[s]")[:, None] + session + minutes).ravel()
+
+    records = np.empty(len(timestamps), dtype=intraday_store.RECORD_DTYPE)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, len(records))))
+    records["timestamp"] = timestamps.astype(np.int64)
+    records["open"] = close * (1 + rng.normal(0, 0.0002, len(records)))
+    records["high"] = np.maximum(records["open"], close) * 1.0005
+    records["low"] = np.minimum(records["open"], close) * 0.9995
+    records["close"] = close
+    records["volume"] = rng.integers(100, 100_000, len(records))
+    return records
+
+
+def bench_intraday(options: dict) -> dict:
+    days, repeat = options["days"], options["repeat"]
+    print(f"intraday bar store ({days} days of 1-minute bars, one symbol)")
+    records = make_intraday_records(days)
+    rows = len(records)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        def reset():
+            shutil.rmtree(root / "1min", ignore_errors=True)
+
+        def append_days():
+            # one append per trading day, as the scheduled refresh does
+            store = intraday_store.IntradayStore("1min", root)
+            for chunk in np.split(records, np.arange(390, rows, 390)):
+                store.append("BENCH", chunk)
+
+        results["append (all at once)"] = time_call(
+            lambda: intraday_store.IntradayStore("1min", root).append("BENCH", records), repeat, reset)
+        results["append (day by day)"] = time_call(append_days, repeat, reset)
+
+        store = intraday_store.IntradayStore("1min", root)
+        timestamps = records["timestamp"].astype("datetime64[s]")
+        middle = timestamps[rows // 2].astype("datetime64[D]")
+        windows = {"day": np.timedelta64(1, "D"), "week": np.timedelta64(7, "D")}
+        for name, span in windows.items():
+            results[f"read {name}"] = time_call(lambda: store.read("BENCH", middle, middle + span), repeat * 20)
+
+    for name, result in results.items():
+        report(name, result, rows if name.startswith("append") else 0)
+
+    return results
+
+
+def sqlite_panel(db_path: Path, field: str) -> pd.DataFrame:
+    # what research code did so far: the whole table through pandas, then a pivot
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query(f"SELECT symbol, date, {field} FROM {config.TABLE_NAME}", conn)
+    finally:
+        conn.close()
+    return df.pivot(index="date", columns="symbol", values=field)
+
+
+def bench_lake(options: dict) -> dict:
+    symbols, days, repeat = options["panel_symbols"], options["days"], options["repeat"]
+    print(f"data lake vs SQLite on a {symbols} x {days} panel (writes timed once)")
+    panel = make_panel(symbols, days)
+    panel["daily_change_percentage"] = np.nan
+    panel["extraction_timestamp"] = pd.Timestamp("2025-10-06 18:00")
+    frames = {symbol: df for symbol, df in panel.groupby("symbol", sort=False)}
+    names = list(frames)
+    rows = len(panel)
+    # a research-style slice: a tenth of the symbols over the last two years
+    subset = names[::10]
+    start = pd.Timestamp(panel["date"].max()) - pd.DateOffset(years=2)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "lake.db"
+        with contextlib.redirect_stdout(io.StringIO()):
+            results["sqlite: load"] = time_call(lambda: fill_database(db_path, frames), 1)
+        results["sqlite: full close panel"] = time_call(lambda: sqlite_panel(db_path, "close_price"), repeat)
+
+        for lake_format in lake.LAKE_FORMATS:
+            store = lake.DataLake(Path(tmp) / lake_format, lake_format)
+
+            def write():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for symbol, df in frames.items():
+                        store.append(symbol, df)
+
+            results[f"{lake_format}: load"] = time_call(write, 1)
+            results[f"{lake_format}: full close panel"] = time_call(
+                lambda: store.panel(names, field="close_price"), repeat)
+            results[f"{lake_format}: 10% symbols, 2 years"] = time_call(
+                lambda: store.panel(subset, start.date(), field="close_price"), repeat)
+            size = sum(p.stat().st_size for p in store.root.rglob(f"*{store.suffix}"))
+            print(f"  {lake_format}: {size / 1024 ** 2:.2f} MiB on disk")
+
+    for name, result in results.items():
+        report(name, result, rows if name.endswith("load") or name.endswith("full close panel") else 0)
+
+    return results
+
+
+# plain SQL that every backend runs unchanged
+ANALYTICAL_QUERIES = {
+    # cross-sectional rank of the 20-day return on every date of the last year
+    "20-day return ranks": f"""
+        WITH returns AS (
+            SELECT symbol, date,
+                   close_price / LAG(close_price, 20) OVER (PARTITION BY symbol ORDER BY date) - 1 AS ret
+            FROM {config.TABLE_NAME}
+        )
+        SELECT date, symbol, ret, RANK() OVER (PARTITION BY date ORDER BY ret DESC) AS rnk
+        FROM returns WHERE date >= ?
+    """,
+    # 50-day moving average of every symbol, latest value only
+    "50-day moving average": f"""
+        WITH averages AS (
+            SELECT symbol, date,
+                   AVG(close_price) OVER (PARTITION BY symbol ORDER BY date
+                                          ROWS BETWEEN 49 PRECEDING AND CURRENT ROW) AS ma
+            FROM {config.TABLE_NAME}
+        )
+        SELECT symbol, ma FROM averages WHERE date >= ?
+    """,
+    # market-wide volume per day
+    "daily volume totals": f"""
+        SELECT date, SUM(volume) AS volume, AVG(close_price) AS mean_close
+        FROM {config.TABLE_NAME} WHERE date >= ? GROUP BY date ORDER BY date
+    """,
+    "one symbol, full history": f"""
+        SELECT date, close_price FROM {config.TABLE_NAME} WHERE symbol = ? AND date >= ? ORDER BY date
+    """,
+}
+
+
+def bench_storage(options: dict) -> dict:
+    symbols, days, repeat = options["panel_symbols"], options["days"], options["repeat"]
+    print(f"storage backends on a {symbols} x {days} panel (loads timed once)")
+    panel = make_panel(symbols, days)
+    panel["daily_change_percentage"] = np.nan
+    panel["extraction_timestamp"] = pd.Timestamp("2025-10-06 18:00")
+    frames = {symbol: df for symbol, df in panel.groupby("symbol", sort=False)}
+    rows = len(panel)
+    last_year = str(pd.Timestamp(panel["date"].max()) - pd.DateOffset(years=1))[:10]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in storage.BACKENDS:
+            path = Path(tmp) / f"storage.{name}"
+
+            def load_all():
+                # the analytics tables are SQLite-only upkeep, left out of the comparison
+                with contextlib.redirect_stdout(io.StringIO()), patched_config(ANALYTICS_ENABLED=False), \
+                        storage.get_backend(name, path) as backend:
+                    backend.create_schema()
+                    for symbol, df in frames.items():
+                        backend.upsert(symbol, df)
+                    backend.commit()
+
+            try:
+                results[f"{name}: load"] = time_call(load_all, 1)
+            except ImportError as e:
+                print(f"  {name}: skipped ({e})")
+                continue
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                backend = storage.get_backend(name, path)
+            try:
+                for query_name, sql in ANALYTICAL_QUERIES.items():
+                    params = (next(iter(frames)), "0000-01-01") if "symbol = ?" in sql else (last_year,)
+                    results[f"{name}: {query_name}"] = time_call(lambda: backend.query(sql, params), repeat)
+            finally:
+                backend.close()
+
+    for name, result in results.items():
+        report(name, result, rows if name.endswith("load") else 0)
+
+    return results
+
+
+def bench_panel(options: dict) -> dict:
+    symbols, days, repeat = options["panel_symbols"], options["days"], options["repeat"]
+    print(f"transformed rows in memory, {symbols} x {days} panel")
+    stacked = make_panel(symbols, days)
+    stacked["daily_change_percentage"] = ((stacked["close_price"] - stacked["open_price"])
+                                          / stacked["open_price"] * 100).round(2)
+    # prices as Alpha Vantage quotes them, to 4 decimals
+    for column in ("open_price", "high_price", "low_price", "close_price"):
+        stacked[column] = stacked[column].round(4)
+    extraction_timestamp = datetime(2025, 10, 6, 18, 0)
+
+    # the frames transform_stock_data returns: object symbol and date columns
+    frames = {}
+    for symbol, df in stacked.groupby("symbol", sort=False):
+        df = df.reset_index(drop=True)
+        df["extraction_timestamp"] = pd.Timestamp(extraction_timestamp).as_unit("ns")
+        frames[symbol] = df[transform.OUTPUT_COLUMNS]
+    del stacked
+    rows = sum(len(df) for df in frames.values())
+
+    def build():
+        result = stock_panel.StockPanel(extraction_timestamp)
+        for symbol, df in frames.items():
+            result.add(symbol, df)
+        return result
+
+    compact = build()
+    frame_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in frames.values())
+    print(f"  dict of DataFrames: {frame_bytes / 1024 ** 2:9.1f} MiB")
+    print(f"  StockPanel:         {compact.nbytes / 1024 ** 2:9.1f} MiB ({frame_bytes / compact.nbytes:.1f}x smaller)")
+
+    def materialize():
+        for symbol in compact:
+            compact[symbol]
+
+    results = {
+        "dict_bytes": frame_bytes,
+        "panel_bytes": compact.nbytes,
+        "build": time_call(build, repeat),
+        "frame per symbol": time_call(materialize, repeat),
+        "stacked frame": time_call(compact.to_frame, repeat),
+    }
+    for name in ("build", "frame per symbol", "stacked frame"):
+        report(name, results[name], rows)
+
+    return results
+
+
+SECTIONS = {
+    "parse": bench_parse,
+    "validate": bench_validate,
+    "insert": bench_insert,
+    "pipeline": bench_pipeline,
+    "sqlite": bench_sqlite,
+    "archive": bench_archive,
+    "indicators": bench_indicators,
+    "serve": bench_serve,
+    "intraday": bench_intraday,
+    "lake": bench_lake,
+    "storage": bench_storage,
+    "panel": bench_panel,
+}
+
+
+def parse_arguments():
+    sections = []
+    options = {
+        "symbols": DEFAULT_SYMBOLS,
+        "days": DEFAULT_DAYS,
+        "repeat": DEFAULT_REPEAT,
+        "panel_symbols": DEFAULT_PANEL_SYMBOLS,
+        "clients": DEFAULT_CLIENTS,
+        "output": None,
+        "compare": None,
+        "threshold": DEFAULT_THRESHOLD,
+    }
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+
+        if arg in ['--help', '-h', 'help']:
+            print(__doc__)
+            sys.exit(0)
+
+        elif arg in ['--symbols', '--days', '--repeat', '--panel-symbols', '--clients']:
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a number")
+                sys.exit(1)
+            options[arg[2:].replace("-", "_")] = int(sys.argv[i + 1])
+            i += 2
+
+        elif arg == '--output':
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a file name")
+                sys.exit(1)
+            options["output"] = Path(sys.argv[i + 1])
+            i += 2
+
+        elif arg == '--compare':
+            if i + 2 >= len(sys.argv):
+                print(f"Error: {arg} requires two result files")
+                sys.exit(1)
+            options["compare"] = (Path(sys.argv[i + 1]), Path(sys.argv[i + 2]))
+            i += 3
+
+        elif arg == '--threshold':
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a number")
+                sys.exit(1)
+            options["threshold"] = float(sys.argv[i + 1])
+            i += 2
+
+        elif arg in SECTIONS:
+            sections.append(arg)
+            i += 1
+
+        else:
+            print(f"Error: Unknown argument '{arg}'")
+            print(__doc__)
+            sys.exit(1)
+
+    return sections or list(SECTIONS), options
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=config.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten_timings(results: dict, prefix: str = "") -> dict:
+    """{"parse": {"columnar": {"best_s": ...}}} -> {"parse.columnar.best_s": ...}, timings only"""
+    flat = {}
+
+    for name, value in results.items():
+        path = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten_timings(value, f"{path}."))
+        elif name in ("best_s", "p50_ms", "p99_ms"):
+            flat[path] = value
+
+    return flat
+
+
+def compare_results(base_path: Path, new_path: Path, threshold: float) -> bool:
+    """Prints new/base per timing; returns False if any got more than threshold percent slower."""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"base: {base_path} ({base['meta'].get('revision') or 'unknown revision'})")
+    print(f"new:  {new_path} ({new['meta'].get('revision') or 'unknown revision'})")
+    if base["meta"]["options"] != new["meta"]["options"]:
+        print("warning: the runs used different options, timings may not be comparable")
+
+    base_timings = flatten_timings(base["results"])
+    new_timings = flatten_timings(new["results"])
+    regressions = 0
+
+    for name in sorted(base_timings.keys() & new_timings.keys()):
+        ratio = new_timings[name] / base_timings[name] if base_timings[name] else float("inf")
+        change = (ratio - 1) * 100
+        flag = ""
+        if change > threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"  {name:<60} {base_timings[name]:10.4f} -> {new_timings[name]:10.4f}  {change:+7.1f}%{flag}")
+
+    for name in sorted(base_timings.keys() ^ new_timings.keys()):
+        print(f"  {name:<60} only in {'base' if name in base_timings else 'new'}")
+
+    print(f"{regressions} timings more than {threshold:g}% slower")
+    return regressions == 0
+
+
+def main():
+    sections, options = parse_arguments()
+
+    if options["compare"]:
+        sys.exit(0 if compare_results(*options["compare"], options["threshold"]) else 1)
+
+    results = {}
+    for section in sections:
+        results[section] = SECTIONS[section](options)
+
+    if options["output"]:
+        meta = {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": {name: options[name] for name in ("symbols", "days", "repeat", "panel_symbols", "clients")},
+        }
+        with open(options["output"], 'w', encoding='utf-8') as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"results written to {options['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,213 @@
 import os
+import threading
 from pathlib import Path
-from dotenv import load_dotenv
-
-
-load_dotenv()
+from typing import Optional
 
 BASE_DIR = Path(__file__).parent.resolve()
 
-# create paths for our data folders
+# paths for our data folders; each is created by the code that writes to it
 RAW_DATA_DIR = BASE_DIR / "raw_data"
 DATABASE_DIR = BASE_DIR / "database"
 LOGS_DIR = BASE_DIR / "logs"
 
-# exist_okay=True so we get no error if folder exists.
-RAW_DATA_DIR.mkdir(exist_ok=True)
-DATABASE_DIR.mkdir(exist_ok=True)
-LOGS_DIR.mkdir(exist_ok=True)
+DATABASE_PATH = DATABASE_DIR / "stock_data.db"
+# the same table in DuckDB, used when STORAGE_BACKEND is "duckdb" (see storage.py)
+DUCKDB_PATH = DATABASE_DIR / "stock_data.duckdb"
+TABLE_NAME = "stock_daily_data"
+COMPACT_OUTPUT_SIZE = 100
 
-# get key
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-API_BASE_URL = "https://www.alphavantage.co/query"
+# raw payload manifest in RAW_DATA_DIR (see raw_cache.py); sharded runs
+# keep one per shard
+RAW_MANIFEST_NAME = "manifest.json"
 
-STOCK_SYMBOLS = os.getenv("STOCKS", "AAPL,GOOG,MSFT").split(",")
+# intraday bars (intraday_store.py), one directory per interval
+INTRADAY_DIR = DATABASE_DIR / "intraday"
 
-DATABASE_PATH = DATABASE_DIR / "stock_data.db"
-TABLE_NAME = "stock_daily_data"
+# columnar copy of the daily table (lake.py), partitioned by symbol and year
+LAKE_DIR = DATABASE_DIR / "lake"
+
+# scheduler.py: last run of every job, and the lock held while one runs
+SCHEDULER_STATE_PATH = DATABASE_DIR / "scheduler_state.json"
+SCHEDULER_LOCK_PATH = DATABASE_DIR / "scheduler.lock"
+
+# API requests sent today, per API key (see extract.RateLimiter); shared by
+# separate runs, scheduler jobs and shard processes, so API_REQUESTS_PER_DAY
+# holds across all of them
+API_QUOTA_PATH = DATABASE_DIR / "api_quota.db"
+
+
+def _read_settings() -> dict:
+    """
+        Everything configurable through the environment or .env. Read on the
+        first access to one of these names (see __getattr__), so importing
+        config costs nothing for commands that never look at them.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # get key (checked by require_api_key, only where the API is called)
+    ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+    # another endpoint speaking the same protocol (a proxy, or a stub in tests)
+    API_BASE_URL = os.getenv("API_BASE_URL", "https://www.alphavantage.co/query")
+
+    STOCK_SYMBOLS = os.getenv("STOCKS", "AAPL,GOOG,MSFT").split(",")
+
+    # keep the derived tables in analytics.py up to date during load
+    ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # read path (query.py): pooled read-only connections and an LRU cache whose
+    # entries expire after QUERY_CACHE_TTL seconds or when the loader commits;
+    # commits from other processes are noticed within QUERY_GENERATION_POLL seconds
+    QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", "4"))
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+    QUERY_GENERATION_POLL = float(os.getenv("QUERY_GENERATION_POLL", "1"))
+
+    # every run writes a JSON report next to its log file in LOGS_DIR; with
+    # METRICS_PROMETHEUS it is also written as Prometheus text to
+    # LOGS_DIR/etl_metrics.prom (for a node_exporter textfile collector)
+    METRICS_PROMETHEUS = os.getenv("METRICS_PROMETHEUS", "false").lower() in ("1", "true", "yes")
+
+    # scheduler.py: jobs to run (comma-separated: daily, intraday), and the exchange whose time
+    # zone and trading days they follow; a failed run is retried every
+    # SCHEDULER_RETRY_MINUTES until its next regular run
+    SCHEDULER_JOBS = os.getenv("SCHEDULER_JOBS", "daily")
+    SCHEDULER_RETRY_MINUTES = float(os.getenv("SCHEDULER_RETRY_MINUTES", "30"))
+    MARKET_TIMEZONE = os.getenv("MARKET_TIMEZONE", "America/New_York")
+
+    # read-only HTTP service (main.py --serve)
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+
+    # where load_all_data writes the daily bars (comma-separated): "database"
+    # (see STORAGE_BACKEND) and/or "lake" (partitioned files in LAKE_DIR, see lake.py)
+    LOAD_TARGETS = os.getenv("LOAD_TARGETS", "database")
+    # print table-wide row counts and the date range after every load; these
+    # scan the whole table, so load time grows with it
+    LOAD_TABLE_STATS = os.getenv("LOAD_TABLE_STATS", "false").lower() in ("1", "true", "yes")
+    # the database behind the "database" target: "sqlite" (DATABASE_PATH) or
+    # "duckdb" (DUCKDB_PATH, a column store for analytical queries; needs the
+    # duckdb package). The query server, replay, sharding and the analytics
+    # tables work on SQLite only
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+    # lake file format, "parquet" or "arrow" (Arrow IPC), and how many files a
+    # symbol-year partition may collect before they are merged into one
+    LAKE_FORMAT = os.getenv("LAKE_FORMAT", "parquet")
+    LAKE_COMPACT_FILES = int(os.getenv("LAKE_COMPACT_FILES", "8"))
+
+    # SQLite storage profile, applied to every connection by load.py
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # negative values are KiB, positive values are pages
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # create new tables WITHOUT ROWID, clustered on (symbol, date)
+    SQLITE_WITHOUT_ROWID = os.getenv("SQLITE_WITHOUT_ROWID", "false").lower() in ("1", "true", "yes")
+
+    # API quota, enforced by the token bucket in extract.py; the per-minute
+    # rate is per process, the daily count is shared through API_QUOTA_PATH
+    # (free tier: 5 requests per minute, 25 per day; 0 per day = unlimited)
+    API_REQUESTS_PER_MINUTE = int(os.getenv("API_REQUESTS_PER_MINUTE", "5"))
+    API_REQUESTS_PER_DAY = int(os.getenv("API_REQUESTS_PER_DAY", "25"))
+    # the time zone whose midnight starts a new quota day
+    API_QUOTA_TIMEZONE = os.getenv("API_QUOTA_TIMEZONE", "UTC")
+    # how many requests may go out back to back before the per-minute rate applies
+    API_BURST = int(os.getenv("API_BURST", "1"))
+
+    # concurrent fetches during extraction
+    EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+
+    # incremental extraction: fetch "full" history only for new symbols or
+    # symbols whose last stored date is older than the compact window
+    INCREMENTAL_EXTRACT = os.getenv("INCREMENTAL_EXTRACT", "true").lower() in ("1", "true", "yes")
+
+    # processes used by transform_all_stocks; 1 transforms serially (debugging)
+    TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", str(os.cpu_count() or 1)))
+
+    # technical indicators stored with the analytics tables (see indicators.py
+    # and analytics.TECHNICAL_TABLE), e.g. "returns,gap,atr_14,rsi_14,bollinger_20,vwap_20";
+    # empty stores none. Like the other analytics they need ANALYTICS_ENABLED and
+    # the SQLite backend; they are computed when a load commits, for all the
+    # symbols it wrote as one panel. Changing the set recomputes every symbol on its next load
+    INDICATORS = os.getenv("INDICATORS", "")
+
+    # intraday bars (main.py --intraday): default bar interval (1min, 5min,
+    # 15min, 30min or 60min), whether to include pre- and post-market bars,
+    # and how often the scheduler's "intraday" job refreshes them
+    INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "5min")
+    INTRADAY_EXTENDED_HOURS = os.getenv("INTRADAY_EXTENDED_HOURS", "false").lower() in ("1", "true", "yes")
+    INTRADAY_REFRESH_MINUTES = float(os.getenv("INTRADAY_REFRESH_MINUTES", "15"))
+
+    # streaming mode (main.py --stream): max symbols waiting between two stages
+    STREAM_QUEUE_DEPTH = int(os.getenv("STREAM_QUEUE_DEPTH", "4"))
+
+    # content-addressed raw payload cache (raw_data/manifest.json): payloads
+    # already loaded are not transformed or loaded again
+    RAW_CACHE_ENABLED = os.getenv("RAW_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RAW_CACHE_MAX_BYTES = int(os.getenv("RAW_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    RAW_CACHE_MAX_AGE_DAYS = float(os.getenv("RAW_CACHE_MAX_AGE_DAYS", "30"))
+
+    # raw archive layout: "json" (pretty-printed), "json.gz" or "json.zst" (minified,
+    # compressed), optionally plus the parsed columns as "npz" or "parquet";
+    # RAW_KEEP_JSON=false stores only the columnar form
+    RAW_ARCHIVE_FORMAT = os.getenv("RAW_ARCHIVE_FORMAT", "json.gz")
+    RAW_COLUMNAR_FORMAT = os.getenv("RAW_COLUMNAR_FORMAT", "")
+    RAW_KEEP_JSON = os.getenv("RAW_KEEP_JSON", "true").lower() in ("1", "true", "yes")
+
+    # pooled HTTP session (see api_client.py)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", str(EXTRACT_WORKERS)))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))
+    # backoff is jittered over [0, min(max, base * 2^attempt)] seconds
+    HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "2"))
+    HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "60"))
+
+    return {name: value for name, value in locals().items() if name.isupper()}
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def _load() -> dict:
+    global _settings
+
+    with _settings_lock:
+        if _settings is None:
+            _settings = _read_settings()
+        return _settings
+
+
+def __getattr__(name: str):
+    settings = _load()
+    if name not in settings:
+        raise AttributeError(f"module 'config' has no attribute '{name}'")
+
+    # cache as a plain module attribute; later lookups skip __getattr__
+    value = settings[name]
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_load()))
+
+
+def require_api_key() -> str:
+    # a value set on the module (e.g. by a test) wins over the environment
+    key = globals().get("ALPHA_VANTAGE_API_KEY") or __getattr__("ALPHA_VANTAGE_API_KEY")
+
+    # validation
+    if not key:
+        raise ValueError(
+            "ALPHA_VANTAGE_API_KEY not found! "
+            "add it to your .env file."
+        )
+    return key
 
-# seconds between API calls
-API_CALL_DELAY = 12
 
-# validation
-if not ALPHA_VANTAGE_API_KEY:
-    raise ValueError(
-        "ALPHA_VANTAGE_API_KEY not found! "
-        "add it to your .env file."
-    )
+def shard_api_key(index: int) -> Optional[str]:
+    """ALPHA_VANTAGE_API_KEY_<index>, the key of one shard in sharded runs (see sharding.py)."""
+    _load()
+    return os.getenv(f"ALPHA_VANTAGE_API_KEY_{index}") or None
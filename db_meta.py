@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+# key/value bookkeeping shared by the loader (load.py) and readers (query.py);
+# kept apart from load.py so readers don't import pandas
+META_TABLE = "etl_meta"
+
+# commits made by this process; readers in the same process see new data
+# without polling the meta table
+_write_generation = 0
+_generation_lock = threading.Lock()
+
+
+def create_meta_table(conn: sqlite3.Connection):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+def commit_write(conn: sqlite3.Connection):
+    """
+        Commits loaded rows together with a bump of the write generation in
+        the meta table, so cached reads (query.py) in any process know the
+        data changed.
+    """
+    conn.execute(
+        f"INSERT INTO {META_TABLE} (key, value) VALUES ('write_generation', '1') "
+        f"ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+    conn.execute(
+        f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES ('last_load_at', ?)",
+        (datetime.now().isoformat(timespec="seconds"),)
+    )
+    conn.commit()
+
+    global _write_generation
+    with _generation_lock:
+        _write_generation += 1
+
+
+def write_generation() -> int:
+    return _write_generation
+
+
+def read_write_generation(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'write_generation'").fetchone()
+    except sqlite3.OperationalError:
+        # database written before the meta table existed
+        return 0
+    return int(row[0]) if row else 0
+
+
+def take_from_counter(conn: sqlite3.Connection, key: str, limit: int) -> Optional[int]:
+    """
+        Adds one to the counter under key, unless it already reached limit,
+        and returns the new count (None if it was at the limit). The check
+        and the increment are one statement, so processes sharing the
+        database can never take more than limit between them.
+    """
+    changes_before = conn.total_changes
+    conn.execute(
+        f"INSERT INTO {META_TABLE} (key, value) VALUES (?, '1') "
+        f"ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 "
+        f"WHERE CAST(value AS INTEGER) < ?",
+        (key, limit)
+    )
+    if conn.total_changes == changes_before:
+        return None
+
+    return int(conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = ?", (key,)).fetchone()[0])
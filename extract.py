@@ -1,69 +1,253 @@
-import requests
-import json
-from datetime import datetime
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
 from pathlib import Path
 import time
-from typing import Optional
+from typing import Callable, Dict, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import api_client
 import config
+import raw_archive
+import raw_cache
+from db_meta import META_TABLE, create_meta_table, take_from_counter
 from models import AlphaVantageResponse
+from series import DAILY, Series
+from transform import parse_alpha_vantage_data
+
+
+class RateLimiter:
+    """Token bucket shared by all extraction workers.
+
+    Tokens refill continuously at requests_per_minute / 60 per second, up to
+    `burst` tokens. The daily quota is a counter: once it is spent,
+    acquire() returns False instead of blocking until tomorrow.
+
+    With quota_path the counter lives in that SQLite file, under quota_name
+    and the day, so every process using the same API key (separate runs,
+    scheduler jobs, shards) draws on one quota. Without it the count starts
+    at 0 in every process. The day is the one in quota_timezone, where the
+    API resets its quota.
+    """
+
+    def __init__(self, requests_per_minute: int, requests_per_day: int = 0, burst: int = 1,
+                 quota_path: Optional[Path] = None, quota_name: str = "api_requests",
+                 quota_timezone: str = "UTC"):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.requests_per_day = requests_per_day
+        self.quota_path = quota_path
+        self.quota_name = quota_name
+        self.timezone = ZoneInfo(quota_timezone)
+        self.used_today = 0
+        self.day = self.today()
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        # the quota database: one connection for the limiter's lifetime, and
+        # the day whose counters it last pruned
+        self.quota_lock = threading.Lock()
+        self.conn = None
+        self.pruned_day = None
+
+    def today(self) -> date:
+        return datetime.now(self.timezone).date()
+
+    def acquire(self) -> bool:
+        while True:
+            with self.lock:
+                today = self.today()
+                if today != self.day:
+                    self.day = today
+                    self.used_today = 0
+
+                if self.requests_per_day and self.used_today >= self.requests_per_day:
+                    return False
+
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+        # counted outside self.lock, so other threads keep drawing tokens
+        # meanwhile; a token taken when the quota turns out spent is moot
+        return not self.requests_per_day or self._count_request(today)
+
+    def _count_request(self, today: date) -> bool:
+        """Takes one request from today's quota; False once it is spent."""
+        if self.quota_path is None:
+            with self.lock:
+                if self.used_today >= self.requests_per_day:
+                    return False
+                self.used_today += 1
+                return True
+
+        prefix = f"{self.quota_name}:"
+        with self.quota_lock:
+            conn = self._quota_connection()
+            with conn:
+                if self.pruned_day != today:
+                    # counters of earlier days are no longer needed; a range
+                    # on the key matches exactly this quota's counters
+                    conn.execute(f"DELETE FROM {META_TABLE} WHERE key >= ? AND key < ?",
+                                 (prefix, f"{prefix}{today.isoformat()}"))
+                    self.pruned_day = today
+                used = take_from_counter(conn, f"{prefix}{today.isoformat()}", self.requests_per_day)
+
+        with self.lock:
+            # None: other processes spent the rest of the quota
+            self.used_today = self.requests_per_day if used is None else used
+        return used is not None
+
+    def _quota_connection(self) -> sqlite3.Connection:
+        if self.conn is None:
+            Path(self.quota_path).parent.mkdir(parents=True, exist_ok=True)
+            # used by every extract thread, one at a time (self.quota_lock)
+            self.conn = sqlite3.connect(self.quota_path, timeout=30, check_same_thread=False)
+            # a counter update is one small WAL append, without an fsync per request
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            with self.conn:
+                create_meta_table(self.conn)
+        return self.conn
+
+    def close(self):
+        with self.quota_lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def create_rate_limiter() -> RateLimiter:
+    # the daily quota belongs to the API key; the key itself is not stored
+    key_id = hashlib.sha256(config.require_api_key().encode("utf-8")).hexdigest()[:16]
+    return RateLimiter(
+        config.API_REQUESTS_PER_MINUTE,
+        config.API_REQUESTS_PER_DAY,
+        config.API_BURST,
+        quota_path=config.API_QUOTA_PATH,
+        quota_name=f"api_requests:{key_id}",
+        quota_timezone=config.API_QUOTA_TIMEZONE
+    )
+
+
+def choose_outputsize(watermark: Optional[str], series: Series = DAILY) -> str:
+    if watermark is None:
+        return "full"
+
+    if series.intraday:
+        # wall-clock minutes overestimate trading minutes (nights, weekends)
+        elapsed = datetime.now() - datetime.fromisoformat(watermark)
+        missing_bars = elapsed.total_seconds() / 60 / series.bar_minutes
+    else:
+        # business days overestimate trading days (holidays), which errs on the
+        # side of fetching full history when the gap is close to the window
+        missing_bars = np.busday_count(watermark, date.today().isoformat())
+
+    if missing_bars >= config.COMPACT_OUTPUT_SIZE:
+        return "full"
+
+    return "compact"
+
+
+def has_gap(data: dict, watermark: str, series: Series = DAILY) -> bool:
+    # compact data only covers the latest window; if its oldest bar is newer
+    # than what we have stored, the bars in between are missing
+    bars = data.get(series.key)
+    if not bars:
+        return False
+    return min(bars) > watermark
 
 
-def fetch_stock_data(symbol: str) -> Optional[dict]:
+def fetch_stock_data(symbol: str, limiter: Optional[RateLimiter] = None,
+                     outputsize: str = "compact", series: Series = DAILY) -> Optional[dict]:
     params = {
-        "function": "TIME_SERIES_DAILY",
+        **series.params(),
         "symbol": symbol,
-        "apikey": config.ALPHA_VANTAGE_API_KEY,
-        "outputsize": "compact"
+        "apikey": config.require_api_key(),
+        "outputsize": outputsize
     }
 
-    print(f"fetching data for {symbol}...")
+    print(f"fetching {series.name} data for {symbol} ({outputsize})...")
 
     try:
-        # make the HTTP GET request
-        response = requests.get(
-            config.API_BASE_URL,
-            params=params,
-            timeout=10
-        )
-        response.raise_for_status()
-
-        data = response.json()
-
-        if "Error Message" in data:
-            print(f"API Error for {symbol}: {data['Error Message']}")
-            return None
-
-        if "Note" in data:
-            print(f"rate limit warning: {data['Note']}")
-            return None
-
-        try:
-            AlphaVantageResponse(**data)
-            print(f"successfully fetched data for {symbol}")
-            return data
-        except Exception as e:
-            print(f"invalid data structure for {symbol}: {e}")
-            return None
-
-    except requests.exceptions.Timeout:
-        print(f"request timeout for {symbol}")
+        data = api_client.get_json(params, limiter=limiter, label=symbol)
+
+    except api_client.QuotaExhaustedError:
+        print(f"daily request quota reached, skipping {symbol}")
         return None
 
-    except requests.exceptions.RequestException as e:
+    except api_client.ApiRequestError as e:
         print(f"request failed for {symbol}: {e}")
         return None
 
+    if "Error Message" in data:
+        print(f"API Error for {symbol}: {data['Error Message']}")
+        return None
+
+    try:
+        response = AlphaVantageResponse(**data)
+    except Exception as e:
+        print(f"invalid data structure for {symbol}: {e}")
+        return None
+
+    if not response.time_series:
+        print(f"no bars in the response for {symbol}")
+        return None
 
-def save_raw_data(symbol: str, data: dict) -> Path:
-    today = datetime.now().date().isoformat()
-    filename = f"{symbol}_{today}.json"
-    filepath = config.RAW_DATA_DIR / filename
+    print(f"successfully fetched data for {symbol}")
+    return data
 
-    print(f"saving raw data to {filepath}...")
+
+def save_raw_data(symbol: str, data: dict, series: Series = DAILY) -> Path:
+    raw_dir = series.raw_dir()
+    cache = raw_cache.get_cache(raw_dir) if config.RAW_CACHE_ENABLED else None
+    digest = raw_cache.payload_digest(data) if cache else None
+
+    if cache:
+        cached_path = cache.path_for(digest)
+        if cached_path:
+            print(f"payload for {symbol} unchanged, reusing {cached_path}")
+            return cached_path
+
+    if series.intraday:
+        # several refreshes a day, each with a different window of bars
+        stem = f"{symbol}_{series.interval}_{datetime.now():%Y-%m-%dT%H%M%S}"
+    else:
+        stem = f"{symbol}_{datetime.now().date().isoformat()}"
+
+    print(f"saving raw data for {symbol} to {raw_dir}...")
 
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        raw_dir.mkdir(parents=True, exist_ok=True)
+        filepath = None
+
+        if config.RAW_KEEP_JSON or not config.RAW_COLUMNAR_FORMAT:
+            filepath = raw_archive.write_payload(raw_dir, stem, data, config.RAW_ARCHIVE_FORMAT)
+
+        if config.RAW_COLUMNAR_FORMAT:
+            # keep the parsed columns too, so replays can skip JSON parsing
+            df = parse_alpha_vantage_data(data, symbol, series=series)
+            columnar_path = raw_archive.write_columns(raw_dir, stem, df, config.RAW_COLUMNAR_FORMAT,
+                                                      series.time_unit)
+            filepath = filepath or columnar_path
+
+        if cache:
+            cache.register(symbol, digest, filepath)
 
         print(f"saved {filepath}")
         return filepath
@@ -73,35 +257,92 @@ def save_raw_data(symbol: str, data: dict) -> Path:
         raise
 
 
-def extract_all_stocks():
-    print("STARTING DATA EXTRACTION")
+def extract_symbol(symbol: str, limiter: RateLimiter,
+                   watermarks: Optional[Dict[str, str]] = None,
+                   on_extracted: Optional[Callable[[str, Path], None]] = None,
+                   series: Series = DAILY) -> Optional[Path]:
+    if watermarks is None:
+        data = fetch_stock_data(symbol, limiter, series=series)
+    else:
+        watermark = watermarks.get(symbol)
+        outputsize = choose_outputsize(watermark, series)
+        data = fetch_stock_data(symbol, limiter, outputsize, series)
+
+        if data and outputsize == "compact" and has_gap(data, watermark, series):
+            print(f"{symbol}: compact window does not reach {watermark}, fetching full history")
+            data = fetch_stock_data(symbol, limiter, "full", series)
+
+    if not data:
+        print(f"skipping {symbol} - no data received")
+        return None
+
+    # Save raw JSON to file
+    try:
+        filepath = save_raw_data(symbol, data, series)
+    except Exception as e:
+        print(f"failed to save {symbol}: {e}")
+        return None
+
+    if on_extracted:
+        on_extracted(symbol, filepath)
+
+    return filepath
+
+
+def extract_all_stocks(watermarks: Optional[Dict[str, str]] = None,
+                       on_extracted: Optional[Callable[[str, Path], None]] = None,
+                       series: Series = DAILY):
+    """
+        watermarks maps symbol -> last stored date (bar time for intraday
+        series). When given, extraction is incremental (compact vs full per
+        symbol); None always fetches compact.
+
+        on_extracted(symbol, filepath) is called from the worker thread as
+        soon as a symbol's raw file is saved (used by the streaming pipeline).
+    """
+    print(f"STARTING DATA EXTRACTION ({series.name})")
     print(f"stocks to fetch: {config.STOCK_SYMBOLS}")
-    print(f"API call delay: {config.API_CALL_DELAY} seconds")
+    print(f"rate limit: {config.API_REQUESTS_PER_MINUTE}/min, "
+          f"{config.API_REQUESTS_PER_DAY or 'unlimited'}/day, "
+          f"{config.EXTRACT_WORKERS} workers")
 
+    limiter = create_rate_limiter()
+    api_client.latency_stats.reset()
+    symbols = config.STOCK_SYMBOLS
     results = {}
 
-    for i, symbol in enumerate(config.STOCK_SYMBOLS):
-        print(f"\n[{i + 1}/{len(config.STOCK_SYMBOLS)}] Processing {symbol}...")
-        data = fetch_stock_data(symbol)
-
-        if data:
-            # Save raw JSON to file
-            try:
-                filepath = save_raw_data(symbol, data)
-                results[symbol] = filepath
-            except Exception as e:
-                print(f"failed to save {symbol}: {e}")
-        else:
-            print(f"skipping {symbol} - no data received")
+    try:
+        with ThreadPoolExecutor(max_workers=max(config.EXTRACT_WORKERS, 1)) as pool:
+            futures = [pool.submit(extract_symbol, symbol, limiter, watermarks, on_extracted, series)
+                       for symbol in symbols]
 
-        if i < len(config.STOCK_SYMBOLS) - 1:
-            print(f"waiting {config.API_CALL_DELAY} seconds before next request...")
-            time.sleep(config.API_CALL_DELAY)
+            # collect in symbol order so the result dict is deterministic
+            for i, (symbol, future) in enumerate(zip(symbols, futures)):
+                try:
+                    filepath = future.result()
+                except Exception as e:
+                    # one symbol's failure must not stop the others
+                    print(f"failed to extract {symbol}: {e}")
+                    filepath = None
+                print(f"\n[{i + 1}/{len(symbols)}] {symbol}: {'done' if filepath else 'failed'}")
+                if filepath:
+                    results[symbol] = filepath
+    finally:
+        limiter.close()
 
     print("EXTRACTION COMPLETE")
-    print(f"successfully saved: {len(results)}/{len(config.STOCK_SYMBOLS)} stocks")
+    print(f"successfully saved: {len(results)}/{len(symbols)} stocks")
+    print_latency_summary()
     for symbol, filepath in results.items():
         print(f"{symbol}: {filepath.name}")
     return results
 
 
+def print_latency_summary():
+    stats = api_client.latency_stats.summary()
+
+    print(f"HTTP requests: {stats['requests']} "
+          f"(retries: {stats['retries']}, failures: {stats['failures']})")
+    if stats["requests"]:
+        print(f"latency: mean {stats['mean_ms']:.0f}ms, p50 {stats['p50_ms']:.0f}ms, "
+              f"p95 {stats['p95_ms']:.0f}ms, max {stats['max_ms']:.0f}ms")
@@ -0,0 +1,278 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# indicator -> default period (None: the indicator takes no period)
+DEFAULT_PERIODS = {
+    "returns": None,
+    "log_returns": None,
+    "gap": None,
+    "true_range": None,
+    "atr": 14,
+    "rsi": 14,
+    "bollinger": 20,
+    "vwap": 20,
+}
+
+BOLLINGER_WIDTH = 2.0
+
+# indicators over a rolling window of `period` bars; every other one looks
+# back a single bar (the recursive ones also need their seed, see SEED_COLUMNS)
+WINDOWED = ("bollinger", "vwap")
+
+# recursive indicators -> the columns holding their state: an incremental
+# update continues from the values stored for the previous bar
+SEED_COLUMNS = {
+    "atr": lambda period: [f"atr_{period}"],
+    "rsi": lambda period: [f"avg_gain_{period}", f"avg_loss_{period}"],
+}
+
+# panel column -> field name used by the kernels
+PANEL_FIELDS = {
+    "open_price": "open",
+    "high_price": "high",
+    "low_price": "low",
+    "close_price": "close",
+    "volume": "volume",
+}
+
+
+def parse_indicator_specs(spec: str) -> List[Tuple[str, Optional[int]]]:
+    """"rsi_14, atr, returns" -> [("rsi", 14), ("atr", 14), ("returns", None)]"""
+    specs = []
+
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+
+        head, sep, tail = item.rpartition("_")
+        name, period = (head, int(tail)) if sep and tail.isdigit() else (item, None)
+
+        if name not in DEFAULT_PERIODS:
+            raise ValueError(f"unknown indicator '{item}' (expected one of {', '.join(DEFAULT_PERIODS)})")
+        if DEFAULT_PERIODS[name] is None and period is not None:
+            raise ValueError(f"indicator '{name}' takes no period")
+        if period is not None and period < 1:
+            raise ValueError(f"indicator '{item}' needs a period of at least 1")
+
+        parsed = (name, period or DEFAULT_PERIODS[name])
+        if parsed not in specs:
+            specs.append(parsed)
+
+    return specs
+
+
+def format_indicator_specs(specs: List[Tuple[str, Optional[int]]]) -> str:
+    return ", ".join(name if period is None else f"{name}_{period}" for name, period in specs)
+
+
+def _shift(values: np.ndarray) -> np.ndarray:
+    # previous row of every column; the first row has no predecessor
+    shifted = np.empty_like(values)
+    shifted[0] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+def _wilder(values: np.ndarray, period: int, seed: Optional[np.ndarray] = None, start: int = 0) -> np.ndarray:
+    """
+        Wilder's smoothing down the rows. seed holds one value per column
+        (NaN: none): a seeded column continues the recursion from it at row
+        start, its value being the average of row start - 1 (so from a full
+        window), and is NaN above start; the others start from scratch.
+    """
+    smoothed = np.full(values.shape, np.nan)
+    seeded = np.zeros(values.shape[1], dtype=bool) if seed is None else ~np.isnan(seed)
+
+    if not seeded.all():
+        smoothed[:, ~seeded] = pd.DataFrame(values[:, ~seeded]).ewm(
+            alpha=1 / period, adjust=False, min_periods=period).mean().to_numpy()
+    if seeded.any():
+        continued = np.vstack([seed[seeded][np.newaxis, :], values[start:, seeded]])
+        smoothed[start:, seeded] = pd.DataFrame(continued).ewm(alpha=1 / period, adjust=False).mean().to_numpy()[1:]
+    return smoothed
+
+
+def _rolling(values: np.ndarray, period: int):
+    return pd.DataFrame(values).rolling(period, min_periods=period)
+
+
+def _true_range(fields: dict) -> np.ndarray:
+    prev_close = _shift(fields["close"])
+    # fmax skips the NaN of the first bar, leaving high - low
+    return np.fmax(
+        fields["high"] - fields["low"],
+        np.fmax(np.abs(fields["high"] - prev_close), np.abs(fields["low"] - prev_close))
+    )
+
+
+def returns(fields: dict, period: Optional[int]) -> Dict[str, np.ndarray]:
+    return {"return": fields["close"] / _shift(fields["close"]) - 1}
+
+
+def log_returns(fields: dict, period: Optional[int]) -> Dict[str, np.ndarray]:
+    return {"log_return": np.log(fields["close"] / _shift(fields["close"]))}
+
+
+def gap(fields: dict, period: Optional[int]) -> Dict[str, np.ndarray]:
+    return {"gap": fields["open"] / _shift(fields["close"]) - 1}
+
+
+def true_range(fields: dict, period: Optional[int]) -> Dict[str, np.ndarray]:
+    return {"true_range": _true_range(fields)}
+
+
+def atr(fields: dict, period: int, seed: Optional[dict] = None, start: int = 0) -> Dict[str, np.ndarray]:
+    initial = None if seed is None else seed[f"atr_{period}"]
+    return {f"atr_{period}": _wilder(_true_range(fields), period, initial, start)}
+
+
+def rsi(fields: dict, period: int, seed: Optional[dict] = None, start: int = 0) -> Dict[str, np.ndarray]:
+    delta = fields["close"] - _shift(fields["close"])
+    gain, loss = (None, None) if seed is None else (seed[f"avg_gain_{period}"], seed[f"avg_loss_{period}"])
+    # clip keeps NaN, so missing bars stay missing
+    average_gain = _wilder(np.clip(delta, 0, None), period, gain, start)
+    average_loss = _wilder(np.clip(-delta, 0, None), period, loss, start)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            f"rsi_{period}": 100 * average_gain / (average_gain + average_loss),
+            # the state an incremental update continues from
+            f"avg_gain_{period}": average_gain,
+            f"avg_loss_{period}": average_loss,
+        }
+
+
+def bollinger(fields: dict, period: int) -> Dict[str, np.ndarray]:
+    window = _rolling(fields["close"], period)
+    middle = window.mean().to_numpy()
+    width = BOLLINGER_WIDTH * window.std(ddof=0).to_numpy()
+    return {
+        f"bb_middle_{period}": middle,
+        f"bb_upper_{period}": middle + width,
+        f"bb_lower_{period}": middle - width,
+    }
+
+
+def vwap(fields: dict, period: int) -> Dict[str, np.ndarray]:
+    # daily bars have no intraday trades, so the typical price stands in
+    typical = (fields["high"] + fields["low"] + fields["close"]) / 3
+    traded = _rolling(typical * fields["volume"], period).sum().to_numpy()
+    volume = _rolling(fields["volume"], period).sum().to_numpy()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {f"vwap_{period}": traded / volume}
+
+
+KERNELS: Dict[str, Callable[[dict, Optional[int]], Dict[str, np.ndarray]]] = {
+    "returns": returns,
+    "log_returns": log_returns,
+    "gap": gap,
+    "true_range": true_range,
+    "atr": atr,
+    "rsi": rsi,
+    "bollinger": bollinger,
+    "vwap": vwap,
+}
+
+
+def _layout(panel: pd.DataFrame, first_changed: Optional[Dict[str, int]] = None):
+    """
+        Where each row of a stacked panel goes in the wide arrays: one column
+        per symbol, and down it the symbol's own bars in date order, so a
+        shift or window over the rows never steps over another symbol's
+        trading days. Each symbol's bar first_changed[symbol] (default 0)
+        lands on the same row, returned as start, with NaN padding above.
+    """
+    columns, symbols = pd.factorize(panel["symbol"], sort=True)
+    dates = pd.to_datetime(panel["date"]).to_numpy()
+
+    order = np.lexsort((dates, columns))
+    counts = np.bincount(columns, minlength=len(symbols))
+    position = np.empty(len(panel), dtype=np.int64)
+    position[order] = np.arange(len(panel)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    offsets = np.array([(first_changed or {}).get(symbol, 0) for symbol in symbols], dtype=np.int64)
+    start = int(offsets.max()) if len(offsets) else 0
+    rows = position + (start - offsets)[columns]
+    return rows, columns, symbols, start
+
+
+def _scatter(panel: pd.DataFrame, rows: np.ndarray, columns: np.ndarray, width: int) -> dict:
+    height = int(rows.max()) + 1 if len(rows) else 0
+    fields = {}
+    for column, field in PANEL_FIELDS.items():
+        wide = np.full((height, width), np.nan)
+        wide[rows, columns] = panel[column].to_numpy(dtype=np.float64)
+        fields[field] = wide
+    return fields
+
+
+def to_wide(panel: pd.DataFrame) -> Tuple[dict, np.ndarray, np.ndarray]:
+    """
+        Scatters a stacked (symbol, date) panel into one bar x symbol array
+        per field: row i of a column is the symbol's i-th bar, so symbols
+        with different trading calendars never leave gaps in each other's
+        history. Returns the arrays plus the row and column of every panel
+        row, to gather the results back.
+    """
+    rows, columns, symbols, _ = _layout(panel)
+    return _scatter(panel, rows, columns, len(symbols)), rows, columns
+
+
+def indicator_columns(specs: List[Tuple[str, Optional[int]]]) -> List[str]:
+    """The columns compute_indicators returns for specs, in order (found by running the kernels on one bar)."""
+    fields = {field: np.full((1, 1), np.nan) for field in PANEL_FIELDS.values()}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return [column for name, period in specs for column in KERNELS[name](fields, period)]
+
+
+def seed_columns(specs: List[Tuple[str, Optional[int]]]) -> List[str]:
+    return [column for name, period in specs if name in SEED_COLUMNS for column in SEED_COLUMNS[name](period)]
+
+
+def history_rows(specs: List[Tuple[str, Optional[int]]]) -> int:
+    """How many bars before the first one to compute the indicators look back at."""
+    return max([1] + [period - 1 for name, period in specs if name in WINDOWED])
+
+
+def compute_indicators(panel: pd.DataFrame, specs: List[Tuple[str, Optional[int]]],
+                       seeds: Optional[Dict[str, dict]] = None,
+                       first_changed: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """
+        Indicator columns for a stacked panel of daily bars (any number of
+        symbols, any row order), aligned to panel.index.
+
+        Each kernel runs once over the whole bar x symbol matrix (see
+        to_wide) instead of once per symbol. Windows only see the rows in
+        the panel, so to compute bars after a stored history, include the
+        history_rows(specs) bars before them. first_changed maps a symbol
+        to its first such bar (its position among the symbol's rows); with
+        seeds[symbol] (the seed_columns(specs) values of the bar before it)
+        ATR and RSI continue their recursion from there instead of
+        restarting, so the rows from first_changed on match a computation
+        over the symbol's whole history.
+    """
+    if panel.empty or not specs:
+        return pd.DataFrame(index=panel.index)
+
+    rows, columns, symbols, start = _layout(panel, first_changed)
+    fields = _scatter(panel, rows, columns, len(symbols))
+
+    seed = None
+    if seeds:
+        seed = {
+            column: np.array([seeds.get(symbol, {}).get(column, np.nan) for symbol in symbols], dtype=np.float64)
+            for column in seed_columns(specs)
+        }
+
+    result = {}
+    for name, period in specs:
+        kernel = KERNELS[name]
+        outputs = kernel(fields, period, seed, start) if name in SEED_COLUMNS else kernel(fields, period)
+        for column, wide in outputs.items():
+            result[column] = wide[rows, columns]
+
+    return pd.DataFrame(result, index=panel.index)
@@ -0,0 +1,207 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from metrics import metrics
+
+# one fixed-size little-endian record per bar; a partition file is just an
+# array of them, sorted by time stamp, so appending is a plain write and
+# reading is a memory map plus a binary search
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),   # seconds since 1970-01-01, exchange time
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<i8"),
+])
+
+PARTITION_SUFFIX = ".bars"
+
+# transformed frame column -> record field
+FRAME_FIELDS = {
+    "open_price": "open",
+    "high_price": "high",
+    "low_price": "low",
+    "close_price": "close",
+    "volume": "volume",
+}
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    """Transformed intraday rows -> records sorted by time stamp, one per bar (last row wins)."""
+    records = np.empty(len(df), dtype=RECORD_DTYPE)
+    records["timestamp"] = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[s]").astype(np.int64)
+    for column, field in FRAME_FIELDS.items():
+        records[field] = df[column].to_numpy()
+
+    return _dedupe(records)
+
+
+def _dedupe(records: np.ndarray) -> np.ndarray:
+    # stable sort keeps later rows after earlier ones with the same time stamp;
+    # keeping the last of each run lets newer bars replace older ones
+    records = records[np.argsort(records["timestamp"], kind="stable")]
+    if len(records) < 2:
+        return records
+    keep = np.append(records["timestamp"][1:] != records["timestamp"][:-1], True)
+    return records[keep]
+
+
+class IntradayStore:
+    """
+        Intraday bars of one interval, partitioned by symbol and month:
+        <root>/<interval>/<SYMBOL>/<YYYY-MM>.bars. A month of 1-minute bars
+        is a few MB, so a day or a week of one symbol is read from at most
+        two memory-mapped files.
+
+        New bars are appended to the end of their partition. Bars that
+        overlap the stored tail (a re-fetched, possibly unfinished bar)
+        replace it: the file is cut back to the first overlapping bar and
+        the merged tail is written again, never the whole file.
+    """
+
+    def __init__(self, interval: str, root: Optional[Path] = None):
+        self.interval = interval
+        self.root = Path(root or config.INTRADAY_DIR) / interval
+        self.lock = threading.Lock()
+
+    def symbol_dir(self, symbol: str) -> Path:
+        return self.root / symbol
+
+    def partition_path(self, symbol: str, month: np.datetime64) -> Path:
+        return self.symbol_dir(symbol) / f"{month}{PARTITION_SUFFIX}"
+
+    def months(self, symbol: str) -> List[np.datetime64]:
+        directory = self.symbol_dir(symbol)
+        if not directory.is_dir():
+            return []
+        return sorted(np.datetime64(path.name[:-len(PARTITION_SUFFIX)], "M")
+                      for path in directory.glob(f"*{PARTITION_SUFFIX}"))
+
+    def _read_partition(self, path: Path) -> np.ndarray:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        # a torn trailing record (crash during append) is ignored
+        count = size // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+    def _append_partition(self, path: Path, records: np.ndarray) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stored = self._read_partition(path)
+
+        # where the new bars start among the stored ones; everything before stays
+        start = int(np.searchsorted(stored["timestamp"], records["timestamp"][0]))
+        tail = np.array(stored[start:])
+        merged = _dedupe(np.concatenate([tail, records]))
+        del stored
+
+        with open(path, 'r+b' if path.exists() else 'wb') as f:
+            f.truncate(start * RECORD_DTYPE.itemsize)
+            f.seek(start * RECORD_DTYPE.itemsize)
+            f.write(merged.tobytes())
+
+        return len(merged) - len(tail)
+
+    def append(self, symbol: str, records: np.ndarray) -> int:
+        """Writes bars (RECORD_DTYPE, sorted by time stamp); returns how many were new."""
+        if len(records) == 0:
+            return 0
+
+        months = records["timestamp"].astype("datetime64[s]").astype("datetime64[M]")
+        # records are sorted, so each month is one contiguous slice
+        boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+        added = 0
+
+        with self.lock:
+            for chunk in np.split(records, boundaries):
+                month = chunk["timestamp"][:1].astype("datetime64[s]").astype("datetime64[M]")[0]
+                added += self._append_partition(self.partition_path(symbol, month), chunk)
+
+        return added
+
+    def last_timestamp(self, symbol: str) -> Optional[np.datetime64]:
+        for month in reversed(self.months(symbol)):
+            stored = self._read_partition(self.partition_path(symbol, month))
+            if len(stored):
+                return np.datetime64(int(stored["timestamp"][-1]), "s")
+        return None
+
+    def read(self, symbol: str, start: Optional[np.datetime64] = None,
+             end: Optional[np.datetime64] = None) -> Dict[str, np.ndarray]:
+        """
+            Bars of one symbol with start <= time stamp < end, oldest first,
+            as one NumPy array per field ("timestamp" as datetime64[s]).
+        """
+        start = np.datetime64(start, "s") if start is not None else None
+        end = np.datetime64(end, "s") if end is not None else None
+        chunks = []
+
+        for month in self.months(symbol):
+            month_start = month.astype("datetime64[s]")
+            month_end = (month + 1).astype("datetime64[s]")
+            if (start is not None and month_end <= start) or (end is not None and month_start >= end):
+                continue
+
+            stored = self._read_partition(self.partition_path(symbol, month))
+            timestamps = stored["timestamp"]
+            lo = np.searchsorted(timestamps, start.astype(np.int64)) if start is not None else 0
+            hi = np.searchsorted(timestamps, end.astype(np.int64)) if end is not None else len(stored)
+            # copy out of the memory map, so the file can be appended to
+            chunks.append(np.array(stored[lo:hi]))
+
+        bars = np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+        columns = {"timestamp": bars["timestamp"].astype("datetime64[s]")}
+        columns.update({field: bars[field] for field in RECORD_DTYPE.names[1:]})
+        return columns
+
+
+def read_watermarks(symbols: List[str], interval: str) -> Dict[str, str]:
+    """
+        symbol -> time stamp to fetch bars after. One second before the
+        newest stored bar, so that bar (maybe unfinished when it was
+        fetched) is read again and replaced.
+    """
+    store = IntradayStore(interval)
+    watermarks = {}
+
+    for symbol in symbols:
+        last = store.last_timestamp(symbol)
+        if last is not None:
+            watermarks[symbol] = str(last - np.timedelta64(1, "s")).replace("T", " ")
+
+    return watermarks
+
+
+def load_intraday_data(transformed_data: Mapping[str, pd.DataFrame], interval: str):
+    print(f"STARTING INTRADAY LOAD ({interval})")
+
+    store = IntradayStore(interval)
+    total_inserted = 0
+
+    for symbol, df in transformed_data.items():
+        if df.empty:
+            print(f"   no new bars for {symbol}")
+            continue
+
+        records = frame_to_records(df)
+        with metrics.timer(symbol, "insert_seconds"):
+            added = store.append(symbol, records)
+        metrics.add(symbol, "rows_inserted", added)
+        total_inserted += added
+
+        first, last = records["timestamp"][[0, -1]].astype("datetime64[s]")
+        print(f"   {symbol}: {added} new bars ({len(records)} written, {first} to {last})")
+
+    print("INTRADAY LOAD COMPLETE")
+    print(f"total new bars: {total_inserted}")
+    print(f"store location: {store.root}")
@@ -0,0 +1,403 @@
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from metrics import metrics
+
+# lake file format -> file suffix; Arrow IPC files are written uncompressed
+# so readers can memory-map them
+LAKE_FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+# lake file format -> pyarrow.dataset format
+DATASET_FORMATS = {
+    "parquet": "parquet",
+    "arrow": "ipc",
+}
+
+# columns stored in every file; symbol and year come from the directory names
+LAKE_COLUMNS = [
+    "date", "open_price", "high_price", "low_price", "close_price",
+    "volume", "daily_change_percentage", "extraction_timestamp",
+]
+PANEL_FIELDS = ["open_price", "high_price", "low_price", "close_price", "volume", "daily_change_percentage"]
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the data lake needs the 'pyarrow' package (pip install pyarrow)")
+    return pyarrow
+
+
+class DataLake:
+    """
+        The daily bars as a directory of columnar files, partitioned by
+        symbol and year (hive style, so any Arrow/Spark/DuckDB reader finds
+        the partitions):
+
+            <root>/symbol=AAPL/year=2024/part-<time ns>.parquet
+
+        Every load appends one new file per touched partition, holding only
+        dates the partition does not have yet (existing rows are kept, as in
+        load.insert_data). Once a partition has config.LAKE_COMPACT_FILES
+        files they are merged into one. Files are written under a temporary
+        name and renamed, so readers never see half a file, and always
+        sorted by date.
+
+        New files are written in lake_format, but files of every format in
+        LAKE_FORMATS are read, so changing config.LAKE_FORMAT keeps the
+        rows already stored; compaction rewrites them in the new format.
+    """
+
+    def __init__(self, root: Optional[Path] = None, lake_format: Optional[str] = None):
+        lake_format = lake_format or config.LAKE_FORMAT
+        if lake_format not in LAKE_FORMATS:
+            raise ValueError(f"unknown lake format '{lake_format}' "
+                             f"(expected one of {', '.join(LAKE_FORMATS)})")
+
+        self.root = Path(root or config.LAKE_DIR)
+        self.format = lake_format
+        self.suffix = LAKE_FORMATS[lake_format]
+
+    def schema(self):
+        pa = _arrow()
+        return pa.schema([
+            ("date", pa.date32()),
+            ("open_price", pa.float64()),
+            ("high_price", pa.float64()),
+            ("low_price", pa.float64()),
+            ("close_price", pa.float64()),
+            ("volume", pa.int64()),
+            ("daily_change_percentage", pa.float64()),
+            ("extraction_timestamp", pa.timestamp("s")),
+        ])
+
+    def partitioning(self):
+        pa = _arrow()
+        return pa.dataset.partitioning(pa.schema([("symbol", pa.string()), ("year", pa.int32())]), flavor="hive")
+
+    def symbol_dir(self, symbol: str) -> Path:
+        return self.root / f"symbol={symbol}"
+
+    def partition_dir(self, symbol: str, year: int) -> Path:
+        return self.symbol_dir(symbol) / f"year={year}"
+
+    def symbols(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(path.name[len("symbol="):] for path in self.root.glob("symbol=*") if path.is_dir())
+
+    def years(self, symbol: str) -> List[int]:
+        directory = self.symbol_dir(symbol)
+        if not directory.is_dir():
+            return []
+        return sorted(int(path.name[len("year="):]) for path in directory.glob("year=*") if path.is_dir())
+
+    def part_files(self, directory: Path) -> List[Path]:
+        # part-<time ns> names sort in the order the files were written
+        return sorted(path for suffix in LAKE_FORMATS.values() for path in directory.glob(f"part-*{suffix}"))
+
+    @staticmethod
+    def file_format(path: Path) -> str:
+        return next(name for name, suffix in LAKE_FORMATS.items() if path.name.endswith(suffix))
+
+    def _write_file(self, table, directory: Path) -> Path:
+        pa = _arrow()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"part-{time.time_ns()}{self.suffix}"
+        tmp_path = directory / f".{path.name}.tmp"
+
+        if self.format == "parquet":
+            pa.parquet.write_table(table, tmp_path, compression="zstd")
+        else:
+            pa.feather.write_feather(table, tmp_path, compression="uncompressed")
+
+        os.replace(tmp_path, path)
+        return path
+
+    def _file_datasets(self, files: List[Path], schema, **options):
+        # one dataset per file format; together they are read as one
+        pa = _arrow()
+        datasets = [
+            pa.dataset.dataset([str(f) for f in files if self.file_format(f) == lake_format], schema=schema,
+                               format=dataset_format, **options)
+            for lake_format, dataset_format in DATASET_FORMATS.items()
+            if any(self.file_format(f) == lake_format for f in files)
+        ]
+        if not datasets:
+            return pa.dataset.dataset([], schema=schema, format=DATASET_FORMATS[self.format])
+        return datasets[0] if len(datasets) == 1 else pa.dataset.dataset(datasets)
+
+    def _read_files(self, files: List[Path], columns: Optional[List[str]] = None):
+        return self._file_datasets(files, self.schema()).to_table(columns=columns)
+
+    def date_range(self, path: Path) -> tuple:
+        """
+            First and last date of one file, without reading its rows: from
+            the Parquet column statistics, or the ends of the memory-mapped
+            Arrow date column.
+        """
+        pa = _arrow()
+        if self.file_format(path) == "parquet":
+            metadata = pa.parquet.ParquetFile(path).metadata
+            column = metadata.schema.to_arrow_schema().get_field_index("date")
+            stats = [metadata.row_group(i).column(column).statistics for i in range(metadata.num_row_groups)]
+            if stats and all(s is not None and s.has_min_max for s in stats):
+                return min(s.min for s in stats), max(s.max for s in stats)
+            return self._ends(self._read_files([path], ["date"]).column("date"))
+
+        with pa.memory_map(str(path)) as source:
+            return self._ends(pa.ipc.open_file(source).read_all().column("date"))
+
+    @staticmethod
+    def _ends(dates) -> tuple:
+        return (dates[0].as_py(), dates[-1].as_py()) if len(dates) else (None, None)
+
+    def frame_to_table(self, df: pd.DataFrame):
+        """Transformed rows of one symbol -> an Arrow table in lake schema, sorted by date."""
+        pa = _arrow()
+        df = df.assign(date=pd.to_datetime(df["date"])).sort_values("date", kind="stable")
+
+        return pa.table({
+            "date": df["date"].to_numpy().astype("datetime64[D]"),
+            "open_price": df["open_price"].to_numpy(dtype=np.float64),
+            "high_price": df["high_price"].to_numpy(dtype=np.float64),
+            "low_price": df["low_price"].to_numpy(dtype=np.float64),
+            "close_price": df["close_price"].to_numpy(dtype=np.float64),
+            "volume": df["volume"].to_numpy(dtype=np.int64),
+            "daily_change_percentage": df["daily_change_percentage"].to_numpy(dtype=np.float64),
+            "extraction_timestamp": pd.to_datetime(df["extraction_timestamp"]).to_numpy().astype("datetime64[s]"),
+        }, schema=self.schema())
+
+    def stored_dates(self, directory: Path, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """
+            Dates stored in a partition, of the files whose date range
+            overlaps start..end (default all of them); only their date
+            column is read.
+        """
+        files = self.part_files(directory)
+        if start is not None or end is not None:
+            ranges = [(path, self.date_range(path)) for path in files]
+            files = [path for path, (first, last) in ranges
+                     if first is not None and (end is None or first <= end) and (start is None or last >= start)]
+
+        if not files:
+            return np.empty(0, dtype="datetime64[D]")
+        return self._read_files(files, ["date"]).column("date").to_numpy()
+
+    def append(self, symbol: str, df: pd.DataFrame) -> int:
+        """Writes the rows of one symbol whose dates are not stored yet; returns how many."""
+        if df.empty:
+            return 0
+
+        table = self.frame_to_table(df)
+        dates = table.column("date").to_numpy()
+        years = dates.astype("datetime64[Y]").astype(int) + 1970
+        written = 0
+
+        for year in np.unique(years):
+            directory = self.partition_dir(symbol, int(year))
+            in_year = years == year
+            # the first row of a date wins, within the batch and against the partition
+            _, first = np.unique(dates[in_year], return_index=True)
+            keep = np.zeros(len(dates), dtype=bool)
+            keep[np.flatnonzero(in_year)[first]] = True
+            # an incremental load only brings dates after the stored ones,
+            # which no file's date range overlaps, so nothing is read
+            stored = self.stored_dates(directory, dates[in_year].min().astype(date), dates[in_year].max().astype(date))
+            keep &= ~np.isin(dates, stored)
+
+            if not keep.any():
+                continue
+
+            self._write_file(table.filter(keep), directory)
+            written += int(keep.sum())
+
+            if len(self.part_files(directory)) >= max(config.LAKE_COMPACT_FILES, 2):
+                self.compact_partition(directory)
+
+        return written
+
+    def compact_partition(self, directory: Path) -> bool:
+        """
+            Merges the files of one partition into a single file sorted by
+            date, in the lake's format (so a lone file of another format is
+            rewritten too). The merged file is in place before the old ones
+            are deleted; if that is interrupted, the next compaction drops
+            the duplicated rows again (the oldest copy of a date wins).
+        """
+        files = self.part_files(directory)
+        if len(files) < 2 and all(path.name.endswith(self.suffix) for path in files):
+            return False
+
+        pa = _arrow()
+        # file by file, so the rows stay in the order they were written
+        table = pa.concat_tables([self._read_files([path]) for path in files])
+        dates = table.column("date").to_numpy()
+        _, first = np.unique(dates, return_index=True)
+        table = table.take(pa.array(first))
+
+        self._write_file(table, directory)
+        for path in files:
+            path.unlink()
+
+        return True
+
+    def compact(self, symbols: Optional[Iterable[str]] = None) -> int:
+        """Compacts every partition of the given symbols (default all); returns how many were merged."""
+        compacted = 0
+
+        for symbol in symbols or self.symbols():
+            for year in self.years(symbol):
+                if self.compact_partition(self.partition_dir(symbol, year)):
+                    compacted += 1
+
+        return compacted
+
+    def watermark(self, symbol: str) -> Optional[str]:
+        """Latest stored date of a symbol ("YYYY-MM-DD"), from the date ranges of its newest year partition."""
+        for year in reversed(self.years(symbol)):
+            lasts = [last for _, last in map(self.date_range, self.part_files(self.partition_dir(symbol, year)))
+                     if last is not None]
+            if lasts:
+                return max(lasts).isoformat()
+        return None
+
+    def dataset(self):
+        files = sorted(path for suffix in LAKE_FORMATS.values()
+                       for path in self.root.glob(f"symbol=*/year=*/part-*{suffix}"))
+        return self._file_datasets(files, self._dataset_schema(), partitioning=self.partitioning(),
+                                   partition_base_dir=str(self.root))
+
+    def _dataset_schema(self):
+        pa = _arrow()
+        schema = self.schema()
+        return schema.append(pa.field("symbol", pa.string())).append(pa.field("year", pa.int32()))
+
+    def _filter(self, symbols: Optional[Iterable[str]], start: Optional[date], end: Optional[date]):
+        pa = _arrow()
+        field = pa.dataset.field
+        conditions = []
+
+        if symbols is not None:
+            conditions.append(field("symbol").isin(list(symbols)))
+        # the year conditions prune whole directories, the date ones rows
+        # (and Parquet row groups, by their statistics)
+        if start is not None:
+            start = pd.Timestamp(start).date()
+            conditions += [field("year") >= start.year, field("date") >= pa.scalar(start, pa.date32())]
+        if end is not None:
+            end = pd.Timestamp(end).date()
+            conditions += [field("year") <= end.year, field("date") <= pa.scalar(end, pa.date32())]
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read(self, symbols: Optional[Iterable[str]] = None, start: Optional[date] = None,
+             end: Optional[date] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+            Bars between start and end (inclusive) as a DataFrame with a
+            "symbol" column, sorted by symbol and date. Only the requested
+            columns are read, and only from the partitions the filter can match.
+        """
+        columns = [c for c in (columns or LAKE_COLUMNS) if c != "symbol"]
+        if not self.root.is_dir():
+            return pd.DataFrame(columns=["symbol", *columns])
+
+        # date is always read, for the sort
+        wanted = ["symbol", *(["date"] if "date" not in columns else []), *columns]
+        table = self.dataset().to_table(columns=wanted, filter=self._filter(symbols, start, end))
+        df = table.to_pandas(date_as_object=False)
+        df = df.sort_values(["symbol", "date"], kind="stable").reset_index(drop=True)
+        return df[["symbol", *columns]]
+
+    def panel(self, symbols: Iterable[str], start: Optional[date] = None, end: Optional[date] = None,
+              field: str = "close_price") -> Dict[str, np.ndarray]:
+        """
+            One field for several symbols as a date x symbol matrix, in the
+            shape of query.StockQuery.panel: {"date", "symbol", "values"}.
+        """
+        if field not in PANEL_FIELDS:
+            raise ValueError(f"unknown panel field '{field}' (expected one of {', '.join(PANEL_FIELDS)})")
+
+        symbols = list(symbols)
+        names = np.array(symbols, dtype=str)
+        if not self.root.is_dir():
+            return {"date": np.empty(0, dtype="datetime64[D]"), "symbol": names,
+                    "values": np.empty((0, len(symbols)))}
+
+        table = self.dataset().to_table(columns=["symbol", "date", field],
+                                        filter=self._filter(symbols, start, end))
+
+        dates, date_codes = np.unique(table.column("date").to_numpy(), return_inverse=True)
+        # each partition holds one symbol, so look up the few distinct names
+        # rather than one string per row
+        encoded = table.column("symbol").combine_chunks().dictionary_encode()
+        found = encoded.dictionary.to_numpy(zero_copy_only=False).astype(str)
+        order = np.argsort(names)
+        symbol_index = order[np.searchsorted(names, found, sorter=order)][encoded.indices.to_numpy()]
+
+        values = np.full((len(dates), len(symbols)), np.nan)
+        values[date_codes, symbol_index] = table.column(field).to_numpy(zero_copy_only=False)
+        return {"date": dates.astype("datetime64[D]"), "symbol": names, "values": values}
+
+
+def read_watermarks(symbols: List[str], root: Optional[Path] = None) -> Dict[str, str]:
+    lake = DataLake(root)
+    print(f"reading stored high-water marks from {lake.root}...")
+    watermarks = {}
+
+    for symbol in symbols:
+        latest = lake.watermark(symbol)
+        if latest:
+            watermarks[symbol] = latest
+        print(f"  {symbol}: {latest or 'new symbol'}")
+
+    return watermarks
+
+
+def write_symbol(lake: DataLake, symbol: str, df: pd.DataFrame) -> int:
+    with metrics.timer(symbol, "lake_seconds"):
+        written = lake.append(symbol, df)
+    metrics.add(symbol, "lake_rows_written", written)
+    print(f"   lake: wrote {written} new rows for {symbol}")
+    return written
+
+
+def load_lake_data(transformed_data: Mapping[str, pd.DataFrame]):
+    lake = DataLake()
+    print(f"STARTING LAKE LOAD ({lake.format})")
+
+    total_written = 0
+    for symbol, df in transformed_data.items():
+        total_written += write_symbol(lake, symbol, df)
+
+    print("LAKE LOAD COMPLETE")
+    print(f"total new rows written: {total_written}")
+    print(f"lake location: {lake.root}")
+
+
+def run_compaction(root: Optional[Path] = None) -> bool:
+    lake = DataLake(root)
+    print("COMPACTING DATA LAKE")
+    print(f"lake: {lake.root} ({lake.format})")
+
+    compacted = lake.compact()
+
+    print("COMPACTION COMPLETE")
+    print(f"partitions merged: {compacted}")
+    return True
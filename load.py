@@ -1,18 +1,48 @@
 import sqlite3
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Mapping, Optional
 from pathlib import Path
 
+import analytics
 import config
+# commit_write and the generation helpers are re-exported for existing callers
+from db_meta import META_TABLE, commit_write, create_meta_table, read_write_generation, write_generation
+from intraday_store import load_intraday_data
+from lake import load_lake_data
+from metrics import metrics
+from series import DAILY, Series
 
+# both are covered by the index behind UNIQUE(symbol, date)
+REDUNDANT_INDEXES = ["idx_symbol", "idx_symbol_date"]
 
-def get_database_connection() -> sqlite3.Connection:
-    print(f"connecting to database: {config.DATABASE_PATH}")
+# the columns analytics.py derives its tables from
+ANALYZED_COLUMNS = ["open_price", "high_price", "low_price", "close_price", "volume"]
+
+# what config.LOAD_TARGETS may name
+TARGETS = ("database", "lake")
+
+TABLE_COLUMNS_SQL = """
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        open_price REAL NOT NULL,
+        high_price REAL NOT NULL,
+        low_price REAL NOT NULL,
+        close_price REAL NOT NULL,
+        volume INTEGER NOT NULL,
+        daily_change_percentage REAL,
+        extraction_timestamp TIMESTAMP NOT NULL,"""
+
+
+def get_database_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    db_path = db_path or config.DATABASE_PATH
+    print(f"connecting to database: {db_path}")
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path)
         conn.execute("PRAGMA foreign_keys = ON")
+        apply_storage_profile(conn)
         print("database connection established")
         return conn
 
@@ -21,28 +51,40 @@ def get_database_connection() -> sqlite3.Connection:
         raise
 
 
-def create_table_if_not_exists(conn: sqlite3.Connection):
-    print(f"creating table '{config.TABLE_NAME}' if not exists...")
+def apply_storage_profile(conn: sqlite3.Connection):
+    conn.execute(f"PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = {int(config.SQLITE_CACHE_SIZE)}")
+    conn.execute(f"PRAGMA temp_store = {config.SQLITE_TEMP_STORE}")
 
-    # SQL query
-    create_table_sql = f"""
-    CREATE TABLE IF NOT EXISTS {config.TABLE_NAME} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        symbol TEXT NOT NULL,
-        date DATE NOT NULL,
-        open_price REAL NOT NULL,
-        high_price REAL NOT NULL,
-        low_price REAL NOT NULL,
-        close_price REAL NOT NULL,
-        volume INTEGER NOT NULL,
-        daily_change_percentage REAL,
-        extraction_timestamp TIMESTAMP NOT NULL,
+
+def table_create_sql(table_name: str, without_rowid: bool) -> str:
+    if without_rowid:
+        return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} ({TABLE_COLUMNS_SQL}
+        PRIMARY KEY(symbol, date)
+    ) WITHOUT ROWID
+    """
+
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,{TABLE_COLUMNS_SQL}
         UNIQUE(symbol, date)
     )
     """
 
+
+def create_table_if_not_exists(conn: sqlite3.Connection):
+    print(f"creating table '{config.TABLE_NAME}' if not exists...")
+
+    create_table_sql = table_create_sql(config.TABLE_NAME, config.SQLITE_WITHOUT_ROWID)
+
     try:
         conn.execute(create_table_sql)
+        create_meta_table(conn)
+        if config.ANALYTICS_ENABLED:
+            analytics.create_tables(conn)
         conn.commit()
         print(f"table '{config.TABLE_NAME}' ready")
 
@@ -53,68 +95,132 @@ def create_table_if_not_exists(conn: sqlite3.Connection):
 
 def create_index_if_not_exists(conn: sqlite3.Connection):
     print("creating indexes...")
-    index_symbol_sql = f"""
-    CREATE INDEX IF NOT EXISTS idx_symbol 
-    ON {config.TABLE_NAME}(symbol)
-    """
 
+    # (symbol) and (symbol, date) lookups already use the UNIQUE/PRIMARY KEY
+    # index; only cross-symbol date scans need their own index
     index_date_sql = f"""
     CREATE INDEX IF NOT EXISTS idx_date 
     ON {config.TABLE_NAME}(date)
     """
 
-    index_symbol_date_sql = f"""
-    CREATE INDEX IF NOT EXISTS idx_symbol_date 
-    ON {config.TABLE_NAME}(symbol, date)
-    """
-
     try:
-        conn.execute(index_symbol_sql)
         conn.execute(index_date_sql)
-        conn.execute(index_symbol_date_sql)
+        drop_redundant_indexes(conn)
         conn.commit()
 
-        print("iindexes created")
+        print("indexes created")
 
     except sqlite3.Error as e:
         print(f"failed to create indexes: {e}")
         raise
 
-def insert_data(conn: sqlite3.Connection, df: pd.DataFrame, symbol: str) -> int:
+
+def drop_redundant_indexes(conn: sqlite3.Connection):
+    for index_name in REDUNDANT_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+def is_without_rowid(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (config.TABLE_NAME,)
+    ).fetchone()
+    return bool(row) and "WITHOUT ROWID" in row[0].upper()
+
+
+def migrate_storage(conn: sqlite3.Connection, without_rowid: bool = False):
+    """
+        1. Drop the indexes duplicated by UNIQUE(symbol, date)
+        2. Optionally rebuild the table WITHOUT ROWID, clustered on (symbol, date)
+        3. Refresh planner statistics
+    """
+    print("MIGRATING DATABASE STORAGE")
+
+    try:
+        drop_redundant_indexes(conn)
+        conn.commit()
+        print(f"dropped redundant indexes: {', '.join(REDUNDANT_INDEXES)}")
+
+        if without_rowid and not is_without_rowid(conn):
+            print(f"rebuilding '{config.TABLE_NAME}' WITHOUT ROWID...")
+            staging_table = f"{config.TABLE_NAME}_rebuild"
+            columns = ("symbol, date, open_price, high_price, low_price, close_price, "
+                       "volume, daily_change_percentage, extraction_timestamp")
+
+            conn.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            conn.execute(table_create_sql(staging_table, without_rowid=True))
+            conn.execute(f"""
+            INSERT INTO {staging_table} ({columns})
+            SELECT {columns} FROM {config.TABLE_NAME} ORDER BY symbol, date
+            """)
+            conn.execute(f"DROP TABLE {config.TABLE_NAME}")
+            conn.execute(f"ALTER TABLE {staging_table} RENAME TO {config.TABLE_NAME}")
+            conn.commit()
+
+            create_index_if_not_exists(conn)
+            print("table rebuilt")
+
+        conn.execute("ANALYZE")
+        conn.commit()
+        print("MIGRATION COMPLETE")
+
+    except sqlite3.Error as e:
+        print(f"migration failed: {e}")
+        conn.rollback()
+        raise
+
+
+def insert_data(conn: sqlite3.Connection, df: pd.DataFrame, symbol: str, commit: bool = True,
+                replace: bool = False) -> int:
+    """
+        replace=True overwrites existing (symbol, date) rows instead of
+        skipping them, for reprocessing with changed transform logic.
+    """
     print(f"inserting data for {symbol}...")
+
+    if df.empty:
+        print(f"   no new rows for {symbol}")
+        return 0
+
+    conflict = "REPLACE" if replace else "IGNORE"
     insert_sql = f"""
-    INSERT OR IGNORE INTO {config.TABLE_NAME} 
+    INSERT OR {conflict} INTO {config.TABLE_NAME} 
     (symbol, date, open_price, high_price, low_price, close_price, 
      volume, daily_change_percentage, extraction_timestamp)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
 
     try:
-        cursor = conn.cursor()
-        rows_before = cursor.execute(f"SELECT COUNT(*) FROM {config.TABLE_NAME}").fetchone()[0]
-        records = []
-        for _, row in df.iterrows():
-            record = (
-                row["symbol"],
-                row["date"].strftime("%Y-%m-%d"),
-                row["open_price"],
-                row["high_price"],
-                row["low_price"],
-                row["close_price"],
-                row["volume"],
-                row["daily_change_percentage"],
-                row["extraction_timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-            )
-            records.append(record)
-
-        cursor.executemany(insert_sql, records)
-        conn.commit()
-
-        rows_after = cursor.execute(f"SELECT COUNT(*) FROM {config.TABLE_NAME}").fetchone()[0]
-        rows_inserted = rows_after - rows_before
-
-        print(f"   inserted {rows_inserted} new rows for {symbol}")
-        print(f"   (skipped {len(records) - rows_inserted} duplicates)")
+        # build the records from whole columns; tolist() hands sqlite3 plain
+        # Python values
+        records = list(zip(
+            df["symbol"].tolist(),
+            pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d").tolist(),
+            df["open_price"].tolist(),
+            df["high_price"].tolist(),
+            df["low_price"].tolist(),
+            df["close_price"].tolist(),
+            df["volume"].tolist(),
+            df["daily_change_percentage"].tolist(),
+            pd.to_datetime(df["extraction_timestamp"]).dt.strftime("%Y-%m-%d %H:%M:%S").tolist()
+        ))
+
+        # total_changes counts rows actually written; ignored duplicates
+        # don't count, so no COUNT(*) scans are needed
+        with metrics.timer(symbol, "insert_seconds"):
+            changes_before = conn.total_changes
+            conn.executemany(insert_sql, records)
+            rows_inserted = conn.total_changes - changes_before
+        metrics.add(symbol, "rows_inserted", rows_inserted)
+
+        if commit:
+            commit_write(conn)
+
+        if replace:
+            print(f"   wrote {rows_inserted} rows for {symbol}")
+        else:
+            print(f"   inserted {rows_inserted} new rows for {symbol}")
+            print(f"   (skipped {len(records) - rows_inserted} duplicates)")
 
         return rows_inserted
 
@@ -124,6 +230,91 @@ def insert_data(conn: sqlite3.Connection, df: pd.DataFrame, symbol: str) -> int:
         raise
 
 
+def analytics_start(conn: sqlite3.Connection, df: pd.DataFrame, symbol: str, replace: bool = False) -> Optional[str]:
+    """
+        The date analytics.py has to recompute symbol from once df is
+        inserted: the earliest date the insert adds or, with replace=True,
+        changes the prices or volume of. None if analytics is off or the
+        insert changes nothing. Reads the stored rows, so it must run
+        before insert_data.
+    """
+    if not config.ANALYTICS_ENABLED or df.empty:
+        return None
+
+    dates = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d").to_numpy()
+    # the (symbol, date) index serves the range; rows past the watermark
+    # (a plain incremental load) find nothing
+    rows = conn.execute(
+        f"SELECT date, {', '.join(ANALYZED_COLUMNS)} FROM {config.TABLE_NAME} "
+        f"WHERE symbol = ? AND date >= ? AND date <= ?",
+        (symbol, dates.min(), dates.max())
+    ).fetchall()
+    stored = pd.DataFrame(rows, columns=["date", *ANALYZED_COLUMNS]).set_index("date")
+
+    changed = ~np.isin(dates, stored.index.to_numpy())
+    if replace and not stored.empty:
+        before = stored.reindex(dates).to_numpy()
+        changed |= (before != df[ANALYZED_COLUMNS].to_numpy()).any(axis=1)
+
+    return dates[changed].min() if changed.any() else None
+
+
+def update_analytics(conn: sqlite3.Connection, starts: Dict[str, Optional[str]]):
+    """
+        Recomputes each symbol's derived tables from its start date (see
+        analytics_start) on; symbols whose start is None changed nothing.
+        The technical indicators of all of them are computed as one panel.
+    """
+    starts = {symbol: from_date for symbol, from_date in starts.items() if from_date is not None}
+    if not starts:
+        return
+
+    for symbol, from_date in starts.items():
+        with metrics.timer(symbol, "analytics_seconds"):
+            analytics.update_symbol(conn, symbol, from_date)
+
+    with metrics.stage("technical_indicators"):
+        analytics.update_technical(conn, starts)
+
+
+def get_watermarks(conn: sqlite3.Connection, symbols: List[str]) -> Dict[str, str]:
+    # one MAX(date) lookup per symbol is served by the UNIQUE(symbol, date)
+    # index, unlike a GROUP BY over the whole table
+    query = f"SELECT MAX(date) FROM {config.TABLE_NAME} WHERE symbol = ?"
+    watermarks = {}
+
+    for symbol in symbols:
+        latest = conn.execute(query, (symbol,)).fetchone()[0]
+        if latest:
+            watermarks[symbol] = latest
+
+    return watermarks
+
+
+def read_watermarks(symbols: List[str], db_path: Optional[Path] = None) -> Dict[str, str]:
+    db_path = Path(db_path or config.DATABASE_PATH)
+    print(f"reading stored high-water marks from {db_path}...")
+
+    if not db_path.exists():
+        return {}
+
+    conn = get_database_connection(db_path)
+
+    try:
+        watermarks = get_watermarks(conn, symbols)
+    except sqlite3.OperationalError as e:
+        # table not created yet
+        print(f"no watermarks available: {e}")
+        watermarks = {}
+    finally:
+        conn.close()
+
+    for symbol in symbols:
+        print(f"  {symbol}: {watermarks.get(symbol, 'new symbol')}")
+
+    return watermarks
+
+
 def verify_data(conn: sqlite3.Connection, symbol: str):
     print(f"\nverifying data for {symbol}...")
     query = f"""
@@ -186,43 +377,88 @@ def get_database_stats(conn: sqlite3.Connection):
         print(f"failed to get stats: {e}")
 
 
+def print_load_counts(written: Dict[str, int]):
+    # counted by the writes themselves, so no scan of the table is needed
+    print("\nrows written per symbol:")
+    for symbol, count in written.items():
+        print(f"  {symbol}: {count}")
+
+
+def load_targets() -> List[str]:
+    """config.LOAD_TARGETS as a list, e.g. ["database", "lake"]."""
+    targets = [target.strip() for target in config.LOAD_TARGETS.split(",") if target.strip()]
+    # "sqlite" named the database before STORAGE_BACKEND could be DuckDB
+    targets = ["database" if target == "sqlite" else target for target in targets]
+    unknown = [target for target in targets if target not in TARGETS]
+
+    if unknown or not targets:
+        raise ValueError(f"invalid LOAD_TARGETS '{config.LOAD_TARGETS}' "
+                         f"(expected one or more of {', '.join(TARGETS)})")
+    return targets
 
-def load_all_data(transformed_data: Dict[str, pd.DataFrame]):
+
+def load_all_data(transformed_data: Mapping[str, pd.DataFrame], series: Series = DAILY):
+    """
+        Writes the daily bars to every target in config.LOAD_TARGETS: the
+        database (SQLite or DuckDB, see storage.py) and/or the partitioned
+        data lake (see lake.py).
+
+        Intraday bars go to the partitioned bar store instead (see
+        intraday_store.py).
+    """
+    if series.intraday:
+        load_intraday_data(transformed_data, series.interval)
+        return
+
+    targets = load_targets()
+    if "database" in targets:
+        load_database(transformed_data)
+    if "lake" in targets:
+        load_lake_data(transformed_data)
+
+
+def load_database(transformed_data: Mapping[str, pd.DataFrame]):
     """
-        1. Connect to database
+        1. Connect to the config.STORAGE_BACKEND database
         2. Create table and indexes
-        3. Insert data for each stock
+        3. Insert data for each stock (single transaction)
         4. Verify insertion
-        5. Show statistics
+        5. Show the rows written per symbol (and, with
+           config.LOAD_TABLE_STATS, table-wide statistics)
     """
-
+    # storage.py builds on this module
+    from storage import get_backend
 
     print("STARTING DATA LOAD")
 
-    conn = get_database_connection()
+    backend = get_backend()
 
     try:
-        create_table_if_not_exists(conn)
-        create_index_if_not_exists(conn)
+        backend.create_schema()
 
-        total_inserted = 0
+        written = {}
 
-        for symbol, df in transformed_data.items():
-            print(f"LOADING: {symbol}")
+        # all symbols go in one transaction, committed once at the end
+        try:
+            for symbol, df in transformed_data.items():
+                print(f"LOADING: {symbol}")
+                written[symbol] = backend.upsert(symbol, df)
+            backend.commit()
+        except Exception:
+            backend.rollback()
+            raise
 
-            rows_inserted = insert_data(conn, df, symbol)
-            total_inserted += rows_inserted
-            verify_data(conn, symbol)
+        for symbol in transformed_data:
+            backend.verify(symbol)
 
-        get_database_stats(conn)
+        print_load_counts(written)
+        if config.LOAD_TABLE_STATS:
+            backend.print_stats()
 
         print("DATA LOAD COMPLETE")
-        print(f"total new records inserted: {total_inserted}")
-        print(f"database location: {config.DATABASE_PATH}")
+        print(f"total new records inserted: {sum(written.values())}")
+        print(f"database location: {backend.path}")
 
     finally:
-        conn.close()
+        backend.close()
         print("\ndatabase connection closed")
-
-
-
@@ -1,104 +1,549 @@
+import contextlib
 import sys
-from datetime import datetime
+import threading
+from datetime import date, datetime
 from pathlib import Path
 
+# pipeline modules (pandas, pydantic, requests) are imported by the commands
+# that use them, so --help and argument errors return immediately
 import config
-from extract import extract_all_stocks
-from transform import transform_all_stocks
-from load import load_all_data
+from metrics import metrics, write_run_report, format_summary
+from series import DAILY, Series, intraday
 
 
-def setup_logging():
+def setup_logging(shard: tuple = None):
+    config.LOGS_DIR.mkdir(parents=True, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = config.LOGS_DIR / f"etl_pipeline_{timestamp}.log"
+    # shards started together must not share a log file
+    suffix = f"_shard_{shard[0]}_of_{shard[1]}" if shard else ""
+    log_filename = config.LOGS_DIR / f"etl_pipeline_{timestamp}{suffix}.log"
     return log_filename
 
 
+class TeeOutput:
+    """
+        Standard output that also appends to the run's log file, so what
+        every stage prints (per symbol from extract, transform and load,
+        from any thread) ends up in the log, not only on the console.
+    """
+
+    def __init__(self, console, log_file: Path):
+        self.console = console
+        self.log_file = log_file
+        self.log = open(log_file, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.console.write(text)
+            self.log.write(text)
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.console.flush()
+            self.log.flush()
+
+    def close(self):
+        with self.lock:
+            self.log.close()
+
+
+@contextlib.contextmanager
+def logged_output(log_file: Path):
+    """
+        Tees sys.stdout into log_file. sys.stdout is process-wide, so this is
+        only done by the main thread of a process running a single pipeline
+        (the scheduler starts a process per run); from any other thread,
+        whatever else the process prints would land in this run's log.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError("logged_output swaps the process-wide sys.stdout: enter it from the main thread")
+
+    tee = TeeOutput(sys.stdout, log_file)
+    try:
+        with contextlib.redirect_stdout(tee):
+            yield tee
+    finally:
+        tee.close()
+
+
 def log_and_print(message: str, log_file: Path = None):
     print(message)
 
-    if log_file:
+    # inside logged_output() the print above already went to the log
+    logged = isinstance(sys.stdout, TeeOutput) and sys.stdout.log_file == log_file
+    if log_file and not logged:
         with open(log_file, 'a', encoding='utf-8') as f:
             f.write(message + '\n')
 
-def run_etl_pipeline():
-    log_file = setup_logging()
+def database_path() -> Path:
+    # where the "database" load target writes
+    return config.DUCKDB_PATH if config.STORAGE_BACKEND.strip().lower() == "duckdb" else config.DATABASE_PATH
+
+
+def run_etl_pipeline(strict_model: bool = False, stream: bool = False, shard: tuple = None,
+                     series: Series = DAILY):
+    log_file = setup_logging(shard)
+    with logged_output(log_file):
+        return _run_pipeline(log_file, strict_model, stream, shard, series)
 
-    print("ETL PIPELINE STARTED")
-    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Log file: {log_file}")
-    print(f"Stocks: {', '.join(config.STOCK_SYMBOLS)}")
+
+def _run_pipeline(log_file: Path, strict_model: bool, stream: bool, shard: tuple, series: Series):
+    metrics.reset()
+    success = False
+    shared_db = None
+
+    if shard:
+        from sharding import configure_shard
+        shared_db = configure_shard(*shard)
+
+    log_and_print("ETL PIPELINE STARTED", log_file)
+    if shard:
+        log_and_print(f"Shard: {shard[0]}/{shard[1]} (staging into {config.DATABASE_PATH})", log_file)
+    log_and_print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", log_file)
+    log_and_print(f"Log file: {log_file}", log_file)
+    log_and_print(f"Stocks: {', '.join(config.STOCK_SYMBOLS)}", log_file)
+    log_and_print(f"Series: {series.name}", log_file)
 
     try:
-        print("STEP 1: EXTRACT - Fetching data from Alpha Vantage API")
-        extracted_files = extract_all_stocks()
+        if shard and not config.STOCK_SYMBOLS:
+            log_and_print("\nNothing to do: no symbols hash to this shard", log_file)
+            success = True
+            return True
+
+        config.require_api_key()
+
+        import raw_cache
+        from extract import extract_all_stocks
+        from transform import transform_all_stocks
+        from load import load_all_data, load_targets
+        from storage import read_watermarks
+
+        watermarks = None
+        if config.INCREMENTAL_EXTRACT:
+            if series.intraday:
+                from intraday_store import read_watermarks as read_intraday_watermarks
+                watermarks = read_intraday_watermarks(config.STOCK_SYMBOLS, series.interval)
+            elif "database" not in load_targets():
+                from lake import read_watermarks as read_lake_watermarks
+                watermarks = read_lake_watermarks(config.STOCK_SYMBOLS)
+            elif shared_db:
+                from sharding import shard_watermarks
+                watermarks = shard_watermarks(config.STOCK_SYMBOLS, shared_db)
+            else:
+                watermarks = read_watermarks(config.STOCK_SYMBOLS)
+
+        if stream:
+            success = run_streaming(watermarks, strict_model, log_file)
+            return success
+
+        log_and_print("STEP 1: EXTRACT - Fetching data from Alpha Vantage API", log_file)
+        with metrics.stage("extract"):
+            extracted_files = extract_all_stocks(watermarks, series=series)
         if not extracted_files:
-            print("\nEXTRACTION FAILED: No data was extracted")
+            log_and_print("\nEXTRACTION FAILED: No data was extracted", log_file)
             return False
-        print(f"\nExtraction complete: {len(extracted_files)} stocks")
+        log_and_print(f"\nExtraction complete: {len(extracted_files)} stocks", log_file)
+
+        if config.RAW_CACHE_ENABLED:
+            extracted_files = raw_cache.skip_loaded_payloads(extracted_files)
+            if not extracted_files:
+                log_and_print("\nNothing to do: every payload was already loaded", log_file)
+                raw_cache.evict_raw_data(series.raw_dir())
+                success = True
+                return True
 
 
-        print("STEP 2: TRANSFORM - Cleaning and validating data")
-        transformed_data = transform_all_stocks(extracted_files)
+        log_and_print("STEP 2: TRANSFORM - Cleaning and validating data", log_file)
+        with metrics.stage("transform"):
+            transformed_data = transform_all_stocks(extracted_files, watermarks, strict_model, series=series)
         if not transformed_data:
-            print("\nTRANSFORMATION FAILED: No data was transformed")
+            log_and_print("\nTRANSFORMATION FAILED: No data was transformed", log_file)
             return False
-        total_records = sum(len(df) for df in transformed_data.values())
-        print(f"\nTransformation complete: {total_records} records")
+        total_records = transformed_data.rows
+        log_and_print(f"\nTransformation complete: {total_records} records", log_file)
+        if config.RAW_CACHE_ENABLED:
+            raw_cache.mark_files([extracted_files[s] for s in transformed_data], "transformed")
 
 
-        print("STEP 3: LOAD - Inserting data into database")
-        load_all_data(transformed_data)
-        print(f"\nLoad complete")
+        log_and_print("STEP 3: LOAD - Inserting data into database", log_file)
+        with metrics.stage("load"):
+            load_all_data(transformed_data, series)
+        log_and_print(f"\nLoad complete", log_file)
+        if config.RAW_CACHE_ENABLED:
+            raw_cache.mark_files([extracted_files[s] for s in transformed_data], "loaded")
+            raw_cache.evict_raw_data(series.raw_dir())
 
-        print("ETL PIPELINE SUCCESS")
-        print(f"Stocks processed: {len(transformed_data)}")
-        print(f"Total records: {total_records}")
-        print(f"Database: {config.DATABASE_PATH}")
-        print(f"Log file: {log_file}")
+        log_and_print("ETL PIPELINE SUCCESS", log_file)
+        log_and_print(f"Stocks processed: {len(transformed_data)}", log_file)
+        log_and_print(f"Total records: {total_records}", log_file)
+        log_and_print(f"Database: {config.INTRADAY_DIR if series.intraday else database_path()}", log_file)
+        if not series.intraday and "lake" in load_targets():
+            log_and_print(f"Lake: {config.LAKE_DIR}", log_file)
+        log_and_print(f"Log file: {log_file}", log_file)
+        success = True
         return True
 
     except KeyboardInterrupt:
-        print("\nPipeline interrupted by user (Ctrl+C)")
+        log_and_print("\nPipeline interrupted by user (Ctrl+C)", log_file)
         return False
 
     except Exception as e:
-        print("ETL PIPELINE FAILED")
-        print(f"Error: {e}")
-        print(f"Error type: {type(e).__name__}")
+        log_and_print("ETL PIPELINE FAILED", log_file)
+        log_and_print(f"Error: {e}", log_file)
+        log_and_print(f"Error type: {type(e).__name__}", log_file)
         print("\nCheck the log file for details:")
         print(f"  {log_file}")
 
         import traceback
-        print("\nFull error traceback:")
-        traceback.print_exc()
+        log_and_print("\nFull error traceback:", log_file)
+        log_and_print(traceback.format_exc(), log_file)
+
+        return False
+
+    finally:
+        write_report(log_file, success, shard)
+
+
+def write_report(log_file: Path, success: bool, shard: tuple = None):
+    import api_client
+
+    report = metrics.report(success, api_client.latency_stats.summary())
+    report_path = log_file.with_suffix(".json")
+    prometheus_name = f"etl_metrics_shard_{shard[0]}_of_{shard[1]}.prom" if shard else "etl_metrics.prom"
+    prometheus_path = config.LOGS_DIR / prometheus_name if config.METRICS_PROMETHEUS else None
+
+    try:
+        write_run_report(report, report_path, prometheus_path)
+    except OSError as e:
+        print(f"could not write run report: {e}")
+        return
+
+    for line in format_summary(report):
+        log_and_print(line, log_file)
+    log_and_print(f"Run report: {report_path}", log_file)
+    if prometheus_path:
+        log_and_print(f"Prometheus metrics: {prometheus_path}", log_file)
+
 
+def run_streaming(watermarks, strict_model: bool, log_file: Path) -> bool:
+    import raw_cache
+    from load import load_targets
+    from streaming import stream_all_stocks
+
+    log_and_print("STREAMING: Extract, transform and load overlap per symbol", log_file)
+    # the stages overlap, so only the whole run can be timed
+    with metrics.stage("stream"):
+        summary = stream_all_stocks(watermarks, strict_model)
+    if config.RAW_CACHE_ENABLED:
+        raw_cache.evict_raw_data()
+
+    if not summary["extracted"]:
+        log_and_print("\nEXTRACTION FAILED: No data was extracted", log_file)
+        return False
+    if not summary["loaded"] and not summary["skipped"]:
+        log_and_print("\nPIPELINE FAILED: No data was loaded", log_file)
         return False
 
+    log_and_print("ETL PIPELINE SUCCESS", log_file)
+    log_and_print(f"Stocks processed: {summary['loaded']}", log_file)
+    log_and_print(f"Total records: {summary['records']}", log_file)
+    log_and_print(f"Database: {database_path()}", log_file)
+    if "lake" in load_targets():
+        log_and_print(f"Lake: {config.LAKE_DIR}", log_file)
+    log_and_print(f"Log file: {log_file}", log_file)
+    return True
+
 
 def print_usage():
     print("ETL Pipeline - Stock Market Data")
     print("\nUsage:")
     print("  python main.py                 Run the complete ETL pipeline")
+    print("  python main.py --stream        Overlap extract, transform and load per symbol")
+    print("  python main.py --strict-model  Validate every row with the Pydantic model")
+    print("       [--indicators rsi_14,atr]  Store technical indicators (default: INDICATORS in .env)")
+    print("  python main.py --migrate-db    Drop redundant indexes from the database")
+    print("       [--without-rowid]         ...and rebuild the table clustered on (symbol, date)")
+    print("  python main.py --compact-lake  Merge the small files of every data lake partition")
+    print("  python main.py --replay        Rebuild the database from raw_data/ (offline)")
+    print("       [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--symbols AAPL,MSFT] [--db PATH]")
+    print("  python main.py --intraday      Fetch intraday bars into the bar store")
+    print("       [--interval 1min|5min|15min|30min|60min]  (default: INTRADAY_INTERVAL in .env)")
+    print("  python main.py --shard 1/4     Run one shard of the symbols into a staging database")
+    print("  python main.py --shards 4      Run every shard as a local process, then merge")
+    print("  python main.py --merge         Merge the shard staging databases into the database")
+    print("  python main.py --serve         Serve read-only price queries over HTTP")
+    print("       [--port N]")
     print("  python main.py --help          Show this help message")
     print("\nConfiguration:")
     print(f"  Stocks: {', '.join(config.STOCK_SYMBOLS)}")
     print(f"  Database: {config.DATABASE_PATH}")
+    print(f"  Load targets: {config.LOAD_TARGETS} (storage backend: {config.STORAGE_BACKEND})")
     print(f"  Raw data directory: {config.RAW_DATA_DIR}")
     print("\nEdit .env file to change configuration")
 
 
-def main():
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['--help', '-h', 'help']:
+def parse_arguments():
+    options = {
+        "strict_model": False,
+        "stream": False,
+        "migrate_db": False,
+        "without_rowid": False,
+        "replay": False,
+        "from": None,
+        "to": None,
+        "symbols": None,
+        "db": None,
+        "indicators": None,
+        "serve": False,
+        "port": None,
+        "shard": None,
+        "shards": None,
+        "merge": False,
+        "intraday": False,
+        "interval": None,
+        "compact_lake": False,
+    }
+
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+
+        if arg in ['--help', '-h', 'help']:
             print_usage()
             sys.exit(0)
+
+        elif arg == '--strict-model':
+            options["strict_model"] = True
+            i += 1
+
+        elif arg == '--stream':
+            options["stream"] = True
+            i += 1
+
+        elif arg == '--migrate-db':
+            options["migrate_db"] = True
+            i += 1
+
+        elif arg == '--without-rowid':
+            options["without_rowid"] = True
+            i += 1
+
+        elif arg == '--compact-lake':
+            options["compact_lake"] = True
+            i += 1
+
+        elif arg == '--replay':
+            options["replay"] = True
+            i += 1
+
+        elif arg == '--serve':
+            options["serve"] = True
+            i += 1
+
+        elif arg == '--intraday':
+            options["intraday"] = True
+            i += 1
+
+        elif arg == '--interval':
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a value")
+                print_usage()
+                sys.exit(1)
+
+            try:
+                intraday(sys.argv[i + 1])
+            except ValueError as e:
+                print(f"error: {e}")
+                sys.exit(1)
+            options["interval"] = sys.argv[i + 1]
+            i += 2
+
+        elif arg == '--merge':
+            options["merge"] = True
+            i += 1
+
+        elif arg == '--shard':
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a value")
+                print_usage()
+                sys.exit(1)
+
+            from sharding import parse_shard
+            try:
+                options["shard"] = parse_shard(sys.argv[i + 1])
+            except ValueError as e:
+                print(f"error: {e}")
+                sys.exit(1)
+            i += 2
+
+        elif arg == '--shards':
+            if i + 1 >= len(sys.argv) or not sys.argv[i + 1].isdigit() or int(sys.argv[i + 1]) < 1:
+                print(f"Error: {arg} requires a number of shards")
+                print_usage()
+                sys.exit(1)
+            options["shards"] = int(sys.argv[i + 1])
+            i += 2
+
+        elif arg == '--port':
+            if i + 1 >= len(sys.argv) or not sys.argv[i + 1].isdigit():
+                print(f"Error: {arg} requires a port number")
+                print_usage()
+                sys.exit(1)
+            options["port"] = int(sys.argv[i + 1])
+            i += 2
+
+        elif arg == '--indicators':
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a value")
+                print_usage()
+                sys.exit(1)
+
+            from indicators import parse_indicator_specs
+            try:
+                options["indicators"] = parse_indicator_specs(sys.argv[i + 1])
+            except ValueError as e:
+                print(f"error: {e}")
+                sys.exit(1)
+            i += 2
+
+        elif arg in ['--from', '--to', '--symbols', '--db']:
+            if i + 1 >= len(sys.argv):
+                print(f"Error: {arg} requires a value")
+                print_usage()
+                sys.exit(1)
+
+            value = sys.argv[i + 1]
+
+            if arg in ['--from', '--to']:
+                try:
+                    value = date.fromisoformat(value)
+                except ValueError:
+                    print(f"error: Invalid date '{value}' for {arg}")
+                    print(" dates must be in YYYY-MM-DD format")
+                    sys.exit(1)
+            elif arg == '--symbols':
+                value = [symbol.strip() for symbol in value.split(",") if symbol.strip()]
+            else:
+                value = Path(value)
+
+            options[arg[2:]] = value
+            i += 2
+
         else:
-            print(f"unknown argument: {sys.argv[1]}")
+            print(f"unknown argument: {arg}")
             print_usage()
             sys.exit(1)
 
-    success = run_etl_pipeline()
+    if options["without_rowid"] and not options["migrate_db"]:
+        print("--without-rowid can only be used with --migrate-db")
+        sys.exit(1)
+
+    if options["port"] is not None and not options["serve"]:
+        print("--port can only be used with --serve")
+        sys.exit(1)
+
+    other_modes = (options["migrate_db"] or options["replay"] or options["serve"] or options["merge"]
+                   or options["compact_lake"])
+    # the indicators are stored with the analytics tables, which every load
+    # of the SQLite database updates except a shard's staging load
+    if options["indicators"] is not None and (options["migrate_db"] or options["serve"] or options["compact_lake"]
+                                              or options["shard"] or options["intraday"]):
+        print("--indicators can only be used when running the pipeline (daily bars), --replay, --merge or --shards")
+        sys.exit(1)
+
+    if options["indicators"] is not None and not config.ANALYTICS_ENABLED:
+        print("--indicators needs ANALYTICS_ENABLED=true: the indicators are stored with the analytics tables")
+        sys.exit(1)
+
+    if (options["shard"] or options["shards"]) and other_modes:
+        print("--shard and --shards can only be used when running the pipeline")
+        sys.exit(1)
+
+    if options["interval"] is not None and not options["intraday"]:
+        print("--interval can only be used with --intraday")
+        sys.exit(1)
+
+    if options["intraday"] and (other_modes or options["stream"] or options["strict_model"]
+                                or options["shard"] or options["shards"]):
+        print("--intraday cannot be combined with --stream, --strict-model, sharding or other modes")
+        sys.exit(1)
+
+    if options["shard"] and options["shards"]:
+        print("--shard and --shards cannot be combined")
+        sys.exit(1)
+
+    sqlite_only = [flag for flag, name in (("--migrate-db", "migrate_db"), ("--replay", "replay"),
+                                           ("--serve", "serve"), ("--merge", "merge"),
+                                           ("--shard", "shard"), ("--shards", "shards"),
+                                           ("--indicators", "indicators")) if options[name] not in (None, False)]
+    if sqlite_only and config.STORAGE_BACKEND.strip().lower() != "sqlite":
+        print(f"{', '.join(sqlite_only)} can only be used with STORAGE_BACKEND=sqlite")
+        sys.exit(1)
+
+    replay_only =[f"--{name}" for name in ("from", "to", "symbols", "db") if options[name] is not None]
+    if replay_only and not options["replay"]:
+        print(f"{', '.join(replay_only)} can only be used with --replay")
+        sys.exit(1)
+
+    return options
+
+
+def run_migration(without_rowid: bool) -> bool:
+    from load import get_database_connection, migrate_storage
+
+    conn = get_database_connection()
+
+    try:
+        migrate_storage(conn, without_rowid)
+        return True
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+    finally:
+        conn.close()
+
+
+def run_shards(options: dict) -> bool:
+    from sharding import run_local_shards
+
+    # each shard process gets the same pipeline options; the indicators are
+    # computed by the merge in this process
+    args = [flag for flag, name in (("--strict-model", "strict_model"), ("--stream", "stream")) if options[name]]
+
+    return run_local_shards(options["shards"], args)
+
+
+def main():
+    options = parse_arguments()
+
+    if options["indicators"] is not None:
+        from indicators import format_indicator_specs
+        config.INDICATORS = format_indicator_specs(options["indicators"])
+
+    if options["migrate_db"]:
+        success = run_migration(options["without_rowid"])
+    elif options["compact_lake"]:
+        from lake import run_compaction
+        success = run_compaction()
+    elif options["merge"]:
+        from sharding import merge_shards
+        success = merge_shards()
+    elif options["shards"]:
+        success = run_shards(options)
+    elif options["serve"]:
+        from server import serve
+        success = serve(port=options["port"])
+    elif options["replay"]:
+        from replay import run_replay
+        success = run_replay(options["from"], options["to"], options["symbols"],
+                             options["db"], options["strict_model"])
+    else:
+        series = intraday(options["interval"] or config.INTRADAY_INTERVAL) if options["intraday"] else DAILY
+        success = run_etl_pipeline(options["strict_model"], options["stream"], options["shard"], series)
     sys.exit(0 if success else 1)
 
 
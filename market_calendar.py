@@ -0,0 +1,92 @@
+from datetime import date, time, timedelta
+from functools import lru_cache
+from typing import FrozenSet, List
+
+# regular NYSE session, in exchange time (config.MARKET_TIMEZONE)
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+
+# unscheduled full-day closures (national days of mourning, weather)
+SPECIAL_CLOSURES = frozenset({
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),
+    date(2004, 6, 11),
+    date(2007, 1, 2),
+    date(2012, 10, 29), date(2012, 10, 30),
+    date(2018, 12, 5),
+    date(2025, 1, 9),
+})
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # n-th (1-based) weekday of the month; n = -1 is the last one
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    # anonymous Gregorian algorithm (Meeus/Jones/Butcher)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(holiday: date) -> date:
+    # Saturday holidays close the Friday before, Sunday holidays the Monday after
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=None)
+def holidays(year: int) -> FrozenSet[date]:
+    """NYSE full-day holidays of one year (early closes count as trading days)."""
+    days = {
+        _nth_weekday(year, 2, 0, 3),                # Washington's Birthday
+        _easter(year) - timedelta(days=2),          # Good Friday
+        _nth_weekday(year, 5, 0, -1),               # Memorial Day
+        _observed(date(year, 7, 4)),                # Independence Day
+        _nth_weekday(year, 9, 0, 1),                # Labor Day
+        _nth_weekday(year, 11, 3, 4),               # Thanksgiving
+        _observed(date(year, 12, 25)),              # Christmas
+    }
+
+    # a Saturday New Year's Day is not made up on the last day of the old year
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 1998:
+        days.add(_nth_weekday(year, 1, 0, 3))       # Martin Luther King Jr. Day
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))      # Juneteenth
+
+    return frozenset(days | {d for d in SPECIAL_CLOSURES if d.year == year})
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def trading_days(start: date, end: date) -> List[date]:
+    """Trading days from start to end, both inclusive."""
+    days = []
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
@@ -0,0 +1,177 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak RSS is left out of the report
+    resource = None
+
+
+def peak_rss() -> Dict[str, int]:
+    """Peak resident set size in bytes of this process and of its finished children (pool workers)."""
+    if resource is None:
+        return {}
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+class RunMetrics:
+    """
+        Timings and counters for one pipeline run: wall time per stage and,
+        per symbol, HTTP time and bytes, parse/validate/insert time and row
+        counts. Safe to update from the extract and streaming threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.now()
+            self.stages = defaultdict(float)
+            self.symbols = defaultdict(lambda: defaultdict(int))
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name] += time.perf_counter() - started
+
+    @contextmanager
+    def timer(self, symbol: str, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(symbol, name, time.perf_counter() - started)
+
+    def add(self, symbol: str, name: str, amount: float = 1):
+        with self.lock:
+            self.symbols[symbol][name] += amount
+
+    def take_symbol(self, symbol: str) -> Dict[str, float]:
+        """Removes and returns one symbol's values (a pool worker hands them back this way)."""
+        with self.lock:
+            return dict(self.symbols.pop(symbol, {}))
+
+    def merge_symbol(self, symbol: str, values: Optional[Dict[str, float]]):
+        with self.lock:
+            for name, amount in (values or {}).items():
+                self.symbols[symbol][name] += amount
+
+    def report(self, success: bool, http: Optional[dict] = None) -> dict:
+        finished_at = datetime.now()
+
+        with self.lock:
+            stages = dict(self.stages)
+            symbols = {symbol: dict(values) for symbol, values in sorted(self.symbols.items())}
+
+        totals = defaultdict(int)
+        for values in symbols.values():
+            for name, amount in values.items():
+                totals[name] += amount
+
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": finished_at.isoformat(timespec="seconds"),
+            "duration_s": (finished_at - self.started_at).total_seconds(),
+            "success": success,
+            "stages_s": stages,
+            "totals": dict(totals),
+            "symbols": symbols,
+            "http": http or {"requests": 0, "retries": 0, "failures": 0},
+            "peak_rss": peak_rss(),
+        }
+
+
+metrics = RunMetrics()
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}" if labels else ""
+
+
+def to_prometheus(report: dict) -> str:
+    """The run report in Prometheus text exposition format (for a node_exporter textfile collector)."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples):
+        lines.append(f"# HELP etl_{name} {help_text}")
+        lines.append(f"# TYPE etl_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"etl_{name}{_labels(**labels)} {value}")
+
+    metric("run_success", "gauge", "1 if the last run succeeded", [({}, int(report["success"]))])
+    metric("run_duration_seconds", "gauge", "Wall time of the last run", [({}, report["duration_s"])])
+    metric("run_finished_timestamp_seconds", "gauge", "When the last run finished",
+           [({}, datetime.fromisoformat(report["finished_at"]).timestamp())])
+    metric("stage_duration_seconds", "gauge", "Wall time per pipeline stage",
+           [({"stage": stage}, seconds) for stage, seconds in report["stages_s"].items()])
+
+    # every value covers one run, so all of them are gauges
+    names = sorted({name for values in report["symbols"].values() for name in values})
+    for name in names:
+        metric(f"symbol_{name}", "gauge", f"Per-symbol {name.replace('_', ' ')} in the last run",
+               [({"symbol": symbol}, values[name]) for symbol, values in report["symbols"].items()
+                if name in values])
+
+    http = report["http"]
+    metric("http_requests", "gauge", "HTTP requests sent in the last run", [({}, http["requests"])])
+    metric("http_retries", "gauge", "HTTP retries in the last run", [({}, http["retries"])])
+    if http["requests"]:
+        metric("http_latency_seconds", "gauge", "HTTP latency percentiles in the last run",
+               [({"quantile": "0.5"}, http["p50_ms"] / 1000), ({"quantile": "0.95"}, http["p95_ms"] / 1000)])
+
+    if report["peak_rss"]:
+        metric("peak_rss_bytes", "gauge", "Peak resident set size",
+               [({"process": name[:-len("_bytes")]}, value) for name, value in report["peak_rss"].items()])
+
+    return "\n".join(lines) + "\n"
+
+
+def write_run_report(report: dict, report_path: Path, prometheus_path: Optional[Path] = None):
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    if prometheus_path:
+        # write then rename, so a collector never reads half a file
+        tmp_path = Path(f"{prometheus_path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(to_prometheus(report))
+        os.replace(tmp_path, prometheus_path)
+
+
+def format_summary(report: dict) -> list:
+    """A few lines for the console and the log file."""
+    lines = [f"run time: {report['duration_s']:.2f}s"]
+    lines += [f"  {stage}: {seconds:.2f}s" for stage, seconds in report["stages_s"].items()]
+
+    totals = report["totals"]
+    for name in ("bytes_downloaded", "rows_parsed", "rows_rejected", "rows_inserted", "lake_rows_written"):
+        if name in totals:
+            lines.append(f"  {name.replace('_', ' ')}: {int(totals[name]):,}")
+    for name in ("http_seconds", "parse_seconds", "validate_seconds", "insert_seconds", "lake_seconds"):
+        if name in totals:
+            lines.append(f"  {name.replace('_seconds', '')} time (sum over symbols): {totals[name]:.2f}s")
+
+    if report["peak_rss"]:
+        lines.append(f"  peak RSS: {report['peak_rss']['self_bytes'] / 1024 ** 2:.0f} MiB")
+    return lines
@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from typing import Optional
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class StockDailyData(BaseModel):
@@ -63,7 +63,17 @@ class StockDailyData(BaseModel):
 class AlphaVantageResponse(BaseModel):
     meta_data: dict = Field(..., alias="Meta Data")
 
-    time_series: dict = Field(..., alias="Time Series (Daily)")
+    # "Time Series (Daily)", "Time Series (5min)", ... (see series.py)
+    time_series: dict
+
+    @model_validator(mode="before")
+    @classmethod
+    def find_time_series(cls, data):
+        if isinstance(data, dict) and "time_series" not in data:
+            key = next((key for key in data if key.startswith("Time Series (")), None)
+            if key is not None:
+                data = {**data, "time_series": data[key]}
+        return data
 
     class Config:
         populate_by_name = True
@@ -0,0 +1,193 @@
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from transform import OUTPUT_COLUMNS, columns_to_frame, frame_to_columns
+
+# prices are quoted to at most 4 decimals; such a column is stored as
+# round(value * PRICE_SCALE) in an int32
+PRICE_SCALE = 10_000
+INT32_MAX = np.iinfo(np.int32).max
+# a scaled column stores NaN (e.g. the first daily change of a symbol) as this
+NAN_CODE = np.iinfo(np.int32).min
+
+# columns of a transformed frame that are not stored per row
+PER_PANEL_COLUMNS = ("symbol", "extraction_timestamp")
+
+# an encoded column: the stored array and the scale it was multiplied by (None if not scaled)
+Encoded = Tuple[np.ndarray, Optional[int]]
+
+
+def encode_column(values: np.ndarray) -> Encoded:
+    """
+        The narrowest lossless form of a column: integers in the smallest
+        integer type that holds them; floats as scaled int32, float32 or,
+        failing both, float64. Only a form that decodes back to exactly the
+        same values is used.
+    """
+    values = np.asarray(values)
+
+    if values.dtype.kind in "iu":
+        if len(values) == 0:
+            return values.astype(np.int32), None
+        for dtype in (np.int32, np.int64):
+            info = np.iinfo(dtype)
+            if info.min <= values.min() and values.max() <= info.max:
+                return values.astype(dtype), None
+        return values, None
+
+    values = values.astype(np.float64, copy=False)
+
+    missing = np.isnan(values)
+    if not np.isinf(values).any():
+        scaled = np.round(np.where(missing, 0, values) * PRICE_SCALE)
+        if (len(values) == 0 or np.abs(scaled).max() <= INT32_MAX) \
+                and np.array_equal(np.where(missing, np.nan, scaled / PRICE_SCALE), values, equal_nan=True):
+            scaled[missing] = NAN_CODE
+            return scaled.astype(np.int32), PRICE_SCALE
+
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+        return narrow, None
+
+    return values, None
+
+
+def decode_column(encoded: Encoded) -> np.ndarray:
+    """Back to the transformed frame's dtypes: int64 or float64."""
+    array, scale = encoded
+    if scale is not None:
+        values = array / scale
+        values[array == NAN_CODE] = np.nan
+        return values
+    if array.dtype.kind in "iu":
+        return array.astype(np.int64)
+    return array.astype(np.float64)
+
+
+class StockPanel(Mapping):
+    """
+        The transformed rows of every symbol of a run, stored compactly
+        until they are loaded:
+
+        - each symbol is stored once, as an interned key, not once per row
+        - one extraction time stamp for the whole run
+        - dates as int32 days (int64 seconds for intraday bars)
+        - prices as int32 scaled by PRICE_SCALE, or float32, where that
+          is lossless; volume in the smallest integer type that fits
+
+        It reads like the dict of DataFrames transform_all_stocks used to
+        return: panel[symbol] builds that symbol's frame in the old shape,
+        only when asked for, and a symbol that was already up to date maps
+        to an empty DataFrame.
+    """
+
+    def __init__(self, extraction_timestamp: Optional[datetime] = None, time_unit: str = "D"):
+        # whole seconds, as the database stores it
+        self.extraction_timestamp = pd.Timestamp(extraction_timestamp or datetime.now()).floor("s")
+        # NumPy datetime64 unit of the dates (see Series.time_unit)
+        self.time_unit = time_unit
+        self._segments: Dict[str, Optional[Dict[str, Encoded]]] = {}
+
+    def add_columns(self, symbol: str, columns: Optional[dict]):
+        """
+            Stores one symbol from transform.frame_to_columns() output
+            (None for a symbol without new rows). The columns' own
+            extraction time stamp is replaced by the run's.
+        """
+        symbol = sys.intern(symbol)
+        if columns is None:
+            self._segments[symbol] = None
+            return
+
+        dates = np.asarray(columns["date"]).astype(f"datetime64[{self.time_unit}]").astype(np.int64)
+        segment = {"date": (dates.astype(np.int32) if self.time_unit == "D" else dates, None)}
+        for name, values in columns.items():
+            if name not in PER_PANEL_COLUMNS and name != "date":
+                segment[name] = encode_column(values)
+
+        self._segments[symbol] = segment
+
+    def add(self, symbol: str, df: pd.DataFrame):
+        """Stores one transformed frame, including any columns beyond OUTPUT_COLUMNS."""
+        columns = frame_to_columns(df, self.time_unit)
+        if columns is not None:
+            for name in df.columns:
+                if name not in OUTPUT_COLUMNS:
+                    columns[name] = df[name].to_numpy()
+        self.add_columns(symbol, columns)
+
+    def _columns(self, symbol: str) -> Optional[dict]:
+        segment = self._segments[symbol]
+        if segment is None:
+            return None
+
+        columns = {
+            "symbol": symbol,
+            "date": segment["date"][0].astype(f"datetime64[{self.time_unit}]"),
+            "extraction_timestamp": self.extraction_timestamp,
+        }
+        for name, encoded in segment.items():
+            if name != "date":
+                columns[name] = decode_column(encoded)
+        return columns
+
+    def __getitem__(self, symbol: str) -> pd.DataFrame:
+        columns = self._columns(symbol)
+        if columns is None:
+            return pd.DataFrame()
+
+        df = columns_to_frame(columns)
+        extra = [name for name in columns if name not in OUTPUT_COLUMNS]
+        if extra:
+            df = df.assign(**{name: columns[name] for name in extra})
+        return df
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._segments)
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def row_count(self, symbol: str) -> int:
+        segment = self._segments[symbol]
+        return 0 if segment is None else len(segment["date"][0])
+
+    @property
+    def rows(self) -> int:
+        return sum(self.row_count(symbol) for symbol in self._segments)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the stored arrays."""
+        return sum(array.nbytes for segment in self._segments.values() if segment
+                   for array, _ in segment.values())
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+            Every symbol stacked into one frame, symbol as a categorical and
+            date as datetime64; columns picks which stored ones to include.
+        """
+        symbols = [symbol for symbol, segment in self._segments.items() if segment]
+        counts = [self.row_count(symbol) for symbol in symbols]
+        if columns is None:
+            columns = list(self._segments[symbols[0]]) if symbols else ["date"]
+
+        data = {"symbol": pd.Categorical.from_codes(np.repeat(np.arange(len(symbols)), counts), symbols)}
+        for name in columns:
+            if name == "symbol":
+                continue
+            if name == "date":
+                dates = [self._segments[symbol]["date"][0] for symbol in symbols]
+                data["date"] = (np.concatenate(dates) if dates else np.empty(0, np.int64)) \
+                    .astype(np.int64).astype(f"datetime64[{self.time_unit}]")
+            else:
+                parts = [decode_column(self._segments[symbol][name]) for symbol in symbols]
+                data[name] = np.concatenate(parts) if parts else np.empty(0)
+
+        return pd.DataFrame(data)
+
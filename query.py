@@ -0,0 +1,302 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from db_meta import read_write_generation, write_generation
+
+BAR_COLUMNS = [
+    "symbol", "date", "open_price", "high_price", "low_price", "close_price",
+    "volume", "daily_change_percentage",
+]
+PANEL_FIELDS = ["open_price", "high_price", "low_price", "close_price", "volume", "daily_change_percentage"]
+
+# weekly and monthly bars, written by analytics.update_rollups
+ROLLUP_TABLES = {
+    "weekly": "stock_ohlcv_weekly",
+    "monthly": "stock_ohlcv_monthly",
+}
+ROLLUP_COLUMNS = [
+    "symbol", "period_start", "open_price", "high_price", "low_price", "close_price",
+    "volume", "trading_days",
+]
+
+COLUMN_DTYPES = {
+    "symbol": str,
+    "date": "datetime64[D]",
+    "period_start": "datetime64[D]",
+    "volume": np.int64,
+    "trading_days": np.int64,
+}
+
+# statements are prepared once per connection and reused from sqlite3's cache
+STATEMENT_CACHE_SIZE = 256
+
+_BAR_SELECT = f"SELECT {', '.join(BAR_COLUMNS)} FROM {config.TABLE_NAME}"
+RANGE_SQL = f"{_BAR_SELECT} WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date"
+AS_OF_SQL = f"{_BAR_SELECT} WHERE symbol = ? AND date <= ? ORDER BY date DESC LIMIT 1"
+LATEST_SQL = f"{_BAR_SELECT} WHERE symbol = ? ORDER BY date DESC LIMIT 1"
+SYMBOLS_SQL = f"SELECT DISTINCT symbol FROM {config.TABLE_NAME} ORDER BY symbol"
+
+
+def to_columns(rows: List[tuple], names: List[str]) -> Dict[str, np.ndarray]:
+    """
+        Rows -> one read-only NumPy array per column. Dates become
+        datetime64[D]; the dict converts straight to pandas
+        (pd.DataFrame(result)) or Arrow (pyarrow.table(result)).
+    """
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    columns = {}
+
+    for name, column in zip(names, values):
+        dtype = COLUMN_DTYPES.get(name, np.float64)
+        array = np.array(column, dtype=dtype)
+        # results are shared through the cache
+        array.flags.writeable = False
+        columns[name] = array
+
+    return columns
+
+
+class ReadPool:
+    """
+        Read-only connections to the database, opened on first use and
+        handed out one per thread at a time. Read-only mode means a query
+        can never take a write lock the loader would wait on.
+    """
+
+    def __init__(self, db_path: Path, size: int):
+        self.db_path = Path(db_path)
+        self.size = max(size, 1)
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"{self.db_path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = {int(config.SQLITE_CACHE_SIZE)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                conn = self.idle.get()
+
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        with self.lock:
+            while True:
+                try:
+                    self.idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self.opened = 0
+
+
+class QueryCache:
+    """
+        LRU cache of query results. An entry is served only while it is
+        younger than `ttl` seconds and was stored under the current write
+        generation, so a commit by the loader invalidates every entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored_generation, stored_at, value = entry
+                if stored_generation == generation and time.monotonic() - stored_at <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, value):
+        if self.max_entries <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (generation, time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class StockQuery:
+    """
+        Read API over stock_daily_data. Every public method returns columns
+        as NumPy arrays (see to_columns) and is served from the cache while
+        the data is unchanged.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, pool_size: Optional[int] = None,
+                 cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 generation_poll: Optional[float] = None):
+        self.db_path = Path(db_path or config.DATABASE_PATH)
+        self.pool = ReadPool(self.db_path, config.QUERY_POOL_SIZE if pool_size is None else pool_size)
+        self.cache = QueryCache(
+            config.QUERY_CACHE_SIZE if cache_size is None else cache_size,
+            config.QUERY_CACHE_TTL if cache_ttl is None else cache_ttl,
+        )
+        self.generation_poll = config.QUERY_GENERATION_POLL if generation_poll is None else generation_poll
+        self.stored_generation = 0
+        self.polled_at = None
+        self.poll_lock = threading.Lock()
+
+    def generation(self) -> Tuple[int, int]:
+        """
+            (commits by this process, write generation stored in the database).
+            The stored one is re-read at most every generation_poll seconds,
+            so hot cache hits don't touch SQLite at all.
+        """
+        with self.poll_lock:
+            now = time.monotonic()
+            if self.polled_at is None or now - self.polled_at >= self.generation_poll:
+                with self.pool.connection() as conn:
+                    self.stored_generation = read_write_generation(conn)
+                self.polled_at = now
+            return write_generation(), self.stored_generation
+
+    def _cached(self, key: tuple, compute):
+        generation = self.generation()
+        result = self.cache.get(key, generation)
+        if result is None:
+            result = compute()
+            self.cache.put(key, generation, result)
+        return result
+
+    def _fetch(self, sql: str, params: Iterable) -> List[tuple]:
+        with self.pool.connection() as conn:
+            return conn.execute(sql, tuple(params)).fetchall()
+
+    def _fetch_per_symbol(self, sql: str, symbols: Iterable[str], *params) -> Dict[str, np.ndarray]:
+        # one index lookup per symbol instead of a GROUP BY over the table
+        rows = []
+        with self.pool.connection() as conn:
+            for symbol in symbols:
+                row = conn.execute(sql, (symbol, *params)).fetchone()
+                if row is not None:
+                    rows.append(row)
+        return to_columns(rows, BAR_COLUMNS)
+
+    def symbols(self) -> List[str]:
+        return self._cached(("symbols",), lambda: [row[0] for row in self._fetch(SYMBOLS_SQL, ())])
+
+    def latest(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Latest bar of each symbol (default: every stored symbol)."""
+        symbols = tuple(symbols) if symbols is not None else tuple(self.symbols())
+        return self._cached(("latest", symbols), lambda: self._fetch_per_symbol(LATEST_SQL, symbols))
+
+    def as_of(self, symbols: Iterable[str], on: date) -> Dict[str, np.ndarray]:
+        """Last bar of each symbol on or before `on` (e.g. the price in effect on a holiday)."""
+        symbols = tuple(symbols)
+        on = str(on)
+        return self._cached(("as_of", symbols, on), lambda: self._fetch_per_symbol(AS_OF_SQL, symbols, on))
+
+    def range(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """Bars of one symbol between start and end (inclusive), oldest first."""
+        params = (symbol, str(start or "0000-01-01"), str(end or "9999-12-31"))
+        return self._cached(("range", *params), lambda: to_columns(self._fetch(RANGE_SQL, params), BAR_COLUMNS))
+
+    def rollups(self, symbol: str, period: str = "weekly", start: Optional[date] = None,
+                end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """Weekly or monthly bars of one symbol whose period starts between start and end, oldest first."""
+        if period not in ROLLUP_TABLES:
+            raise ValueError(f"unknown rollup period '{period}' (expected one of {', '.join(ROLLUP_TABLES)})")
+
+        params = (symbol, str(start or "0000-01-01"), str(end or "9999-12-31"))
+        sql = (f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM {ROLLUP_TABLES[period]} "
+               f"WHERE symbol = ? AND period_start >= ? AND period_start <= ? ORDER BY period_start")
+        return self._cached(("rollups", period, *params), lambda: to_columns(self._fetch(sql, params), ROLLUP_COLUMNS))
+
+    def panel(self, symbols: Iterable[str], start: Optional[date] = None, end: Optional[date] = None,
+              field: str = "close_price") -> Dict[str, np.ndarray]:
+        """
+            One field for several symbols as a date x symbol matrix:
+            {"date": dates, "symbol": symbols, "values": 2-D array}. Dates a
+            symbol has no bar for are NaN.
+        """
+        if field not in PANEL_FIELDS:
+            raise ValueError(f"unknown panel field '{field}' (expected one of {', '.join(PANEL_FIELDS)})")
+
+        symbols = tuple(symbols)
+        start, end = str(start or "0000-01-01"), str(end or "9999-12-31")
+
+        def compute():
+            placeholders = ", ".join("?" for _ in symbols)
+            sql = (f"SELECT symbol, date, {field} FROM {config.TABLE_NAME} "
+                   f"WHERE symbol IN ({placeholders}) AND date >= ? AND date <= ?")
+            rows = self._fetch(sql, (*symbols, start, end))
+            columns = to_columns(rows, ["symbol", "date", field])
+
+            dates, date_codes = np.unique(columns["date"], return_inverse=True)
+            names = np.array(symbols, dtype=str)
+            # SQL only returns requested symbols, so every one is found
+            order = np.argsort(names)
+            symbol_index = order[np.searchsorted(names, columns["symbol"], sorter=order)]
+
+            values = np.full((len(dates), len(symbols)), np.nan)
+            values[date_codes, symbol_index] = columns[field]
+
+            result = {"date": dates, "symbol": names, "values": values}
+            for array in result.values():
+                array.flags.writeable = False
+            return result
+
+        return self._cached(("panel", symbols, start, end, field), compute)
+
+    def close(self):
+        self.pool.close()
+        self.cache.clear()
+
@@ -0,0 +1,141 @@
+import gzip
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# archive format -> file suffix
+JSON_FORMATS = {
+    "json": ".json",
+    "json.gz": ".json.gz",
+    "json.zst": ".json.zst",
+}
+COLUMNAR_FORMATS = {
+    "npz": ".npz",
+    "parquet": ".parquet",
+}
+ALL_SUFFIXES = list(JSON_FORMATS.values()) + list(COLUMNAR_FORMATS.values())
+
+PARSED_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+def split_archive_name(path: Path) -> Tuple[str, str]:
+    """"AAPL_2025-10-06.json.gz" -> ("AAPL_2025-10-06", ".json.gz")"""
+    name = Path(path).name
+    for suffix in ALL_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return Path(path).stem, Path(path).suffix
+
+
+def is_columnar(path: Path) -> bool:
+    return split_archive_name(path)[1] in COLUMNAR_FORMATS.values()
+
+
+def archive_group(path: Path) -> List[Path]:
+    """Every archive file saved for the same payload (JSON and columnar forms)."""
+    path = Path(path)
+    stem, _ = split_archive_name(path)
+    return [path.parent / f"{stem}{suffix}" for suffix in ALL_SUFFIXES if (path.parent / f"{stem}{suffix}").exists()]
+
+
+def columnar_sidecar(path: Path) -> Optional[Path]:
+    path = Path(path)
+    stem, _ = split_archive_name(path)
+    for suffix in COLUMNAR_FORMATS.values():
+        candidate = path.parent / f"{stem}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("the json.zst raw archive format needs the 'zstandard' package "
+                          "(pip install zstandard)")
+    return zstandard
+
+
+def write_payload(directory: Path, stem: str, data: dict, archive_format: str) -> Path:
+    if archive_format not in JSON_FORMATS:
+        raise ValueError(f"unknown raw archive format '{archive_format}' "
+                         f"(expected one of {', '.join(JSON_FORMATS)})")
+
+    filepath = Path(directory) / f"{stem}{JSON_FORMATS[archive_format]}"
+
+    if archive_format == "json":
+        # plain JSON keeps the original human-readable layout
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return filepath
+
+    encoded = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    if archive_format == "json.gz":
+        with gzip.open(filepath, 'wb', compresslevel=6) as f:
+            f.write(encoded)
+    else:
+        with open(filepath, 'wb') as f:
+            f.write(_zstd().ZstdCompressor(level=10).compress(encoded))
+
+    return filepath
+
+
+def read_payload(filepath: Path) -> dict:
+    _, suffix = split_archive_name(filepath)
+
+    if suffix == ".json.gz":
+        with gzip.open(filepath, 'rb') as f:
+            return json.loads(f.read())
+
+    if suffix == ".json.zst":
+        with open(filepath, 'rb') as f:
+            return json.loads(_zstd().ZstdDecompressor().decompress(f.read()))
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_columns(directory: Path, stem: str, df: pd.DataFrame, columnar_format: str,
+                  time_unit: str = "D") -> Path:
+    """
+        Persists a parse_alpha_vantage_data frame so replays can skip JSON
+        parsing. time_unit is the resolution dates are stored at in npz
+        ("D" for daily bars, "s" for intraday bars).
+    """
+    if columnar_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"unknown columnar format '{columnar_format}' "
+                         f"(expected one of {', '.join(COLUMNAR_FORMATS)})")
+
+    filepath = Path(directory) / f"{stem}{COLUMNAR_FORMATS[columnar_format]}"
+
+    if columnar_format == "npz":
+        # open the file ourselves, np.savez would append ".npz" to the name
+        with open(filepath, 'wb') as f:
+            np.savez(
+                f,
+                date=df["date"].to_numpy().astype(f"datetime64[{time_unit}]"),
+                **{name: df[name].to_numpy() for name in PARSED_COLUMNS[1:]}
+            )
+    else:
+        try:
+            df[PARSED_COLUMNS].to_parquet(filepath, index=False)
+        except ImportError as e:
+            raise ImportError("the parquet raw format needs the 'pyarrow' package (pip install pyarrow)") from e
+
+    return filepath
+
+
+def read_columns(filepath: Path) -> pd.DataFrame:
+    if split_archive_name(filepath)[1] == ".npz":
+        with np.load(filepath) as arrays:
+            return pd.DataFrame({
+                "date": arrays["date"].astype("datetime64[ns]"),
+                **{name: arrays[name] for name in PARSED_COLUMNS[1:]}
+            })
+
+    return pd.read_parquet(filepath)
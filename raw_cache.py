@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import config
+import raw_archive
+
+
+def payload_digest(data: dict) -> str:
+    # canonical form, so key order and whitespace don't change the hash
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RawCache:
+    """
+        Manifest of raw payloads in raw_data/, keyed by payload hash.
+
+        Each entry records the symbol, file name, size and when the payload
+        was saved, transformed and loaded. A payload whose hash is already
+        marked loaded needs neither transform nor load again.
+    """
+
+    def __init__(self, raw_dir: Path, manifest_name: str = config.RAW_MANIFEST_NAME):
+        self.raw_dir = Path(raw_dir)
+        self.manifest_path = self.raw_dir / manifest_name
+        self.lock = threading.RLock()
+        self.entries = None
+
+    def _load(self) -> Dict[str, dict]:
+        if self.entries is None:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get("entries", {})
+            except FileNotFoundError:
+                self.entries = {}
+            except json.JSONDecodeError as e:
+                print(f"ignoring unreadable manifest {self.manifest_path}: {e}")
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        self.raw_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.manifest_path)
+
+    def lookup(self, digest: str) -> Optional[dict]:
+        with self.lock:
+            entry = self._load().get(digest)
+            if entry and (self.raw_dir / entry["file"]).exists():
+                return entry
+            return None
+
+    def path_for(self, digest: str) -> Optional[Path]:
+        entry = self.lookup(digest)
+        return self.raw_dir / entry["file"] if entry else None
+
+    def digest_for(self, filepath: Path) -> Optional[str]:
+        name = Path(filepath).name
+        with self.lock:
+            for digest, entry in self._load().items():
+                if entry["file"] == name:
+                    return digest
+        return None
+
+    def register(self, symbol: str, digest: str, filepath: Path):
+        filepath = Path(filepath)
+        with self.lock:
+            entries = self._load()
+
+            # a file rewritten with different content no longer holds the old payload
+            for old_digest in [d for d, e in entries.items() if e["file"] == filepath.name and d != digest]:
+                del entries[old_digest]
+
+            entries[digest] = {
+                "symbol": symbol,
+                "file": filepath.name,
+                "size": sum(p.stat().st_size for p in raw_archive.archive_group(filepath)),
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "transformed_at": None,
+                "loaded_at": None,
+            }
+            self._save()
+
+    def mark(self, digests: Iterable[str], stage: str):
+        stamp = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            entries = self._load()
+            for digest in digests:
+                if digest in entries:
+                    entries[digest][f"{stage}_at"] = stamp
+            self._save()
+
+    def is_loaded(self, digest: str) -> bool:
+        with self.lock:
+            entry = self._load().get(digest)
+            return bool(entry and entry.get("loaded_at"))
+
+    def evict(self, max_bytes: int, max_age_days: float) -> int:
+        """
+            Deletes loaded payloads older than max_age_days, then the oldest
+            loaded payloads until raw_data/ fits in max_bytes. Payloads not
+            loaded yet are never evicted. Returns the number of files removed.
+        """
+        with self.lock:
+            entries = self._load()
+            now = time.time()
+            removed = 0
+
+            # entries whose file is already gone
+            for digest in [d for d, e in entries.items() if not (self.raw_dir / e["file"]).exists()]:
+                del entries[digest]
+
+            loaded = sorted(
+                (e["saved_at"], d) for d, e in entries.items() if e.get("loaded_at")
+            )
+            total = sum(e["size"] for e in entries.values())
+
+            for saved_at, digest in loaded:
+                age_days = (now - datetime.fromisoformat(saved_at).timestamp()) / 86400
+                if age_days <= max_age_days and total <= max_bytes:
+                    break
+
+                entry = entries.pop(digest)
+                for path in raw_archive.archive_group(self.raw_dir / entry["file"]):
+                    path.unlink(missing_ok=True)
+                total -= entry["size"]
+                removed += 1
+
+            self._save()
+            return removed
+
+
+# one cache per raw directory (daily and intraday payloads are kept apart)
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def get_cache(raw_dir: Optional[Path] = None) -> RawCache:
+    raw_dir = Path(raw_dir or config.RAW_DATA_DIR)
+    manifest_path = raw_dir / config.RAW_MANIFEST_NAME
+
+    with _cache_lock:
+        if manifest_path not in _caches:
+            _caches[manifest_path] = RawCache(raw_dir, config.RAW_MANIFEST_NAME)
+        return _caches[manifest_path]
+
+
+def skip_loaded_payloads(extracted_files: Dict[str, Path]) -> Dict[str, Path]:
+    pending = {}
+
+    for symbol, filepath in extracted_files.items():
+        cache = get_cache(Path(filepath).parent)
+        digest = cache.digest_for(filepath)
+        if digest and cache.is_loaded(digest):
+            print(f"{symbol}: payload unchanged since last load, skipping")
+        else:
+            pending[symbol] = filepath
+
+    return pending
+
+
+def mark_files(filepaths: Iterable[Path], stage: str):
+    by_dir = {}
+    for filepath in filepaths:
+        by_dir.setdefault(Path(filepath).parent, []).append(filepath)
+
+    for raw_dir, paths in by_dir.items():
+        cache = get_cache(raw_dir)
+        digests = [cache.digest_for(filepath) for filepath in paths]
+        cache.mark([d for d in digests if d], stage)
+
+
+def evict_raw_data(raw_dir: Optional[Path] = None) -> int:
+    raw_dir = Path(raw_dir or config.RAW_DATA_DIR)
+    removed = get_cache(raw_dir).evict(config.RAW_CACHE_MAX_BYTES, config.RAW_CACHE_MAX_AGE_DAYS)
+    if removed:
+        print(f"evicted {removed} raw files from {raw_dir}")
+    return removed
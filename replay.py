@@ -0,0 +1,241 @@
+import contextlib
+import io
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import config
+import raw_archive
+from transform import transform_stock_data, frame_to_columns, columns_to_frame
+from load import (
+    get_database_connection,
+    create_table_if_not_exists,
+    create_index_if_not_exists,
+    insert_data,
+    analytics_start,
+    update_analytics,
+    commit_write,
+    get_database_stats,
+)
+
+
+def parse_raw_filename(path: Path) -> Optional[Tuple[str, date]]:
+    """"AAPL_2025-10-06.json.gz" -> ("AAPL", date(2025, 10, 6)); None for other files"""
+    stem, suffix = raw_archive.split_archive_name(path)
+    if suffix not in raw_archive.ALL_SUFFIXES or "_" not in stem:
+        return None
+
+    symbol, _, date_str = stem.rpartition("_")
+    try:
+        return symbol, date.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+
+def raw_capture_time(path: Path) -> datetime:
+    """
+        When a raw file was fetched: its modification time, to the second.
+        A file copied or restored since has a newer one; then only the day
+        in its name is known, and midnight of that day is used.
+    """
+    modified = datetime.fromtimestamp(Path(path).stat().st_mtime).replace(microsecond=0)
+    parsed = parse_raw_filename(path)
+    if parsed is not None and modified.date() != parsed[1]:
+        return datetime.combine(parsed[1], datetime.min.time())
+    return modified
+
+
+def discover_raw_files(raw_dir: Path, start: Optional[date] = None,
+                       symbols: Optional[List[str]] = None) -> Dict[str, List[Path]]:
+    """
+        Maps symbol -> raw files, newest extraction first.
+
+        A file saved before `start` cannot hold bars from `start` on, so it is
+        skipped. Files saved for the same symbol and day in several formats
+        hold the same payload; the fastest one to read (columnar) is kept.
+    """
+    wanted = set(symbols) if symbols else None
+    by_day = {}
+
+    if not Path(raw_dir).is_dir():
+        return {}
+
+    for path in Path(raw_dir).iterdir():
+        parsed = parse_raw_filename(path)
+        if parsed is None:
+            continue
+
+        symbol, file_date = parsed
+        if wanted is not None and symbol not in wanted:
+            continue
+        if start is not None and file_date < start:
+            continue
+
+        current = by_day.get((symbol, file_date))
+        if current is None or (raw_archive.is_columnar(path) and not raw_archive.is_columnar(current)):
+            by_day[(symbol, file_date)] = path
+
+    files = defaultdict(list)
+    for (symbol, file_date), path in sorted(by_day.items(), key=lambda item: item[0][1], reverse=True):
+        files[symbol].append(path)
+
+    return dict(sorted(files.items()))
+
+
+def replay_symbol(symbol: str, files: List[Path], start: Optional[date], end: Optional[date],
+                  strict_model: bool) -> Tuple[Optional[dict], Optional[str], str]:
+    """
+        Rebuilds one symbol's rows from its raw files, newest file first. Each
+        older file only contributes bars older than everything seen so far,
+        so every (symbol, date) comes from the latest file that has it.
+
+        Rows keep the extraction time stamp of the file they come from (see
+        raw_capture_time), one per row, rather than the time of the replay.
+    """
+    output = io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        try:
+            since = (start - timedelta(days=1)).isoformat() if start else None
+            frames = []
+            oldest = None
+
+            for path in files:
+                df = transform_stock_data(path, symbol, since, strict_model,
+                                          extraction_timestamp=raw_capture_time(path))
+                if df.empty:
+                    continue
+
+                if oldest is not None:
+                    df = df[df["date"] < oldest]
+                if end is not None:
+                    df = df[df["date"] <= end]
+                if df.empty:
+                    continue
+
+                frames.append(df)
+                oldest = df["date"].min() if oldest is None else min(oldest, df["date"].min())
+
+            if not frames:
+                return None, None, output.getvalue()
+
+            df = pd.concat(frames[::-1]).sort_values("date").reset_index(drop=True)
+            columns = frame_to_columns(df)
+            columns["extraction_timestamp"] = df["extraction_timestamp"].to_numpy().astype("datetime64[s]")
+            return columns, None, output.getvalue()
+
+        except Exception as e:
+            return None, str(e), output.getvalue()
+
+
+def replayed_symbols(files: Dict[str, List[Path]], start: Optional[date], end: Optional[date],
+                     strict_model: bool, workers: int) -> Iterator[Tuple[str, tuple]]:
+    """
+        (symbol, replay_symbol() result) for every symbol, as each finishes:
+        from a pool of `workers` processes, or serially in this process
+        when workers is 1.
+    """
+    if workers <= 1:
+        for symbol, paths in files.items():
+            yield symbol, replay_symbol(symbol, paths, start, end, strict_model)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(replay_symbol, symbol, paths, start, end, strict_model): symbol
+            for symbol, paths in files.items()
+        }
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_replay(start: Optional[date] = None, end: Optional[date] = None, symbols: Optional[List[str]] = None,
+               db_path: Optional[Path] = None, strict_model: bool = False,
+               workers: Optional[int] = None) -> bool:
+    """
+        1. Discover raw files in raw_data/ (no API calls)
+        2. Transform each symbol on a process pool (workers=1: serially)
+        3. Bulk load into db_path in one transaction, overwriting existing rows
+        4. Report throughput
+    """
+    db_path = Path(db_path or config.DATABASE_PATH)
+    workers = config.TRANSFORM_WORKERS if workers is None else workers
+
+    print("STARTING REPLAY")
+    print(f"raw data: {config.RAW_DATA_DIR}")
+    print(f"database: {db_path}")
+    print(f"range: {start or 'beginning'} to {end or 'latest'}")
+
+    files = discover_raw_files(config.RAW_DATA_DIR, start, symbols)
+    if not files:
+        print("no raw files match")
+        return False
+
+    print(f"found {sum(len(f) for f in files.values())} files for {len(files)} symbols")
+
+    started = time.perf_counter()
+    load_seconds = 0.0
+    total_rows = 0
+    total_written = 0
+    failed = []
+    # symbol -> first date whose analytics changed, updated in one batch before the commit
+    analytics_starts = {}
+
+    conn = get_database_connection(db_path)
+
+    try:
+        create_table_if_not_exists(conn)
+        create_index_if_not_exists(conn)
+
+        # load each symbol as soon as its transform finishes
+        for symbol, (columns, error, output) in replayed_symbols(files, start, end, strict_model, workers):
+            if error:
+                print(output, end="")
+                print(f"Failed to replay {symbol}: {error}")
+                failed.append(symbol)
+                continue
+
+            df = columns_to_frame(columns)
+            if df.empty:
+                print(f"{symbol}: no rows in range")
+                continue
+
+            load_started = time.perf_counter()
+            # rows replayed unchanged don't need their analytics recomputed
+            analytics_starts[symbol] = analytics_start(conn, df, symbol, replace=True)
+            rows_written = insert_data(conn, df, symbol, commit=False, replace=True)
+            total_written += rows_written
+            load_seconds += time.perf_counter() - load_started
+            total_rows += len(df)
+
+        commit_started = time.perf_counter()
+        update_analytics(conn, analytics_starts)
+        commit_write(conn)
+        load_seconds += time.perf_counter() - commit_started
+
+        get_database_stats(conn)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    transform_seconds = elapsed - load_seconds
+
+    print("REPLAY COMPLETE")
+    print(f"symbols: {len(files) - len(failed)}/{len(files)}"
+          + (f" (failed: {', '.join(failed)})" if failed else ""))
+    print(f"rows: {total_rows}, written: {total_written}")
+    print(f"elapsed: {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/s)")
+    print(f"  waiting on transform: {transform_seconds:.2f}s")
+    print(f"  load: {load_seconds:.2f}s ({total_rows / max(load_seconds, 1e-9):,.0f} rows/s)")
+    return not failed
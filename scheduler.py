@@ -1,44 +1,338 @@
-import schedule
-import time
+import asyncio
+import json
+import os
+import subprocess
 import sys
-from datetime import datetime
+import threading
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
 
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows; runs are then only kept apart within one scheduler
+    fcntl = None
 
-from main import run_etl_pipeline
+import config
+import market_calendar
 
-DEFAULT_RUN_TIME = "09:00"
+DEFAULT_RUN_TIME = "18:00"
 
-def job():
-    print(f"Scheduled job triggered at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    success = run_etl_pipeline()
+# longest single sleep; waking up now and then notices clock changes
+# (DST, NTP, a suspended host) instead of sleeping past a run
+MAX_SLEEP_SECONDS = 300
 
-    if success:
-        print("\nScheduled job completed successfully")
-    else:
-        print("\nScheduled job failed")
+# how far ahead next_run looks for a trading day (covers any holiday cluster)
+SEARCH_DAYS = 14
 
-    print(f"\nNext run scheduled for: {DEFAULT_RUN_TIME} tomorrow\n")
 
+def run_pipeline_process(*args: str) -> bool:
+    """
+        Runs `main.py [args]` as a child process and waits for it. main.py
+        tees its standard output into the run's log file; in a process of
+        its own, that log gets the run's output only, never the scheduler's
+        messages or another job's. The child reads the same .env.
+    """
+    main_path = Path(__file__).with_name("main.py")
+    return subprocess.run([sys.executable, str(main_path), *args]).returncode == 0
 
-def run_scheduler(run_time: str = DEFAULT_RUN_TIME, run_now: bool = False):
-    print("ETL PIPELINE SCHEDULER")
-    print(f"current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Scheduled run time: {run_time} daily")
-    print("\nPress Ctrl+C to stop the scheduler")
 
-    if run_now:
-        print("Running ETL pipeline immediately...")
-        job()
+def run_daily_pipeline() -> bool:
+    return run_pipeline_process()
 
-    schedule.every().day.at(run_time).do(job)
 
-    print(f"Scheduler started. Pipeline will run daily at {run_time}")
-    print(f"next run: {schedule.next_run()}\n")
+def run_intraday_pipeline() -> bool:
+    # the interval defaults to INTRADAY_INTERVAL
+    return run_pipeline_process("--intraday")
+
+
+class Job:
+    """
+        A named action and when it runs, in exchange time: daily `at` a
+        time on trading days, or `every` interval during the trading
+        session. Only jobs with catch_up make up for runs missed while the
+        scheduler was down; one run covers all of them, since extraction
+        fetches everything newer than the stored watermarks.
+    """
+
+    def __init__(self, name: str, action: Callable[[], bool], at: Optional[time] = None,
+                 every: Optional[timedelta] = None, catch_up: bool = True):
+        if (at is None) == (every is None):
+            raise ValueError(f"job '{name}' needs either a time of day or an interval")
+
+        self.name = name
+        self.action = action
+        self.at = at
+        self.every = every
+        self.catch_up = catch_up
+
+    def describe(self) -> str:
+        if self.at is not None:
+            return f"{self.name}: trading days at {self.at:%H:%M}"
+        return (f"{self.name}: every {self.every.total_seconds() / 60:g} min, "
+                f"{market_calendar.SESSION_OPEN:%H:%M}-{market_calendar.SESSION_CLOSE:%H:%M} on trading days")
+
+    def runs_on(self, day: date, tz: ZoneInfo) -> List[datetime]:
+        if not market_calendar.is_trading_day(day):
+            return []
+        if self.at is not None:
+            return [datetime.combine(day, self.at, tz)]
+
+        runs = []
+        run = datetime.combine(day, market_calendar.SESSION_OPEN, tz)
+        close = datetime.combine(day, market_calendar.SESSION_CLOSE, tz)
+        while run <= close:
+            runs.append(run)
+            run += self.every
+        return runs
+
+    def runs_between(self, start: datetime, end: datetime) -> List[datetime]:
+        """Scheduled runs after start, up to and including end."""
+        runs = []
+        for day in market_calendar.trading_days(start.date(), end.date()):
+            runs += [run for run in self.runs_on(day, end.tzinfo) if start < run <= end]
+        return runs
+
+    def next_run(self, after: datetime) -> datetime:
+        day = after.date()
+        for _ in range(SEARCH_DAYS):
+            for run in self.runs_on(day, after.tzinfo):
+                if run > after:
+                    return run
+            day += timedelta(days=1)
+        raise RuntimeError(f"job '{self.name}' has no run in the next {SEARCH_DAYS} days")
+
+
+class SchedulerState:
+    """
+        Last attempted and last successful run of every job, in a JSON file
+        that survives restarts. Re-read before every run, so two schedulers
+        sharing the file never repeat a run the other already made.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("jobs", {})
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            print(f"ignoring unreadable scheduler state {self.path}: {e}")
+            return {}
+
+    def last_success(self, job: str) -> Optional[datetime]:
+        with self.lock:
+            value = self._load().get(job, {}).get("last_success")
+        return datetime.fromisoformat(value) if value else None
+
+    def record(self, job: str, run: datetime, success: bool, started: datetime, finished: datetime):
+        with self.lock:
+            jobs = self._load()
+            entry = jobs.setdefault(job, {})
+            entry.update({
+                "last_run": run.isoformat(),
+                "last_started_at": started.isoformat(timespec="seconds"),
+                "last_finished_at": finished.isoformat(timespec="seconds"),
+                "last_status": "success" if success else "failed",
+            })
+            if success:
+                entry["last_success"] = run.isoformat()
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"jobs": jobs}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class RunLock:
+    """
+        Exclusive lock on a file, held while a job runs, so runs never
+        overlap: not between jobs, and not between schedulers on one host.
+        The kernel drops the lock if the holder dies.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = None
+
+    def acquire(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a+', encoding='utf-8')
+
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.file.close()
+                self.file = None
+                return False
+
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(f"{os.getpid()}\n")
+        self.file.flush()
+        return True
+
+    def release(self):
+        if self.file is not None:
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+class Scheduler:
+    """
+        Runs jobs from an asyncio event loop: every job sleeps until its
+        next run, and a worker thread (run_in_executor) waits for the
+        pipeline process (see run_pipeline_process), so a long run never
+        blocks the other jobs' timing. Runs that come due while another one
+        is running wait for it to finish.
+    """
+
+    def __init__(self, jobs: List[Job], state_path: Optional[Path] = None, lock_path: Optional[Path] = None):
+        self.jobs = jobs
+        self.tz = ZoneInfo(config.MARKET_TIMEZONE)
+        self.state = SchedulerState(state_path or config.SCHEDULER_STATE_PATH)
+        self.run_lock = RunLock(lock_path or config.SCHEDULER_LOCK_PATH)
+        self.retry_delay = timedelta(minutes=config.SCHEDULER_RETRY_MINUTES)
+        self.running = None
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    async def sleep_until(self, when: datetime):
+        while True:
+            delay = (when - self.now()).total_seconds()
+            if delay <= 0:
+                return
+            await asyncio.sleep(min(delay, MAX_SLEEP_SECONDS))
+
+    def _execute(self, job: Job, run: datetime) -> Optional[bool]:
+        # worker thread; None means the run did not happen
+        if not self.run_lock.acquire():
+            print(f"{job.name}: another run holds {self.run_lock.path}, skipping")
+            return None
+
+        started = self.now()
+        print(f"\n{job.name}: run for {run:%Y-%m-%d %H:%M %Z} started at {started:%Y-%m-%d %H:%M:%S}")
+
+        try:
+            success = bool(job.action())
+        except Exception as e:
+            print(f"{job.name}: run raised {type(e).__name__}: {e}")
+            success = False
+        finally:
+            self.run_lock.release()
+
+        finished = self.now()
+        self.state.record(job.name, run, success, started, finished)
+        print(f"{job.name}: run {'completed successfully' if success else 'failed'} "
+              f"in {(finished - started).total_seconds():.0f}s")
+        return success
+
+    async def run_job(self, job: Job, run: datetime) -> Optional[bool]:
+        async with self.running:
+            last_success = self.state.last_success(job.name)
+            if last_success is not None and last_success >= run:
+                print(f"{job.name}: run for {run:%Y-%m-%d %H:%M} already done")
+                return True
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._execute, job, run)
+
+    async def run_with_retries(self, job: Job, run: datetime):
+        success = await self.run_job(job, run)
+
+        # jobs that don't catch up (frequent refreshes) just wait for their next run
+        while success is False and job.catch_up:
+            retry_at = self.now() + self.retry_delay
+            if retry_at >= job.next_run(self.now()):
+                # the next regular run comes first
+                return
+            print(f"{job.name}: retrying at {retry_at:%H:%M %Z}")
+            await self.sleep_until(retry_at)
+            success = await self.run_job(job, run)
+
+    async def catch_up(self, job: Job):
+        last_success = self.state.last_success(job.name)
+        if last_success is None:
+            return
+
+        missed = job.runs_between(last_success.astimezone(self.tz), self.now())
+        if not missed:
+            return
+
+        days = sorted({run.date().isoformat() for run in missed})
+        print(f"{job.name}: missed {len(missed)} run(s) since {last_success:%Y-%m-%d %H:%M} "
+              f"(trading days {', '.join(days)}), catching up")
+        await self.run_with_retries(job, missed[-1])
+
+    async def run_job_forever(self, job: Job):
+        if job.catch_up:
+            await self.catch_up(job)
 
-    try:
         while True:
-            schedule.run_pending()
-            time.sleep(60)
+            run = job.next_run(self.now())
+            print(f"{job.name}: next run {run:%Y-%m-%d %H:%M %Z}")
+            await self.sleep_until(run)
+            await self.run_with_retries(job, run)
+
+    async def run(self, run_now: bool = False):
+        self.running = asyncio.Lock()
+
+        if run_now:
+            for job in self.jobs:
+                await self.run_job(job, self.now())
+
+        await asyncio.gather(*(self.run_job_forever(job) for job in self.jobs))
+
+
+def make_daily_job(run_time: str) -> Job:
+    return Job("daily", run_daily_pipeline, at=datetime.strptime(run_time, "%H:%M").time())
+
+
+def make_intraday_job(run_time: str) -> Job:
+    # a missed refresh is superseded by the next one, so none are caught up
+    return Job("intraday", run_intraday_pipeline, every=timedelta(minutes=config.INTRADAY_REFRESH_MINUTES),
+               catch_up=False)
+
+
+# job name -> factory taking the --time value
+JOBS: Dict[str, Callable[[str], Job]] = {
+    "daily": make_daily_job,
+    "intraday": make_intraday_job,
+}
+
+
+def parse_job_names(value: str) -> List[str]:
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in JOBS]
+    if unknown or not names:
+        raise ValueError(f"unknown job(s) {', '.join(unknown) or '(none)'} (expected one of {', '.join(JOBS)})")
+    return list(dict.fromkeys(names))
+
+
+def run_scheduler(run_time: str = DEFAULT_RUN_TIME, run_now: bool = False, job_names: Optional[List[str]] = None):
+    jobs = [JOBS[name](run_time) for name in job_names or parse_job_names(config.SCHEDULER_JOBS)]
+    scheduler = Scheduler(jobs)
+
+    print("ETL PIPELINE SCHEDULER")
+    print(f"current time: {scheduler.now():%Y-%m-%d %H:%M:%S %Z}")
+    for job in jobs:
+        print(f"  {job.describe()}")
+    print(f"state: {scheduler.state.path}")
+    print("\nPress Ctrl+C to stop the scheduler")
+
+    try:
+        asyncio.run(scheduler.run(run_now))
 
     except KeyboardInterrupt:
         print("\nScheduler stopped by user (Ctrl+C)")
@@ -48,13 +342,20 @@ def run_scheduler(run_time: str = DEFAULT_RUN_TIME, run_now: bool = False):
 def print_usage():
     print("ETL Pipeline Scheduler")
     print("\nUsage:")
-    print("  python scheduler.py                 Run with default time (09:00)")
+    print(f"  python scheduler.py                 Run with default time ({DEFAULT_RUN_TIME})")
+    print("  python scheduler.py --time HH:MM    Run the daily job at this time")
+    print("  python scheduler.py --jobs daily,intraday")
+    print("                                      Jobs to run (default: SCHEDULER_JOBS in .env)")
+    print("  python scheduler.py --now           Run every job once immediately")
+    print(f"  - Times are exchange time ({config.MARKET_TIMEZONE}); non-trading days are skipped")
+    print("  - Runs missed while the scheduler was down are caught up on start")
     print("  - The script must keep running for scheduling to work")
     print("  - Press Ctrl+C to stop the scheduler")
 
 def parse_arguments():
     run_time = DEFAULT_RUN_TIME
     run_now = False
+    job_names = None
 
     i = 1
     while i < len(sys.argv):
@@ -83,6 +384,20 @@ def parse_arguments():
 
             i += 2
 
+        elif arg == '--jobs':
+            if i + 1 >= len(sys.argv):
+                print("Error: --jobs requires a list of jobs")
+                print_usage()
+                sys.exit(1)
+
+            try:
+                job_names = parse_job_names(sys.argv[i + 1])
+            except ValueError as e:
+                print(f"error: {e}")
+                sys.exit(1)
+
+            i += 2
+
         elif arg == '--now':
             run_now = True
             i += 1
@@ -92,12 +407,12 @@ def parse_arguments():
             print_usage()
             sys.exit(1)
 
-    return run_time, run_now
+    return run_time, run_now, job_names
 
 
 def main():
-    run_time, run_now = parse_arguments()
-    run_scheduler(run_time, run_now)
+    run_time, run_now, job_names = parse_arguments()
+    run_scheduler(run_time, run_now, job_names)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
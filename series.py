@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+
+# intraday bar interval -> minutes per bar
+INTRADAY_INTERVALS = {
+    "1min": 1,
+    "5min": 5,
+    "15min": 15,
+    "30min": 30,
+    "60min": 60,
+}
+
+
+class Series:
+    """
+        An Alpha Vantage time-series function and what differs between
+        them: request parameters, the payload key holding the bars, the
+        resolution of a bar's time stamp and where its raw files go.
+    """
+
+    def __init__(self, function: str, interval: Optional[str] = None):
+        self.function = function
+        self.interval = interval
+
+    @property
+    def intraday(self) -> bool:
+        return self.interval is not None
+
+    @property
+    def name(self) -> str:
+        return f"intraday {self.interval}" if self.intraday else "daily"
+
+    @property
+    def key(self) -> str:
+        """"Time Series (Daily)", "Time Series (5min)", ..."""
+        return f"Time Series ({self.interval or 'Daily'})"
+
+    @property
+    def time_unit(self) -> str:
+        # NumPy datetime64 unit of a bar's time stamp
+        return "s" if self.intraday else "D"
+
+    @property
+    def bar_minutes(self) -> Optional[int]:
+        return INTRADAY_INTERVALS.get(self.interval)
+
+    def params(self) -> Dict[str, str]:
+        params = {"function": self.function}
+        if self.intraday:
+            params["interval"] = self.interval
+            params["extended_hours"] = "true" if config.INTRADAY_EXTENDED_HOURS else "false"
+        return params
+
+    def raw_dir(self) -> Path:
+        # intraday payloads stay out of the daily archive that replay.py reads
+        if self.intraday:
+            return Path(config.RAW_DATA_DIR) / "intraday"
+        return Path(config.RAW_DATA_DIR)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Series) and (self.function, self.interval) == (other.function, other.interval)
+
+    def __hash__(self) -> int:
+        return hash((self.function, self.interval))
+
+    def __repr__(self) -> str:
+        return f"Series({self.function!r}, {self.interval!r})"
+
+
+DAILY = Series("TIME_SERIES_DAILY")
+
+
+def intraday(interval: str) -> Series:
+    if interval not in INTRADAY_INTERVALS:
+        raise ValueError(f"unknown intraday interval '{interval}' "
+                         f"(expected one of {', '.join(INTRADAY_INTERVALS)})")
+    return Series("TIME_SERIES_INTRADAY", interval)
@@ -0,0 +1,222 @@
+import hashlib
+import io
+import json
+import sqlite3
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import config
+from query import QueryCache, StockQuery
+
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+FORMATS = {"json": JSON_TYPE, "arrow": ARROW_TYPE}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _param(params: Dict[str, list], name: str, required: bool = False) -> Optional[str]:
+    values = params.get(name)
+    if not values or not values[0].strip():
+        if required:
+            raise BadRequest(f"missing query parameter '{name}'")
+        return None
+    return values[0].strip()
+
+
+def _symbols(params: Dict[str, list], required: bool = True) -> Optional[list]:
+    value = _param(params, "symbols", required)
+    return [s.strip().upper() for s in value.split(",") if s.strip()] if value else None
+
+
+def _date(params: Dict[str, list], name: str, required: bool = False) -> Optional[date]:
+    value = _param(params, name, required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"invalid date '{value}' for '{name}' (expected YYYY-MM-DD)")
+
+
+# path -> (query, parsed query string) -> columns
+ROUTES: Dict[str, Callable[[StockQuery, Dict[str, list]], dict]] = {
+    "/latest": lambda q, p: q.latest(_symbols(p, required=False)),
+    "/range": lambda q, p: q.range(_param(p, "symbol", required=True).upper(), _date(p, "start"), _date(p, "end")),
+    "/as_of": lambda q, p: q.as_of(_symbols(p), _date(p, "date", required=True)),
+    "/panel": lambda q, p: q.panel(_symbols(p), _date(p, "start"), _date(p, "end"),
+                                   _param(p, "field") or "close_price"),
+    "/rollups": lambda q, p: q.rollups(_param(p, "symbol", required=True).upper(), _param(p, "period") or "weekly",
+                                       _date(p, "start"), _date(p, "end")),
+}
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+        If-None-Match: "*" or a comma-separated list of entity tags. Tags
+        are compared weakly (a "W/" prefix is ignored), as RFC 9110 asks for
+        conditional GETs.
+    """
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _json_values(array: np.ndarray) -> list:
+    if np.issubdtype(array.dtype, np.datetime64):
+        return np.datetime_as_string(array, unit="D").tolist()
+    if np.issubdtype(array.dtype, np.floating):
+        # NaN is not valid JSON
+        return np.where(np.isnan(array), None, array.astype(object)).tolist()
+    return array.tolist()
+
+
+def encode_json(columns: dict) -> bytes:
+    return json.dumps({name: _json_values(array) for name, array in columns.items()},
+                      separators=(",", ":")).encode("utf-8")
+
+
+def encode_arrow(columns: dict) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Arrow responses need the 'pyarrow' package (pip install pyarrow)") from e
+
+    if "values" in columns:
+        # a panel becomes one column per symbol next to the dates
+        table = pa.table({"date": columns["date"],
+                          **{symbol: columns["values"][:, i] for i, symbol in enumerate(columns["symbol"])}})
+    else:
+        table = pa.table(columns)
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+ENCODERS = {"json": encode_json, "arrow": encode_arrow}
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+        Read-only HTTP front end for query.py, one thread per connection.
+        Encoded responses are cached under the same write generation as the
+        query results, so they are reused until the next ETL commit.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, query: Optional[StockQuery] = None, quiet: bool = False):
+        super().__init__(address, QueryHandler)
+        self.query = query or StockQuery()
+        self.responses = QueryCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL)
+        self.quiet = quiet
+
+    def server_close(self):
+        super().server_close()
+        self.query.close()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # keep-alive, so clients can reuse one connection for many requests
+    protocol_version = "HTTP/1.1"
+    server_version = "StockETL/1.0"
+    # headers and body go out as separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40ms per request)
+    disable_nagle_algorithm = True
+
+    def _negotiate(self, params: Dict[str, list]) -> str:
+        requested = _param(params, "format")
+        if requested:
+            if requested not in FORMATS:
+                raise BadRequest(f"unknown format '{requested}' (expected one of {', '.join(FORMATS)})")
+            return requested
+        return "arrow" if ARROW_TYPE in self.headers.get("Accept", "") else "json"
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = JSON_TYPE, etag: Optional[str] = None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            # clients may keep the body but must revalidate it
+            self.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/health":
+            self._send(200, b'{"status":"ok"}')
+            return
+
+        route = ROUTES.get(url.path)
+        if route is None:
+            self._send_error(404, f"unknown endpoint '{url.path}' (expected one of {', '.join(ROUTES)})")
+            return
+
+        server = self.server
+        try:
+            fmt = self._negotiate(params)
+            generation = server.query.generation()
+            key = (url.path, tuple(sorted((k, tuple(v)) for k, v in params.items())), fmt)
+
+            digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+            etag = f'"{generation[0]}-{generation[1]}-{digest}"'
+
+            # a cached body passed the route's checks; anything else goes
+            # through them first, so a bad request is never answered with a 304
+            body = server.responses.get(key, generation)
+            if body is None:
+                body = ENCODERS[fmt](route(server.query, params))
+                server.responses.put(key, generation, body)
+
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                self._send(304, etag=etag)
+                return
+
+            self._send(200, body, FORMATS[fmt], etag)
+
+        except ValueError as e:
+            self._send_error(400, str(e))
+        except ImportError as e:
+            self._send_error(406, str(e))
+        except sqlite3.Error as e:
+            self._send_error(503, f"database unavailable: {e}")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None) -> bool:
+    host = host or config.SERVER_HOST
+    port = config.SERVER_PORT if port is None else port
+
+    server = QueryServer((host, port))
+    print(f"serving {config.DATABASE_PATH} on http://{host}:{server.server_port}")
+    print(f"endpoints: /health, {', '.join(ROUTES)}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nserver stopped")
+    finally:
+        server.server_close()
+    return True
@@ -0,0 +1,234 @@
+import hashlib
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import config
+from load import (
+    get_database_connection,
+    create_table_if_not_exists,
+    create_index_if_not_exists,
+    commit_write,
+    read_watermarks,
+    get_database_stats,
+    update_analytics,
+)
+
+# staging databases live next to the shared one, in this directory
+STAGING_DIR_NAME = "shards"
+
+STAGED_COLUMNS = (
+    "symbol, date, open_price, high_price, low_price, close_price, "
+    "volume, daily_change_percentage, extraction_timestamp"
+)
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """"2/4" -> (2, 4): the second of four shards (shards count from 1)"""
+    index, sep, count = spec.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit():
+        raise ValueError(f"invalid shard '{spec}' (expected i/N, e.g. 1/4)")
+
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"invalid shard '{spec}' (i must be between 1 and N)")
+    return index, count
+
+
+def _weight(symbol: str, shard: int) -> int:
+    # hash() is salted per process; every worker and host must agree
+    digest = hashlib.blake2b(f"{shard}/{symbol}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_for(symbol: str, count: int) -> int:
+    """
+        Shard (1..count) owning a symbol, by rendezvous hashing: each shard
+        scores the symbol and the highest score wins. Going from N to N + 1
+        shards only moves the symbols the new shard wins, about 1/(N + 1)
+        of them, so their watermarks and raw caches stay useful.
+    """
+    return max(range(1, count + 1), key=lambda shard: _weight(symbol, shard))
+
+
+def select_symbols(symbols: List[str], index: int, count: int) -> List[str]:
+    return [symbol for symbol in symbols if shard_for(symbol, count) == index]
+
+
+def staging_dir(db_path: Path) -> Path:
+    return Path(db_path).parent / STAGING_DIR_NAME
+
+
+def staging_path(db_path: Path, index: int, count: int) -> Path:
+    db_path = Path(db_path)
+    return staging_dir(db_path) / f"{db_path.stem}.shard_{index}_of_{count}.db"
+
+
+def configure_shard(index: int, count: int) -> Path:
+    """
+        Points this process at one shard: its symbols, its API key and its
+        own staging database and raw manifest, so shards never write to the
+        same file. Returns the shared database the shard merges into.
+    """
+    shared_db = Path(config.DATABASE_PATH)
+
+    config.STOCK_SYMBOLS = select_symbols(config.STOCK_SYMBOLS, index, count)
+    config.DATABASE_PATH = staging_path(shared_db, index, count)
+    config.RAW_MANIFEST_NAME = f"manifest.shard_{index}_of_{count}.json"
+    # computed once by the merge, over the shared table
+    config.ANALYTICS_ENABLED = False
+
+    key = config.shard_api_key(index)
+    if key:
+        config.ALPHA_VANTAGE_API_KEY = key
+    else:
+        # every shard without a key of its own draws on the shared key's quota:
+        # the daily count is already shared (config.API_QUOTA_PATH), the
+        # per-minute rate is split
+        config.API_REQUESTS_PER_MINUTE = max(config.API_REQUESTS_PER_MINUTE // count, 1)
+        print(f"no ALPHA_VANTAGE_API_KEY_{index} set, using ALPHA_VANTAGE_API_KEY "
+              f"at 1/{count} of its per-minute rate")
+
+    return shared_db
+
+
+def shard_watermarks(symbols: List[str], shared_db: Path) -> Dict[str, str]:
+    """High-water marks of a shard: rows staged but not merged yet count too."""
+    watermarks = read_watermarks(symbols, shared_db)
+
+    for symbol, latest in read_watermarks(symbols).items():
+        if latest > watermarks.get(symbol, ""):
+            watermarks[symbol] = latest
+
+    return watermarks
+
+
+def merge_staging_file(conn: sqlite3.Connection, path: Path) -> int:
+    """
+        Moves the rows of one staging database into the shared table and
+        returns how many were new. Rows already stored are kept, as in
+        insert_data, and the analytics are recomputed from each symbol's
+        first new row. The staging table is emptied in the same transaction;
+        in WAL mode the two files commit separately, but merging rows twice
+        changes nothing, so a merge that stops halfway can simply be rerun.
+    """
+    conn.execute("ATTACH DATABASE ? AS staging", (str(path),))
+
+    try:
+        staged = conn.execute(
+            "SELECT 1 FROM staging.sqlite_master WHERE type = 'table' AND name = ?", (config.TABLE_NAME,)
+        ).fetchone()
+        if not staged:
+            print(f"{path.name}: nothing staged")
+            return 0
+
+        # staged rows the shared table already has (from a rerun, or an
+        # overlapping fetch) are ignored below and change no analytics
+        starts = conn.execute(
+            f"SELECT symbol, MIN(date) FROM staging.{config.TABLE_NAME} AS staged "
+            f"WHERE NOT EXISTS (SELECT 1 FROM main.{config.TABLE_NAME} AS stored "
+            f"WHERE stored.symbol = staged.symbol AND stored.date = staged.date) "
+            f"GROUP BY symbol"
+        ).fetchall()
+
+        changes_before = conn.total_changes
+        conn.execute(
+            f"INSERT OR IGNORE INTO main.{config.TABLE_NAME} ({STAGED_COLUMNS}) "
+            f"SELECT {STAGED_COLUMNS} FROM staging.{config.TABLE_NAME}"
+        )
+        merged = conn.total_changes - changes_before
+
+        if config.ANALYTICS_ENABLED and merged:
+            update_analytics(conn, dict(starts))
+
+        conn.execute(f"DELETE FROM staging.{config.TABLE_NAME}")
+        commit_write(conn)
+
+        print(f"{path.name}: merged {merged} new rows for {len(starts)} symbols")
+        return merged
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.execute("DETACH DATABASE staging")
+
+
+def merge_shards(db_path: Optional[Path] = None) -> bool:
+    """
+        1. Find the staging databases of db_path (any shard count)
+        2. Merge each into the shared table, one transaction per shard; a
+           shard that fails stays staged for the next merge, the others
+           are merged anyway
+        3. Show statistics (with config.LOAD_TABLE_STATS)
+    """
+    db_path = Path(db_path or config.DATABASE_PATH)
+    files = sorted(staging_dir(db_path).glob(f"{db_path.stem}.shard_*_of_*.db"))
+
+    print("STARTING SHARD MERGE")
+    print(f"database: {db_path}")
+
+    if not files:
+        print(f"no staging databases in {staging_dir(db_path)}")
+        return True
+
+    conn = get_database_connection(db_path)
+    total_merged = 0
+    failed = []
+
+    try:
+        create_table_if_not_exists(conn)
+        create_index_if_not_exists(conn)
+
+        for path in files:
+            try:
+                total_merged += merge_staging_file(conn, path)
+            except Exception as e:
+                print(f"failed to merge {path.name}: {e} (its rows stay staged for the next merge)")
+                failed.append(path)
+
+        # every sharded run ends with a merge; the stats scan the whole table
+        if config.LOAD_TABLE_STATS:
+            get_database_stats(conn)
+
+    finally:
+        conn.close()
+
+    print("SHARD MERGE COMPLETE" if not failed else "SHARD MERGE INCOMPLETE")
+    print(f"staging databases: {len(files)}, new rows: {total_merged}, failed: {len(failed)}")
+    return not failed
+
+
+def run_local_shards(count: int, args: List[str]) -> bool:
+    """
+        Runs `main.py --shard i/count [args]` for every shard as parallel
+        local processes, then merges their staging databases. The console
+        output of each shard goes to LOGS_DIR/shard_<i>_of_<count>.out.
+    """
+    config.LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    main_path = Path(__file__).with_name("main.py")
+    processes = []
+
+    print(f"starting {count} shard processes...")
+    for index in range(1, count + 1):
+        out_path = config.LOGS_DIR / f"shard_{index}_of_{count}.out"
+        with open(out_path, 'w', encoding='utf-8') as out:
+            process = subprocess.Popen(
+                [sys.executable, str(main_path), "--shard", f"{index}/{count}", *args],
+                stdout=out, stderr=subprocess.STDOUT,
+            )
+        processes.append((index, process, out_path))
+
+    failed = []
+    for index, process, out_path in processes:
+        code = process.wait()
+        print(f"shard {index}/{count}: {'done' if code == 0 else f'failed (exit {code})'}, output in {out_path}")
+        if code:
+            failed.append(index)
+
+    # whatever the finished shards staged is merged even if others failed
+    merged = merge_shards()
+    return merged and not failed
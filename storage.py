@@ -0,0 +1,341 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+import config
+from load import (
+    get_database_connection,
+    create_table_if_not_exists,
+    create_index_if_not_exists,
+    insert_data,
+    analytics_start,
+    update_analytics,
+    commit_write,
+    get_watermarks,
+    read_watermarks as read_sqlite_watermarks,
+)
+from metrics import metrics
+
+# what config.STORAGE_BACKEND may name
+BACKENDS = ("sqlite", "duckdb")
+
+STORED_COLUMNS = [
+    "symbol", "date", "open_price", "high_price", "low_price", "close_price",
+    "volume", "daily_change_percentage", "extraction_timestamp",
+]
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("the duckdb storage backend needs the 'duckdb' package (pip install duckdb)")
+    return duckdb
+
+
+class StorageBackend(ABC):
+    """
+        Where the daily bars are stored: schema creation, bulk upserts in
+        one transaction, watermark lookups and SQL queries. The table is
+        config.TABLE_NAME with the same columns on every backend, so plain
+        SQL (window functions included) runs on all of them.
+    """
+
+    name = ""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @abstractmethod
+    def create_schema(self):
+        """Creates the table and its indexes if they don't exist."""
+
+    @abstractmethod
+    def upsert(self, symbol: str, df: pd.DataFrame, replace: bool = False) -> int:
+        """
+            Writes transformed rows of one symbol in the open transaction;
+            rows already stored are kept unless replace=True. Returns how
+            many rows were written.
+        """
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        pass
+
+    @abstractmethod
+    def watermarks(self, symbols: List[str]) -> Dict[str, str]:
+        """symbol -> latest stored date ("YYYY-MM-DD"); symbols without rows are left out."""
+
+    @abstractmethod
+    def query(self, sql: str, params: Iterable = ()) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def verify(self, symbol: str):
+        print(f"\nverifying data for {symbol}...")
+        df = self.query(f"""
+        SELECT symbol, CAST(date AS VARCHAR) AS date, open_price, close_price, volume, daily_change_percentage
+        FROM {config.TABLE_NAME}
+        WHERE symbol = ?
+        ORDER BY date DESC
+        LIMIT 5
+        """, (symbol,))
+
+        if df.empty:
+            print(f"   no data found for {symbol}")
+        else:
+            print(f"   latest 5 records for {symbol}:")
+            print(df.to_string(index=False))
+
+    def print_stats(self):
+        print(f"\ndatabase Statistics:")
+
+        total = self.query(f"SELECT COUNT(*) AS total FROM {config.TABLE_NAME}")["total"].iat[0]
+        print(f"total records: {total}")
+
+        counts = self.query(f"SELECT symbol, COUNT(*) AS count FROM {config.TABLE_NAME} "
+                            f"GROUP BY symbol ORDER BY symbol")
+        print("\nrecords per symbol:")
+        for symbol, count in counts.itertuples(index=False):
+            print(f"  {symbol}: {count}")
+
+        # as text, so every backend prints "YYYY-MM-DD"
+        dates = self.query(f"SELECT CAST(MIN(date) AS VARCHAR) AS earliest, CAST(MAX(date) AS VARCHAR) AS latest "
+                           f"FROM {config.TABLE_NAME}")
+        print(f"\nDate range: {dates['earliest'].iat[0]} to {dates['latest'].iat[0]}")
+
+
+class SqliteBackend(StorageBackend):
+    """The SQLite database of load.py, with the analytics tables kept up to date."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[Path] = None):
+        super().__init__(path or config.DATABASE_PATH)
+        self.conn = get_database_connection(self.path)
+        # symbol -> first date whose analytics the next commit recomputes
+        self.analytics_starts = {}
+
+    def create_schema(self):
+        create_table_if_not_exists(self.conn)
+        create_index_if_not_exists(self.conn)
+
+    def upsert(self, symbol: str, df: pd.DataFrame, replace: bool = False) -> int:
+        from_date = analytics_start(self.conn, df, symbol, replace)
+        rows_written = insert_data(self.conn, df, symbol, commit=False, replace=replace)
+        if from_date is not None:
+            pending = self.analytics_starts.get(symbol)
+            self.analytics_starts[symbol] = from_date if pending is None else min(pending, from_date)
+        return rows_written
+
+    def commit(self):
+        # the analytics of every symbol written since the last commit, in one batch
+        update_analytics(self.conn, self.analytics_starts)
+        self.analytics_starts = {}
+        commit_write(self.conn)
+
+    def rollback(self):
+        self.analytics_starts = {}
+        self.conn.rollback()
+
+    def watermarks(self, symbols: List[str]) -> Dict[str, str]:
+        return get_watermarks(self.conn, symbols)
+
+    def query(self, sql: str, params: Iterable = ()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.conn, params=tuple(params))
+
+    def close(self):
+        self.conn.close()
+
+
+class DuckDBBackend(StorageBackend):
+    """
+        An embedded DuckDB file (config.DUCKDB_PATH): a column store, so
+        scans over one or two columns of every symbol (cross-sectional
+        ranks, rolling windows) read far less than SQLite's rows. Rows go
+        in as whole DataFrames, not one statement per row.
+
+        The derived tables of analytics.py are SQLite-only; on DuckDB the
+        same windows are cheap to compute in the query itself.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path: Optional[Path] = None, read_only: bool = False):
+        duckdb = _duckdb()
+        super().__init__(path or config.DUCKDB_PATH)
+        print(f"connecting to database: {self.path}")
+        if not read_only:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = duckdb.connect(str(self.path), read_only=read_only)
+        self.in_transaction = False
+        print("database connection established")
+
+    def create_schema(self):
+        print(f"creating table '{config.TABLE_NAME}' if not exists...")
+        # the primary key is the only index: DuckDB prunes the other scans
+        # with the min/max statistics it keeps per row group
+        self.conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {config.TABLE_NAME} (
+            symbol VARCHAR NOT NULL,
+            date DATE NOT NULL,
+            open_price DOUBLE NOT NULL,
+            high_price DOUBLE NOT NULL,
+            low_price DOUBLE NOT NULL,
+            close_price DOUBLE NOT NULL,
+            volume BIGINT NOT NULL,
+            daily_change_percentage DOUBLE,
+            extraction_timestamp TIMESTAMP NOT NULL,
+            PRIMARY KEY (symbol, date)
+        )
+        """)
+        print(f"table '{config.TABLE_NAME}' ready")
+
+    def _begin(self):
+        if not self.in_transaction:
+            self.conn.begin()
+            self.in_transaction = True
+
+    def upsert(self, symbol: str, df: pd.DataFrame, replace: bool = False) -> int:
+        print(f"inserting data for {symbol}...")
+
+        if df.empty:
+            print(f"   no new rows for {symbol}")
+            return 0
+
+        incoming = pd.DataFrame({
+            "symbol": symbol,
+            "date": pd.to_datetime(df["date"]).to_numpy(),
+            **{column: df[column].to_numpy() for column in STORED_COLUMNS[2:-1]},
+            "extraction_timestamp": pd.to_datetime(df["extraction_timestamp"]).to_numpy(),
+        })
+        received = len(incoming)
+
+        self._begin()
+        with metrics.timer(symbol, "insert_seconds"):
+            # INSERT OR IGNORE/REPLACE checks every row against the primary key
+            # index and gets slower as the table grows; one lookup of the
+            # symbol's stored dates (pruned by the row groups' min/max of
+            # symbol) followed by a plain INSERT stays flat
+            if replace:
+                incoming = incoming.drop_duplicates("date", keep="last")
+            else:
+                incoming = incoming.drop_duplicates("date", keep="first")
+
+            stored = self.conn.execute(
+                f"SELECT date FROM {config.TABLE_NAME} WHERE symbol = ?", [symbol]
+            ).fetchnumpy()["date"]
+            exists = incoming["date"].isin(stored)
+
+            if replace and exists.any():
+                self.conn.register("replaced", incoming.loc[exists, ["date"]])
+                try:
+                    self.conn.execute(f"DELETE FROM {config.TABLE_NAME} "
+                                      f"WHERE symbol = ? AND date IN (SELECT CAST(date AS DATE) FROM replaced)", [symbol])
+                finally:
+                    self.conn.unregister("replaced")
+            elif not replace:
+                incoming = incoming.loc[~exists]
+
+            # DuckDB scans the registered DataFrame directly
+            self.conn.register("incoming", incoming)
+            try:
+                self.conn.execute(f"INSERT INTO {config.TABLE_NAME} ({', '.join(STORED_COLUMNS)}) "
+                                  f"SELECT {', '.join(STORED_COLUMNS)} FROM incoming")
+            finally:
+                self.conn.unregister("incoming")
+            rows_written = len(incoming)
+        metrics.add(symbol, "rows_inserted", rows_written)
+
+        if replace:
+            print(f"   wrote {rows_written} rows for {symbol}")
+        else:
+            print(f"   inserted {rows_written} new rows for {symbol}")
+            print(f"   (skipped {received - rows_written} duplicates)")
+        return rows_written
+
+    def commit(self):
+        if self.in_transaction:
+            self.conn.commit()
+            self.in_transaction = False
+
+    def rollback(self):
+        if self.in_transaction:
+            self.conn.rollback()
+            self.in_transaction = False
+
+    def watermarks(self, symbols: List[str]) -> Dict[str, str]:
+        if not symbols:
+            return {}
+        placeholders = ", ".join("?" for _ in symbols)
+        rows = self.conn.execute(
+            f"SELECT symbol, MAX(date) FROM {config.TABLE_NAME} WHERE symbol IN ({placeholders}) GROUP BY symbol",
+            list(symbols),
+        ).fetchall()
+        return {symbol: latest.isoformat() for symbol, latest in rows}
+
+    def query(self, sql: str, params: Iterable = ()) -> pd.DataFrame:
+        return self.conn.execute(sql, list(params)).df()
+
+    def close(self):
+        self.rollback()
+        self.conn.close()
+
+
+def backend_name() -> str:
+    name = config.STORAGE_BACKEND.strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown STORAGE_BACKEND '{config.STORAGE_BACKEND}' "
+                         f"(expected one of {', '.join(BACKENDS)})")
+    return name
+
+
+def get_backend(name: Optional[str] = None, path: Optional[Path] = None) -> StorageBackend:
+    """A connected backend: the one named, or config.STORAGE_BACKEND."""
+    name = name or backend_name()
+    if name == "duckdb":
+        return DuckDBBackend(path)
+    if name == "sqlite":
+        return SqliteBackend(path)
+    raise ValueError(f"unknown storage backend '{name}' (expected one of {', '.join(BACKENDS)})")
+
+
+def read_watermarks(symbols: List[str]) -> Dict[str, str]:
+    """High-water marks from the configured backend, without creating its database."""
+    if backend_name() == "sqlite":
+        return read_sqlite_watermarks(symbols)
+
+    path = Path(config.DUCKDB_PATH)
+    print(f"reading stored high-water marks from {path}...")
+    watermarks = {}
+
+    if path.exists():
+        duckdb = _duckdb()
+        backend = DuckDBBackend(path, read_only=True)
+        try:
+            watermarks = backend.watermarks(symbols)
+        except duckdb.CatalogException as e:
+            # table not created yet
+            print(f"no watermarks available: {e}")
+        finally:
+            backend.close()
+
+    for symbol in symbols:
+        print(f"  {symbol}: {watermarks.get(symbol, 'new symbol')}")
+
+    return watermarks
@@ -0,0 +1,164 @@
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import config
+import raw_cache
+from extract import extract_all_stocks
+from metrics import metrics
+from transform import transform_stock_data, transform_worker, columns_to_frame, report_transformed
+from load import load_targets
+from lake import DataLake, write_symbol
+from storage import get_backend
+
+# marks the end of a stage's output
+DONE = None
+
+
+def stream_all_stocks(watermarks: Optional[Dict[str, str]] = None, strict_model: bool = False) -> dict:
+    """
+        Runs extract -> transform -> load per symbol as soon as each stage is
+        ready, instead of finishing one stage for all symbols first.
+
+        The stages are joined by queues of config.STREAM_QUEUE_DEPTH symbols,
+        so a slow stage blocks the one before it and at most a few frames
+        are held in memory at any time.
+    """
+    print("STARTING STREAMING PIPELINE")
+
+    depth = max(config.STREAM_QUEUE_DEPTH, 1)
+    workers = max(min(config.TRANSFORM_WORKERS, len(config.STOCK_SYMBOLS)), 1)
+    print(f"queue depth: {depth}, transform workers: {workers}")
+
+    extract_queue = queue.Queue(maxsize=depth)
+    load_queue = queue.Queue(maxsize=depth)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    summary = {"extracted": 0, "skipped": 0, "transformed": 0, "loaded": 0, "records": 0, "inserted": 0}
+    summary_lock = threading.Lock()
+
+    def count(key: str, amount: int = 1):
+        with summary_lock:
+            summary[key] += amount
+
+    def extract_stage():
+        def on_extracted(symbol, filepath):
+            count("extracted")
+            extract_queue.put((symbol, filepath))
+
+        try:
+            extract_all_stocks(watermarks, on_extracted)
+        except Exception as e:
+            print(f"extraction stage failed: {e}")
+        finally:
+            for _ in range(workers):
+                extract_queue.put(DONE)
+
+    def transform_stage():
+        try:
+            while True:
+                item = extract_queue.get()
+                if item is DONE:
+                    break
+
+                symbol, filepath = item
+                since = (watermarks or {}).get(symbol)
+
+                if config.RAW_CACHE_ENABLED and not raw_cache.skip_loaded_payloads({symbol: filepath}):
+                    count("skipped")
+                    continue
+
+                try:
+                    if pool is None:
+                        df = transform_stock_data(filepath, symbol, since, strict_model)
+                    else:
+                        columns, error, output, symbol_metrics = pool.submit(
+                            transform_worker, filepath, symbol, since, strict_model
+                        ).result()
+                        print(output, end="")
+                        metrics.merge_symbol(symbol, symbol_metrics)
+                        if error:
+                            raise ValueError(error)
+                        df = columns_to_frame(columns)
+
+                except Exception as e:
+                    print(f"Failed to transform {symbol}: {e}")
+                    continue
+
+                if report_transformed(symbol, df, since):
+                    count("transformed")
+                    if config.RAW_CACHE_ENABLED:
+                        raw_cache.mark_files([filepath], "transformed")
+                    load_queue.put((symbol, filepath, df))
+        finally:
+            load_queue.put(DONE)
+
+    targets = load_targets()
+    lake = DataLake() if "lake" in targets else None
+    backend = get_backend() if "database" in targets else None
+
+    try:
+        if backend is not None:
+            backend.create_schema()
+
+        threads = [threading.Thread(target=extract_stage, name="extract", daemon=True)]
+        threads += [
+            threading.Thread(target=transform_stage, name=f"transform-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # load stage runs here, on the thread that owns the connection
+        finished = 0
+        while finished < workers:
+            item = load_queue.get()
+            if item is DONE:
+                finished += 1
+                continue
+
+            symbol, filepath, df = item
+            print(f"LOADING: {symbol}")
+
+            try:
+                rows_inserted = 0
+                if backend is not None:
+                    # commit per symbol so finished symbols survive a later failure
+                    rows_inserted = backend.upsert(symbol, df)
+                    backend.commit()
+                if lake is not None:
+                    written = write_symbol(lake, symbol, df)
+                    # the database's count is reported when both are written
+                    if backend is None:
+                        rows_inserted = written
+                count("inserted", rows_inserted)
+                count("records", len(df))
+                count("loaded")
+                if config.RAW_CACHE_ENABLED:
+                    raw_cache.mark_files([filepath], "loaded")
+            # each backend raises its own driver's errors; one symbol's failure
+            # must not stop the others
+            except Exception as e:
+                if backend is not None:
+                    backend.rollback()
+                print(f"Failed to load {symbol}: {e}")
+
+        for thread in threads:
+            thread.join()
+
+        if backend is not None and config.LOAD_TABLE_STATS:
+            backend.print_stats()
+
+    finally:
+        if backend is not None:
+            backend.close()
+        if pool is not None:
+            pool.shutdown()
+
+    print("STREAMING PIPELINE COMPLETE")
+    print(f"extracted: {summary['extracted']}, unchanged: {summary['skipped']}, "
+          f"transformed: {summary['transformed']}, "
+          f"loaded: {summary['loaded']}/{len(config.STOCK_SYMBOLS)} stocks")
+    print(f"total new records inserted: {summary['inserted']}")
+    return summary
@@ -0,0 +1,105 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+# the pipeline modules live at the top of the repository, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import api_client
+import config
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        params = {name: values[0] for name, values in parse_qs(urlsplit(self.path).query).items()}
+
+        with server.lock:
+            server.requests.append(params)
+            reply = server.replies.pop(0) if server.replies else None
+
+        if reply is None:
+            payload = server.payloads.get(params.get("symbol"), {"Error Message": "Invalid API call."})
+            reply = (200, payload, 0)
+
+        status, body, delay = reply
+        if delay:
+            time.sleep(delay)
+
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except ConnectionError:
+            # the client timed out and hung up
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubApi(ThreadingHTTPServer):
+    """
+        Local stand-in for the Alpha Vantage API. Answers the scripted
+        replies (status, body, delay in seconds) in order, then every
+        symbol's payload; records the query of every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubApiHandler)
+        self.lock = threading.Lock()
+        self.replies = []
+        self.payloads = {}
+        self.requests = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/query"
+
+
+@pytest.fixture
+def stub_api():
+    server = StubApi()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pipeline_config(stub_api, tmp_path, monkeypatch):
+    settings = {
+        "API_BASE_URL": stub_api.url,
+        "ALPHA_VANTAGE_API_KEY": "test",
+        "RAW_DATA_DIR": tmp_path / "raw_data",
+        "DATABASE_PATH": tmp_path / "database" / "stock_data.db",
+        "LAKE_DIR": tmp_path / "database" / "lake",
+        "LOGS_DIR": tmp_path / "logs",
+        "API_QUOTA_PATH": tmp_path / "api_quota.db",
+        "API_REQUESTS_PER_MINUTE": 10 ** 9,
+        "API_REQUESTS_PER_DAY": 0,
+        "API_BURST": 10,
+        "HTTP_MAX_RETRIES": 0,
+        "RAW_ARCHIVE_FORMAT": "json",
+        "RAW_COLUMNAR_FORMAT": "",
+        "METRICS_PROMETHEUS": False,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+
+    api_client.close_session()
+    yield stub_api
+    api_client.close_session()
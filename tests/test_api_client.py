@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+import time
+
+import pytest
+
+import api_client
+import config
+from extract import RateLimiter
+from metrics import metrics
+
+OK = {"Meta Data": {}, "Time Series (Daily)": {}}
+
+
+class CountingLimiter:
+    def __init__(self, allowed: int = 10 ** 9):
+        self.allowed = allowed
+        self.calls = 0
+
+    def acquire(self) -> bool:
+        self.calls += 1
+        return self.calls <= self.allowed
+
+
+@pytest.fixture
+def api(stub_api, monkeypatch):
+    settings = {
+        "API_BASE_URL": stub_api.url,
+        "HTTP_TIMEOUT": 0.3,
+        "HTTP_MAX_RETRIES": 3,
+        "HTTP_BACKOFF_BASE": 1.0,
+        "HTTP_BACKOFF_MAX": 3.0,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+
+    # backoff always waits its full ceiling, and only records it
+    sleeps = []
+    monkeypatch.setattr(api_client.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(api_client, "time", SimpleNamespace(sleep=sleeps.append, perf_counter=time.perf_counter))
+    stub_api.sleeps = sleeps
+
+    api_client.close_session()
+    api_client.latency_stats.reset()
+    yield stub_api
+    api_client.close_session()
+
+
+def test_server_errors_are_retried_with_backoff(api):
+    api.replies = [(503, {}, 0), (502, {}, 0), (500, {}, 0), (200, OK, 0)]
+
+    assert api_client.get_json({"symbol": "AAPL"}) == OK
+    assert len(api.requests) == 4
+    # base * 2^attempt, capped at HTTP_BACKOFF_MAX
+    assert api.sleeps == [1.0, 2.0, 3.0]
+    assert api_client.latency_stats.summary()["retries"] == 3
+
+
+def test_timeouts_are_retried(api):
+    api.replies = [(200, OK, 1.0), (200, OK, 0)]
+
+    assert api_client.get_json({"symbol": "AAPL"}) == OK
+    assert len(api.requests) == 2
+    assert api.sleeps == [1.0]
+
+
+def test_failed_attempts_are_counted_with_the_same_durations(api):
+    api.replies = [(200, OK, 1.0), (503, {}, 0), (200, OK, 0)]
+    metrics.reset()
+
+    api_client.get_json({"symbol": "AAPL"})
+    counted = metrics.symbols["AAPL"]
+    assert counted["http_requests"] == 3
+    # the timed-out attempt included
+    assert counted["http_seconds"] == sum(api_client.latency_stats.samples)
+    assert counted["http_seconds"] >= 0.3
+
+
+@pytest.mark.parametrize("key", api_client.THROTTLE_KEYS)
+def test_throttle_payloads_are_retried(api, key):
+    api.replies = [(200, {key: "Thank you for using Alpha Vantage!"}, 0), (200, OK, 0)]
+
+    assert api_client.get_json({"symbol": "AAPL"}) == OK
+    assert len(api.requests) == 2
+    assert api.sleeps == [1.0]
+
+
+def test_every_attempt_takes_a_token(api):
+    api.replies = [(503, {}, 0), (200, {"Note": "slow down"}, 0), (200, OK, 0)]
+    limiter = CountingLimiter()
+
+    api_client.get_json({"symbol": "AAPL"}, limiter=limiter)
+    assert limiter.calls == len(api.requests) == 3
+
+
+def test_retries_count_against_the_daily_quota(api):
+    api.replies = [(503, {}, 0)] * 4
+    limiter = RateLimiter(10 ** 9, requests_per_day=2, burst=10)
+
+    with pytest.raises(api_client.QuotaExhaustedError):
+        api_client.get_json({"symbol": "AAPL"}, limiter=limiter)
+    assert len(api.requests) == 2
+    assert limiter.used_today == 2
+
+
+def test_quota_exhausted_before_any_request(api):
+    with pytest.raises(api_client.QuotaExhaustedError):
+        api_client.get_json({"symbol": "AAPL"}, limiter=CountingLimiter(allowed=0))
+    assert api.requests == []
+
+
+def test_gives_up_after_the_last_retry(api):
+    api.replies = [(503, {}, 0)] * 10
+
+    with pytest.raises(api_client.ApiRequestError) as raised:
+        api_client.get_json({"symbol": "AAPL"})
+    assert not isinstance(raised.value, api_client.QuotaExhaustedError)
+    assert "gave up after 4 attempts" in str(raised.value)
+    assert len(api.requests) == 4
+    assert api_client.latency_stats.summary()["failures"] == 1
+
+
+@pytest.mark.parametrize("reply", [(404, {"error": "not found"}, 0), (200, b"<html>not json</html>", 0)])
+def test_client_errors_and_bad_bodies_are_not_retried(api, reply):
+    api.replies = [reply, (200, OK, 0)]
+
+    with pytest.raises(api_client.ApiRequestError):
+        api_client.get_json({"symbol": "AAPL"})
+    assert len(api.requests) == 1
+    assert api.sleeps == []
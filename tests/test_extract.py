@@ -0,0 +1,76 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+import config
+import extract
+from db_meta import META_TABLE, create_meta_table
+
+BAR = {"1. open": "10.0", "2. high": "11.0", "3. low": "9.5", "4. close": "10.5", "5. volume": "1000"}
+
+
+def test_empty_time_series_fails_only_its_symbol(pipeline_config, monkeypatch):
+    stub = pipeline_config
+    stub.payloads = {
+        "AAPL": {"Meta Data": {}, "Time Series (Daily)": {}},
+        "MSFT": {"Meta Data": {}, "Time Series (Daily)": {"2024-03-01": BAR}},
+    }
+    monkeypatch.setattr(config, "STOCK_SYMBOLS", ["AAPL", "MSFT"])
+
+    # AAPL is stored, so a compact fetch is checked for a gap
+    results = extract.extract_all_stocks({"AAPL": "2024-02-29", "MSFT": "2024-02-29"})
+    assert list(results) == ["MSFT"]
+
+
+def test_worker_exception_fails_only_its_symbol(pipeline_config, monkeypatch):
+    stub = pipeline_config
+    stub.payloads = {symbol: {"Meta Data": {}, "Time Series (Daily)": {"2024-03-01": BAR}}
+                     for symbol in ("AAPL", "MSFT")}
+    monkeypatch.setattr(config, "STOCK_SYMBOLS", ["AAPL", "MSFT"])
+
+    def broken_on_extracted(symbol, filepath):
+        if symbol == "AAPL":
+            raise RuntimeError("downstream queue closed")
+
+    results = extract.extract_all_stocks(on_extracted=broken_on_extracted)
+    assert list(results) == ["MSFT"]
+
+
+def test_quota_database_is_opened_once_and_pruned_by_key_range(tmp_path, monkeypatch):
+    path = tmp_path / "api_quota.db"
+    with closing(sqlite3.connect(path)) as conn, conn:
+        create_meta_table(conn)
+        # "_" would match any character in a LIKE pattern
+        conn.executemany(f"INSERT INTO {META_TABLE} (key, value) VALUES (?, '5')",
+                         [("key_1:2000-01-01", ), ("keyX1:2000-01-01", )])
+
+    connections = []
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        connections.append(args)
+        return connect(*args, **kwargs)
+
+    monkeypatch.setattr(extract.sqlite3, "connect", counting_connect)
+
+    limiter = extract.RateLimiter(10 ** 9, requests_per_day=10, burst=10, quota_path=path, quota_name="key_1")
+    assert all(limiter.acquire() for _ in range(3))
+    limiter.close()
+    assert len(connections) == 1
+
+    # counted under the day in UTC, where the quota resets
+    today = datetime.now(timezone.utc).date().isoformat()
+    with closing(sqlite3.connect(path)) as conn:
+        counters = dict(conn.execute(f"SELECT key, value FROM {META_TABLE}").fetchall())
+    assert counters == {"keyX1:2000-01-01": "5", f"key_1:{today}": "3"}
+
+
+def test_limiters_on_one_quota_database_share_the_daily_count(tmp_path):
+    limiters = [extract.RateLimiter(10 ** 9, requests_per_day=5, burst=10, quota_path=tmp_path / "api_quota.db")
+                for _ in range(2)]
+    granted = [limiter.acquire() for _ in range(4) for limiter in limiters]
+    for limiter in limiters:
+        limiter.close()
+
+    assert granted.count(True) == 5
+    assert granted[5:] == [False] * 3
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import lake
+
+
+def bars(start: str, days: int, close: float = 100.0) -> pd.DataFrame:
+    dates = pd.bdate_range(start, periods=days)
+    closes = [close + i for i in range(days)]
+    return pd.DataFrame({
+        "symbol": "AAPL",
+        "date": dates.date,
+        "open_price": closes,
+        "high_price": [c + 1 for c in closes],
+        "low_price": [c - 1 for c in closes],
+        "close_price": closes,
+        "volume": 1000,
+        "daily_change_percentage": 0.0,
+        "extraction_timestamp": pd.Timestamp(datetime(2024, 3, 1, 18)),
+    })
+
+
+@pytest.mark.parametrize("first, second", [("parquet", "arrow"), ("arrow", "parquet")])
+def test_changing_the_format_keeps_the_stored_rows(tmp_path, first, second):
+    assert lake.DataLake(tmp_path, first).append("AAPL", bars("2024-01-01", 20)) == 20
+
+    switched = lake.DataLake(tmp_path, second)
+    # the first 20 dates are stored already, in the other format
+    assert switched.append("AAPL", bars("2024-01-01", 30)) == 10
+    assert switched.watermark("AAPL") == "2024-02-09"
+
+    stored = switched.read(["AAPL"])
+    assert len(stored) == 30
+    assert stored["date"].is_unique
+    assert switched.panel(["AAPL"])["values"].shape == (30, 1)
+
+    # compaction rewrites the partition in the current format
+    assert switched.compact() == 1
+    [merged] = switched.part_files(switched.partition_dir("AAPL", 2024))
+    assert merged.suffix == lake.LAKE_FORMATS[second]
+    pd.testing.assert_frame_equal(switched.read(["AAPL"]), stored)
+
+
+@pytest.mark.parametrize("lake_format", list(lake.LAKE_FORMATS))
+def test_appending_after_the_stored_dates_reads_no_rows(tmp_path, monkeypatch, lake_format):
+    data_lake = lake.DataLake(tmp_path, lake_format)
+    data_lake.append("AAPL", bars("2024-01-01", 20))
+
+    reads = []
+    read_files = data_lake._read_files
+
+    def recording_read_files(files, columns=None):
+        reads.append(files)
+        return read_files(files, columns)
+
+    monkeypatch.setattr(data_lake, "_read_files", recording_read_files)
+
+    assert data_lake.append("AAPL", bars("2024-01-29", 5)) == 5
+    assert reads == []
+    parts = data_lake.part_files(data_lake.partition_dir("AAPL", 2024))
+
+    # a batch overlapping the second file reads the dates of that one only
+    assert data_lake.append("AAPL", bars("2024-02-01", 5)) == 3
+    assert [[path.name for path in files] for files in reads] == [[parts[1].name]]
+    assert len(data_lake.read(["AAPL"])) == 28
@@ -0,0 +1,190 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+import config
+import indicators
+import load
+
+
+def frame(days: int, start: str = "2024-01-02", close: float = 100.0) -> pd.DataFrame:
+    dates = pd.bdate_range(start, periods=days)
+    closes = [close + i for i in range(days)]
+    return pd.DataFrame({
+        "symbol": "AAPL",
+        "date": dates.date,
+        "open_price": closes,
+        "high_price": [c + 1 for c in closes],
+        "low_price": [c - 1 for c in closes],
+        "close_price": closes,
+        "volume": 1000,
+        "daily_change_percentage": 0.0,
+        "extraction_timestamp": pd.Timestamp(datetime(2024, 3, 1, 18)),
+    })
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ANALYTICS_ENABLED", True)
+    conn = load.get_database_connection(tmp_path / "stock_data.db")
+    load.create_table_if_not_exists(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def recomputes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(analytics, "update_symbol", lambda conn, symbol, from_date: calls.append(from_date))
+    return calls
+
+
+def upsert(conn, df, replace=False):
+    upsert_symbols(conn, {"AAPL": df}, replace)
+
+
+def upsert_symbols(conn, frames: dict, replace=False):
+    starts = {}
+    for symbol, df in frames.items():
+        starts[symbol] = load.analytics_start(conn, df, symbol, replace)
+        load.insert_data(conn, df, symbol, commit=False, replace=replace)
+    load.update_analytics(conn, starts)
+
+
+def test_first_load_starts_at_the_first_row(conn, recomputes):
+    upsert(conn, frame(30))
+    assert recomputes == ["2024-01-02"]
+
+
+def test_rows_already_stored_are_not_recomputed(conn, recomputes):
+    df = frame(30)
+    upsert(conn, df)
+    upsert(conn, df)
+    assert recomputes == ["2024-01-02"]
+
+
+def test_overlapping_load_starts_at_the_first_new_row(conn, recomputes):
+    upsert(conn, frame(30))
+    # the same 30 days plus 5 more
+    upsert(conn, frame(35))
+    assert recomputes == ["2024-01-02", "2024-02-13"]
+
+
+def test_replace_starts_at_the_first_changed_row(conn, recomputes):
+    df = frame(30)
+    upsert(conn, df)
+
+    upsert(conn, df, replace=True)
+    changed = df.copy()
+    changed.loc[20, "close_price"] += 0.5
+    upsert(conn, changed, replace=True)
+
+    assert recomputes == ["2024-01-02", changed["date"].iat[20].isoformat()]
+
+
+def test_incremental_update_matches_a_full_recompute(conn, tmp_path):
+    df = frame(80)
+    upsert(conn, df.iloc[:60])
+    upsert(conn, df)
+    conn.commit()
+    incremental = analytics.get_indicators(conn, "AAPL")
+
+    full = load.get_database_connection(tmp_path / "full.db")
+    load.create_table_if_not_exists(full)
+    load.insert_data(full, df, "AAPL")
+    analytics.update_symbol(full, "AAPL")
+    pd.testing.assert_frame_equal(incremental, analytics.get_indicators(full, "AAPL"))
+    full.close()
+
+
+def noisy_frame(days: int) -> pd.DataFrame:
+    df = frame(days)
+    closes = 100 + 10 * np.sin(np.arange(days) / 3) + 0.1 * np.arange(days)
+    return df.assign(open_price=closes - 0.5, high_price=closes + 1, low_price=closes - 1, close_price=closes,
+                     volume=1000 + 10 * np.arange(days))
+
+
+def test_technical_indicators_continue_from_the_stored_history(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INDICATORS", "returns,atr_14,rsi_14,bollinger_20,vwap_20")
+    load.create_table_if_not_exists(conn)
+    df = noisy_frame(80)
+    upsert(conn, df.iloc[:60])
+    # an incremental extract only brings the rows after the watermark
+    upsert(conn, df.iloc[60:])
+    incremental = analytics.get_technical(conn, "AAPL")
+
+    full = load.get_database_connection(tmp_path / "full.db")
+    load.create_table_if_not_exists(full)
+    load.insert_data(full, df, "AAPL")
+    analytics.update_technical(full, {"AAPL": None})
+    expected = analytics.get_technical(full, "AAPL")
+    full.close()
+
+    assert len(incremental) == 80
+    assert incremental[["rsi_14", "atr_14", "bb_upper_20", "vwap_20"]].iloc[60:].notna().all().all()
+    # the rolling sums only differ in the last bits
+    pd.testing.assert_frame_equal(incremental, expected, check_exact=False, rtol=1e-9)
+
+
+def test_changing_the_indicators_recomputes_every_row(conn, monkeypatch):
+    monkeypatch.setattr(config, "INDICATORS", "rsi_14")
+    load.create_table_if_not_exists(conn)
+    df = noisy_frame(40)
+    upsert(conn, df.iloc[:30])
+
+    monkeypatch.setattr(config, "INDICATORS", "atr_5")
+    load.create_table_if_not_exists(conn)
+    upsert(conn, df)
+
+    stored = analytics.get_technical(conn, "AAPL")
+    assert list(stored.columns) == ["symbol", "date", "atr_5"]
+    assert len(stored) == 40
+    assert stored["atr_5"].iloc[4:].notna().all()
+
+
+def two_calendars(days: int) -> dict:
+    """AAPL trades every business day; MSFT skips every fifth one and starts a week later."""
+    aapl = noisy_frame(days)
+    msft = noisy_frame(days).iloc[5:].assign(symbol="MSFT", close_price=lambda df: df["close_price"] * 2)
+    return {"AAPL": aapl, "MSFT": msft[msft.index % 5 != 2].reset_index(drop=True)}
+
+
+def test_symbols_on_different_calendars_are_computed_on_their_own_bars():
+    specs = indicators.parse_indicator_specs("log_returns,atr_5,rsi_5,bollinger_5,vwap_5")
+    frames = two_calendars(40)
+    panel = pd.concat(frames.values(), ignore_index=True)
+
+    together = indicators.compute_indicators(panel, specs)
+
+    for symbol, df in frames.items():
+        alone = indicators.compute_indicators(df, specs)
+        rows = together[panel["symbol"] == symbol].reset_index(drop=True)
+        pd.testing.assert_frame_equal(rows, alone)
+        # a date only the other symbol trades on leaves no hole
+        assert rows["log_return"].iloc[1:].notna().all()
+        assert rows["bb_middle_5"].iloc[4:].notna().all()
+
+
+def test_a_batch_of_symbols_continues_each_history(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INDICATORS", "returns,atr_14,rsi_14,bollinger_20,vwap_20")
+    load.create_table_if_not_exists(conn)
+    frames = two_calendars(80)
+    upsert_symbols(conn, {"AAPL": frames["AAPL"].iloc[:60], "MSFT": frames["MSFT"].iloc[:30]})
+    upsert_symbols(conn, {"AAPL": frames["AAPL"].iloc[60:], "MSFT": frames["MSFT"].iloc[30:]})
+
+    full = load.get_database_connection(tmp_path / "full.db")
+    load.create_table_if_not_exists(full)
+    for symbol, df in frames.items():
+        load.insert_data(full, df, symbol)
+        analytics.update_technical(full, {symbol: None})
+
+    for symbol, df in frames.items():
+        incremental = analytics.get_technical(conn, symbol)
+        assert len(incremental) == len(df)
+        assert incremental[["rsi_14", "atr_14", "bb_upper_20"]].iloc[25:].notna().all().all()
+        pd.testing.assert_frame_equal(incremental, analytics.get_technical(full, symbol),
+                                      check_exact=False, rtol=1e-9)
+    full.close()
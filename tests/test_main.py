@@ -0,0 +1,60 @@
+import threading
+
+import config
+import main
+
+BAR = {"1. open": "10.0", "2. high": "11.0", "3. low": "9.5", "4. close": "10.5", "5. volume": "1000"}
+
+
+def test_stage_output_goes_to_the_log(pipeline_config, monkeypatch):
+    stub = pipeline_config
+    stub.payloads = {symbol: {"Meta Data": {}, "Time Series (Daily)": {"2024-03-01": BAR}}
+                     for symbol in ("AAPL", "MSFT")}
+    monkeypatch.setattr(config, "STOCK_SYMBOLS", ["AAPL", "MSFT"])
+    monkeypatch.setattr(config, "TRANSFORM_WORKERS", 2)
+
+    assert main.run_etl_pipeline(stream=True)
+
+    [log_file] = config.LOGS_DIR.glob("*.log")
+    log = log_file.read_text(encoding="utf-8")
+    # per symbol, from the extract threads, the transform workers and the loader
+    for symbol in ("AAPL", "MSFT"):
+        assert f"fetching daily data for {symbol}" in log
+        assert f"Parsed 1 rows for {symbol}" in log
+        assert f"inserted 1 new rows for {symbol}" in log
+    # log_and_print's own lines are not written twice
+    assert log.count("ETL PIPELINE SUCCESS") == 1
+
+
+def test_logged_output_collects_prints_from_threads(tmp_path, capsys):
+    log_file = tmp_path / "run.log"
+
+    with main.logged_output(log_file):
+        threads = [threading.Thread(target=print, args=(f"line {i}",)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        main.log_and_print("done", log_file)
+
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert sorted(lines) == sorted([f"line {i}" for i in range(20)] + ["done"])
+    assert capsys.readouterr().out.splitlines() == lines
+
+
+def test_logged_output_refuses_worker_threads(tmp_path):
+    errors = []
+
+    def enter():
+        try:
+            with main.logged_output(tmp_path / "run.log"):
+                pass
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=enter)
+    thread.start()
+    thread.join()
+
+    assert len(errors) == 1
+    assert not (tmp_path / "run.log").exists()
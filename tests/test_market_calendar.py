@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import pytest
+
+import market_calendar
+
+
+@pytest.mark.parametrize("good_friday", [date(2024, 3, 29), date(2025, 4, 18), date(2026, 4, 3)])
+def test_good_friday_is_a_holiday(good_friday):
+    thursday, monday = good_friday - timedelta(days=1), good_friday + timedelta(days=3)
+    assert not market_calendar.is_trading_day(good_friday)
+    assert market_calendar.trading_days(thursday, monday) == [thursday, monday]
+
+
+@pytest.mark.parametrize("holiday, observed", [
+    (date(2026, 7, 4), date(2026, 7, 3)),       # Saturday -> the Friday before
+    (date(2022, 12, 25), date(2022, 12, 26)),   # Sunday -> the Monday after
+    (date(2022, 6, 19), date(2022, 6, 20)),     # Juneteenth on a Sunday
+    (date(2023, 1, 1), date(2023, 1, 2)),       # New Year's Day on a Sunday
+])
+def test_weekend_holidays_close_the_nearest_weekday(holiday, observed):
+    assert observed in market_calendar.holidays(holiday.year)
+    assert not market_calendar.is_trading_day(observed)
+
+
+def test_a_saturday_new_year_is_not_made_up_in_the_old_year():
+    # 2022-01-01 was a Saturday; Friday 2021-12-31 traded
+    assert market_calendar.is_trading_day(date(2021, 12, 31))
+    assert date(2021, 12, 31) not in market_calendar.holidays(2022)
+
+
+def test_trading_days_skip_weekends_and_holidays():
+    # Thanksgiving week 2024
+    assert market_calendar.trading_days(date(2024, 11, 25), date(2024, 12, 1)) == [
+        date(2024, 11, 25), date(2024, 11, 26), date(2024, 11, 27), date(2024, 11, 29),
+    ]
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import config
+import raw_archive
+from replay import raw_capture_time, run_replay
+
+
+def bar(close: float) -> dict:
+    return {"1. open": f"{close - 1:.2f}", "2. high": f"{close + 1:.2f}", "3. low": f"{close - 2:.2f}",
+            "4. close": f"{close:.2f}", "5. volume": "1000"}
+
+
+def save_raw(raw_dir, name: str, bars: dict, fetched_at: datetime):
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    path = raw_archive.write_payload(raw_dir, name, {"Meta Data": {}, "Time Series (Daily)": bars}, "json")
+    os.utime(path, (fetched_at.timestamp(), fetched_at.timestamp()))
+    return path
+
+
+@pytest.fixture
+def raw_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RAW_DATA_DIR", tmp_path / "raw_data")
+    monkeypatch.setattr(config, "ANALYTICS_ENABLED", False)
+    # an older file, and a newer one that overlaps it by a day
+    save_raw(tmp_path / "raw_data", "AAPL_2024-03-04",
+             {"2024-03-01": bar(100), "2024-03-04": bar(101)}, datetime(2024, 3, 4, 22, 15, 7))
+    save_raw(tmp_path / "raw_data", "AAPL_2024-03-05",
+             {"2024-03-04": bar(102), "2024-03-05": bar(103)}, datetime(2024, 3, 5, 22, 16, 9))
+    return tmp_path / "raw_data"
+
+
+def stored_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            f"SELECT date, close_price, extraction_timestamp FROM {config.TABLE_NAME} ORDER BY date"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rows_keep_the_capture_time_of_their_raw_file(raw_dir, tmp_path, workers):
+    db_path = tmp_path / f"replay_{workers}.db"
+
+    assert run_replay(db_path=db_path, workers=workers)
+    assert stored_rows(db_path) == [
+        ("2024-03-01", 100.0, "2024-03-04 22:15:07"),
+        # the newer file wins the overlapping day
+        ("2024-03-04", 102.0, "2024-03-05 22:16:09"),
+        ("2024-03-05", 103.0, "2024-03-05 22:16:09"),
+    ]
+
+
+def test_replaying_twice_rewrites_the_same_rows(raw_dir, tmp_path):
+    db_path = tmp_path / "replay.db"
+
+    assert run_replay(db_path=db_path, workers=1)
+    first = stored_rows(db_path)
+    assert run_replay(db_path=db_path, workers=1)
+    assert stored_rows(db_path) == first
+
+
+def test_serial_replay_stays_in_process(raw_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr("replay.ProcessPoolExecutor", None)
+    assert run_replay(db_path=tmp_path / "replay.db", workers=1)
+
+
+def test_copied_file_falls_back_to_the_day_in_its_name(raw_dir):
+    path = raw_dir / "AAPL_2024-03-04.json"
+    os.utime(path, (datetime(2024, 6, 1, 9, 0).timestamp(),) * 2)
+
+    assert raw_capture_time(path) == datetime(2024, 3, 4)
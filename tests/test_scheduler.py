@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import config
+import scheduler
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+class FailingAction:
+    """A job action that fails its first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self) -> bool:
+        self.calls += 1
+        return self.calls > self.failures
+
+
+@pytest.fixture
+def make_scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MARKET_TIMEZONE", "America/New_York")
+    monkeypatch.setattr(config, "SCHEDULER_RETRY_MINUTES", 0)
+
+    def make(job: scheduler.Job, now: datetime) -> scheduler.Scheduler:
+        instance = scheduler.Scheduler([job], tmp_path / "state.json", tmp_path / "scheduler.lock")
+        instance.now = lambda: now
+        return instance
+
+    return make
+
+
+def run(instance: scheduler.Scheduler, coroutine_function, *args):
+    async def main():
+        instance.running = asyncio.Lock()
+        return await coroutine_function(*args)
+
+    return asyncio.run(main())
+
+
+def daily_job(action) -> scheduler.Job:
+    return scheduler.Job("daily", action, at=time(18, 0))
+
+
+def test_catch_up_makes_one_run_for_the_missed_trading_days(make_scheduler, capsys):
+    action = FailingAction()
+    job = daily_job(action)
+    # Tuesday evening after Easter; the last run was on Maundy Thursday
+    instance = make_scheduler(job, datetime(2024, 4, 2, 20, 0, tzinfo=NEW_YORK))
+    last_run = datetime(2024, 3, 28, 18, 0, tzinfo=NEW_YORK)
+    instance.state.record("daily", last_run, True, last_run, last_run)
+
+    run(instance, instance.catch_up, job)
+
+    assert action.calls == 1
+    assert instance.state.last_success("daily") == datetime(2024, 4, 2, 18, 0, tzinfo=NEW_YORK)
+    # Good Friday had no run to miss
+    assert "trading days 2024-04-01, 2024-04-02" in capsys.readouterr().out
+
+
+def test_catch_up_without_a_previous_run_does_nothing(make_scheduler):
+    action = FailingAction()
+    job = daily_job(action)
+    instance = make_scheduler(job, datetime(2024, 4, 2, 20, 0, tzinfo=NEW_YORK))
+
+    run(instance, instance.catch_up, job)
+    assert action.calls == 0
+
+
+def test_a_failed_run_is_retried_until_it_succeeds(make_scheduler):
+    action = FailingAction(failures=2)
+    job = daily_job(action)
+    now = datetime(2024, 4, 2, 18, 0, tzinfo=NEW_YORK)
+    instance = make_scheduler(job, now)
+
+    run(instance, instance.run_with_retries, job, now)
+
+    assert action.calls == 3
+    assert instance.state.last_success("daily") == now
+
+
+def test_no_retry_after_the_next_regular_run(make_scheduler):
+    action = FailingAction(failures=1)
+    job = daily_job(action)
+    now = datetime(2024, 4, 2, 18, 0, tzinfo=NEW_YORK)
+    instance = make_scheduler(job, now)
+    instance.retry_delay = timedelta(days=1)
+
+    run(instance, instance.run_with_retries, job, now)
+
+    assert action.calls == 1
+    assert instance.state.last_success("daily") is None
+
+
+def test_a_run_already_done_is_not_repeated(make_scheduler):
+    action = FailingAction()
+    job = daily_job(action)
+    now = datetime(2024, 4, 2, 18, 0, tzinfo=NEW_YORK)
+    instance = make_scheduler(job, now)
+
+    assert run(instance, instance.run_job, job, now)
+    assert run(instance, instance.run_job, job, now)
+    assert action.calls == 1
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="needs fcntl")
+def test_run_lock_is_exclusive(tmp_path):
+    first, second = scheduler.RunLock(tmp_path / "run.lock"), scheduler.RunLock(tmp_path / "run.lock")
+
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="needs fcntl")
+def test_a_run_is_skipped_while_another_holds_the_lock(make_scheduler, tmp_path):
+    action = FailingAction()
+    job = daily_job(action)
+    now = datetime(2024, 4, 2, 18, 0, tzinfo=NEW_YORK)
+    instance = make_scheduler(job, now)
+
+    other = scheduler.RunLock(tmp_path / "scheduler.lock")
+    assert other.acquire()
+    try:
+        assert run(instance, instance.run_job, job, now) is None
+    finally:
+        other.release()
+
+    assert action.calls == 0
+    assert instance.state.last_success("daily") is None
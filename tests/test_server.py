@@ -0,0 +1,92 @@
+import http.client
+import json
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import config
+from server import QueryServer
+from storage import SqliteBackend
+
+
+def bars(symbol: str, days: int) -> pd.DataFrame:
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    closes = [100.0 + i for i in range(days)]
+    return pd.DataFrame({
+        "symbol": symbol,
+        "date": dates.date,
+        "open_price": closes,
+        "high_price": [c + 1 for c in closes],
+        "low_price": [c - 1 for c in closes],
+        "close_price": closes,
+        "volume": 1000,
+        "daily_change_percentage": 1.0,
+        "extraction_timestamp": pd.Timestamp(datetime(2024, 3, 1, 18)),
+    })
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ANALYTICS_ENABLED", True)
+    db_path = tmp_path / "stock_data.db"
+    with SqliteBackend(db_path) as backend:
+        backend.create_schema()
+        backend.upsert("AAPL", bars("AAPL", 30))
+        backend.commit()
+
+    monkeypatch.setattr(config, "DATABASE_PATH", db_path)
+    server = QueryServer(("127.0.0.1", 0), quiet=True)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path: str, headers: dict = None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, response.getheader("ETag"), json.loads(body) if body else None
+    finally:
+        conn.close()
+
+
+def test_rollups_are_served(server):
+    status, _, weekly = get(server, "/rollups?symbol=aapl")
+    assert status == 200
+    # 30 business days from Monday 2024-01-01: six whole weeks
+    assert weekly["period_start"] == [f"2024-{d}" for d in ("01-01", "01-08", "01-15", "01-22", "01-29", "02-05")]
+    assert weekly["trading_days"] == [5] * 6
+    assert weekly["volume"] == [5000] * 6
+
+    status, _, monthly = get(server, "/rollups?symbol=AAPL&period=monthly&start=2024-02-01")
+    assert status == 200
+    assert monthly["period_start"] == ["2024-02-01"]
+    assert monthly["open_price"] == [123.0]
+
+
+def test_unknown_rollup_period_is_a_bad_request(server):
+    status, _, body = get(server, "/rollups?symbol=AAPL&period=yearly")
+    assert status == 400
+    assert "unknown rollup period" in body["error"]
+
+
+def test_if_none_match_compares_whole_tags(server):
+    status, etag, _ = get(server, "/range?symbol=AAPL")
+    assert status == 200
+
+    for header in (etag, f'"other", W/{etag}', "*"):
+        assert get(server, "/range?symbol=AAPL", {"If-None-Match": header})[0] == 304
+    # a tag that merely contains the current one is a different tag
+    for header in (f'"x{etag}"', f'"x{etag[1:]}', '"other"'):
+        assert get(server, "/range?symbol=AAPL", {"If-None-Match": header})[0] == 200
+
+
+def test_a_bad_request_is_never_not_modified(server):
+    status, _, body = get(server, "/range?symbol=AAPL&start=yesterday", {"If-None-Match": "*"})
+    assert status == 400
+    assert "invalid date" in body["error"]
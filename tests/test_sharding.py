@@ -0,0 +1,187 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import analytics
+import config
+import sharding
+from benchmark import make_panel, make_payload
+from storage import SqliteBackend
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SYMBOLS = ["AAPL", "GOOG", "MSFT", "AMZN", "NVDA", "META"]
+INDICATORS = "rsi_14,atr_14,bollinger_20"
+
+
+def snapshot(db_path: Path) -> dict:
+    """Every stored row of the daily table and the analytics tables, in key order."""
+    tables = {
+        config.TABLE_NAME: f"SELECT {sharding.STAGED_COLUMNS} FROM {config.TABLE_NAME} ORDER BY symbol, date",
+        analytics.INDICATORS_TABLE: f"SELECT * FROM {analytics.INDICATORS_TABLE} ORDER BY symbol, date",
+        analytics.TECHNICAL_TABLE: f"SELECT * FROM {analytics.TECHNICAL_TABLE} ORDER BY symbol, date",
+    }
+    for table in analytics.ROLLUP_TABLES.values():
+        tables[table] = f"SELECT * FROM {table} ORDER BY symbol, period_start"
+
+    with closing(sqlite3.connect(db_path)) as conn:
+        return {table: conn.execute(sql).fetchall() for table, sql in tables.items()}
+
+
+def staged_rows(path: Path) -> int:
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {config.TABLE_NAME}").fetchone()[0]
+
+
+def run_main(root: Path, stub, *args: str):
+    env = {name: value for name, value in os.environ.items() if not name.startswith("ALPHA_VANTAGE_API_KEY")}
+    env.update({
+        "STOCKS": ",".join(SYMBOLS),
+        "ALPHA_VANTAGE_API_KEY": "test",
+        "API_BASE_URL": stub.url,
+        "API_REQUESTS_PER_MINUTE": "60000",
+        "API_REQUESTS_PER_DAY": "0",
+        "API_BURST": "100",
+        "HTTP_MAX_RETRIES": "0",
+        "TRANSFORM_WORKERS": "1",
+        "INDICATORS": INDICATORS,
+    })
+    result = subprocess.run([sys.executable, "main.py", *args], cwd=root, env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout[-3000:] + result.stderr[-3000:]
+
+
+def test_sharded_run_matches_an_unsharded_one(stub_api, tmp_path):
+    # both shards must have work
+    assert all(sharding.select_symbols(SYMBOLS, index, 2) for index in (1, 2))
+    stub_api.payloads = {symbol: make_payload(symbol, 60, seed=i) for i, symbol in enumerate(SYMBOLS)}
+
+    # each run gets its own copy of the code, so its data directories too
+    roots = {}
+    for name in ("single", "sharded"):
+        roots[name] = tmp_path / name
+        roots[name].mkdir()
+        for path in REPO_DIR.glob("*.py"):
+            shutil.copy(path, roots[name])
+
+    run_main(roots["single"], stub_api)
+    run_main(roots["sharded"], stub_api, "--shards", "2")
+
+    single = snapshot(roots["single"] / "database" / "stock_data.db")
+    sharded_db = roots["sharded"] / "database" / "stock_data.db"
+    sharded = snapshot(sharded_db)
+
+    # the extraction time stamps (the last column) are the only values that differ
+    assert [row[:-1] for row in sharded.pop(config.TABLE_NAME)] == \
+        [row[:-1] for row in single.pop(config.TABLE_NAME)]
+    assert len({row[0] for row in single[analytics.TECHNICAL_TABLE]}) == len(SYMBOLS)
+    assert sharded == single
+
+    staged = sorted(sharding.staging_dir(sharded_db).glob("*.db"))
+    assert len(staged) == 2
+    assert all(staged_rows(path) == 0 for path in staged)
+
+
+@pytest.fixture
+def merge_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATABASE_PATH", tmp_path / "database" / "stock_data.db")
+    monkeypatch.setattr(config, "ANALYTICS_ENABLED", True)
+    monkeypatch.setattr(config, "INDICATORS", INDICATORS)
+    return config.DATABASE_PATH
+
+
+def frames(days: int = 60) -> dict:
+    panel = make_panel(len(SYMBOLS), days)
+    panel["symbol"] = panel["symbol"].map(dict(zip(sorted(panel["symbol"].unique()), SYMBOLS)))
+    panel["daily_change_percentage"] = panel.groupby("symbol")["close_price"].pct_change() * 100
+    panel["extraction_timestamp"] = pd.Timestamp(datetime(2025, 10, 3, 18))
+    return {symbol: df.reset_index(drop=True) for symbol, df in panel.groupby("symbol", sort=False)}
+
+
+def load(path: Path, data: dict, monkeypatch, analytics_enabled: bool = True):
+    with monkeypatch.context() as patch:
+        patch.setattr(config, "ANALYTICS_ENABLED", analytics_enabled)
+        with SqliteBackend(path) as backend:
+            backend.create_schema()
+            for symbol, df in data.items():
+                backend.upsert(symbol, df)
+            backend.commit()
+
+
+def stage(db_path: Path, data: dict, monkeypatch, count: int = 2) -> list:
+    """Writes each shard's symbols to its staging database, as `main.py --shard i/count` does."""
+    paths = []
+    for index in range(1, count + 1):
+        path = sharding.staging_path(db_path, index, count)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        symbols = sharding.select_symbols(list(data), index, count)
+        load(path, {symbol: data[symbol] for symbol in symbols}, monkeypatch, analytics_enabled=False)
+        paths.append(path)
+    return paths
+
+
+def test_rerunning_a_failed_merge_matches_a_direct_load(merge_db, tmp_path, monkeypatch):
+    data = frames()
+    paths = stage(merge_db, data, monkeypatch)
+
+    commit_write = sharding.commit_write
+    commits = []
+
+    def failing_second_commit(conn):
+        commits.append(conn)
+        if len(commits) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        commit_write(conn)
+
+    monkeypatch.setattr(sharding, "commit_write", failing_second_commit)
+    assert not sharding.merge_shards()
+    # the first shard is merged, the failed one is still staged
+    assert staged_rows(paths[0]) == 0
+    assert staged_rows(paths[1]) > 0
+
+    assert sharding.merge_shards()
+    assert staged_rows(paths[1]) == 0
+
+    direct = tmp_path / "direct.db"
+    load(direct, data, monkeypatch)
+    assert snapshot(merge_db) == snapshot(direct)
+
+
+def test_merging_the_same_rows_again_changes_nothing(merge_db, tmp_path, monkeypatch):
+    paths = stage(merge_db, frames(), monkeypatch)
+    copies = [shutil.copy(path, tmp_path / path.name) for path in paths]
+
+    assert sharding.merge_shards()
+    merged = snapshot(merge_db)
+
+    # as if the staging tables were never emptied (their commit was lost)
+    for copy, path in zip(copies, paths):
+        shutil.copy(copy, path)
+    recomputes = []
+    monkeypatch.setattr(analytics, "update_symbol", lambda conn, symbol, from_date: recomputes.append(symbol))
+
+    assert sharding.merge_shards()
+    assert snapshot(merge_db) == merged
+    assert recomputes == []
+
+
+def test_merge_recomputes_analytics_from_the_first_new_row(merge_db, monkeypatch):
+    data = frames()
+    stage(merge_db, {symbol: df.iloc[:40] for symbol, df in data.items()}, monkeypatch)
+    assert sharding.merge_shards()
+
+    # the next fetch overlaps the rows already merged
+    stage(merge_db, data, monkeypatch)
+    starts = {}
+    monkeypatch.setattr(analytics, "update_symbol",
+                        lambda conn, symbol, from_date: starts.setdefault(symbol, from_date))
+    assert sharding.merge_shards()
+
+    assert starts == {symbol: df["date"].iat[40].isoformat() for symbol, df in data.items()}
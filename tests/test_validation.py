@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from transform import calculate_daily_change, records_to_frame, validate_columns, validate_with_pydantic
+
+EXTRACTED_AT = datetime(2024, 3, 1, 18, 30)
+
+GOOD = {"date": "2024-01-02", "open": 10.0, "high": 11.0, "low": 9.0, "close": 10.5, "volume": 1000}
+
+# row overrides -> whether StockDailyData accepts the row
+EDGE_ROWS = {
+    "valid": ({}, True),
+    "high below low": ({"high": 9.0, "low": 11.0}, False),
+    "high equals low": ({"high": 9.5, "low": 9.5, "open": 9.5, "close": 9.5}, True),
+    "zero open": ({"open": 0.0}, False),
+    "zero close": ({"close": 0.0}, False),
+    "negative low": ({"low": -1.0}, False),
+    "negative high and low": ({"high": -1.0, "low": -2.0}, False),
+    "negative volume": ({"volume": -5}, False),
+    "zero volume": ({"volume": 0}, True),
+    "NaN open": ({"open": np.nan}, False),
+    "NaN high": ({"high": np.nan}, False),
+    "NaN low": ({"low": np.nan}, False),
+    "NaN close": ({"close": np.nan}, False),
+    "NaN volume": ({"volume": np.nan}, False),
+    "fractional volume": ({"volume": 1000.5}, False),
+    "infinite volume": ({"volume": np.inf}, False),
+    "infinite low": ({"low": -np.inf}, False),
+    "missing date": ({"date": None}, False),
+    "unparsable date": ({"date": "2024-02-30"}, False),
+}
+
+
+def make_frame(rows: list) -> pd.DataFrame:
+    """Rows in the shape transform_stock_data validates: parsed columns plus the daily change."""
+    df = pd.DataFrame(rows, columns=["date", "open", "high", "low", "close", "volume"])
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["symbol"] = "AAPL"
+    return calculate_daily_change(df)
+
+
+def validate_both(df: pd.DataFrame, symbol: str = "AAPL"):
+    columnar, rejected = validate_columns(df, symbol, EXTRACTED_AT)
+    records = validate_with_pydantic(df, symbol, EXTRACTED_AT)
+    model = records_to_frame(records) if records else pd.DataFrame(columns=columnar.columns)
+    return columnar, rejected, model
+
+
+@pytest.mark.parametrize("overrides, accepted", EDGE_ROWS.values(), ids=EDGE_ROWS.keys())
+def test_single_row_parity(overrides, accepted):
+    columnar, rejected, model = validate_both(make_frame([{**GOOD, **overrides}]))
+
+    assert len(columnar) == len(model) == int(accepted)
+    assert len(rejected) == int(not accepted)
+    if not accepted:
+        assert rejected["reason"].iat[0]
+
+
+def test_mixed_frame_gives_the_same_rows():
+    dates = pd.bdate_range("2024-01-02", periods=len(EDGE_ROWS))
+    rows = [{**GOOD, "date": day.strftime("%Y-%m-%d"), **overrides}
+            for day, (overrides, _) in zip(dates, EDGE_ROWS.values())]
+    df = make_frame(rows)
+
+    columnar, rejected, model = validate_both(df)
+
+    pd.testing.assert_frame_equal(columnar, model, check_dtype=False)
+    expected = [accepted for _, accepted in EDGE_ROWS.values()]
+    assert sorted(rejected.index) == [i for i, ok in enumerate(expected) if not ok]
+
+
+@pytest.mark.parametrize("symbol", ["", "ABCDEFGHIJK"])
+def test_invalid_symbol_rejects_every_row(symbol):
+    columnar, rejected, model = validate_both(make_frame([GOOD, {**GOOD, "date": "2024-01-03"}]), symbol)
+
+    assert columnar.empty and model.empty
+    assert len(rejected) == 2
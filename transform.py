@@ -1,17 +1,51 @@
+import contextlib
+import io
 import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+import config
+import raw_archive
+from metrics import metrics
 from models import StockDailyData
+from series import DAILY, Series
+
+OUTPUT_COLUMNS = [
+    "symbol",
+    "date",
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "daily_change_percentage",
+    "extraction_timestamp"
+]
+
+PRICE_FIELDS = {
+    "open": "1. open",
+    "high": "2. high",
+    "low": "3. low",
+    "close": "4. close"
+}
+VOLUME_FIELD = "5. volume"
+
+# longest symbol StockDailyData accepts
+MAX_SYMBOL_LENGTH = 10
+
+# rejected rows printed individually by validate_columns
+MAX_REPORTED_ERRORS = 10
 
 def load_raw_json(filepath: Path) -> dict:
     print(f"Reading {filepath.name}...")
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = raw_archive.read_payload(filepath)
         print(f"Loaded {filepath.name}")
         return data
 
@@ -24,34 +58,61 @@ def load_raw_json(filepath: Path) -> dict:
         raise
 
 
-def parse_alpha_vantage_data(data: dict, symbol: str) -> pd.DataFrame:
+def parse_alpha_vantage_data(data: dict, symbol: str, since: Optional[str] = None,
+                             series: Series = DAILY) -> pd.DataFrame:
+    """
+        For intraday series the "date" column holds the bar's time stamp
+        (exchange time, as Alpha Vantage reports it).
+    """
     print(f"Parsing data for {symbol}...")
-    time_series = data.get("Time Series (Daily)", {})
+    time_series = data.get(series.key, {})
 
     if not time_series:
         raise ValueError(f"No time series data found for {symbol}")
 
-    rows = []
+    if since is not None:
+        # ISO dates and time stamps compare correctly as strings
+        time_series = {d: v for d, v in time_series.items() if d > since}
+
+        if not time_series:
+            print(f"No rows newer than {since} for {symbol}")
+            return pd.DataFrame(columns=["date", "open", "high", "low", "close", "volume"])
+
+    # straight from the mapping to typed column arrays: numpy parses the
+    # ISO date and numeric strings itself, no per-row dicts or float() calls
+    values = list(time_series.values())
+    dates = np.array(list(time_series.keys()), dtype=f"datetime64[{series.time_unit}]")
+    columns = {
+        name: np.array([v[field] for v in values], dtype=np.float64)
+        for name, field in PRICE_FIELDS.items()
+    }
+    volume = np.array([v[VOLUME_FIELD] for v in values], dtype=np.int64)
+
+    # Alpha Vantage returns newest first, so a reverse is usually enough
+    if len(dates) > 1 and np.all(dates[:-1] > dates[1:]):
+        order = slice(None, None, -1)
+    else:
+        order = np.argsort(dates, kind="stable")
 
-    for date_str, values in time_series.items():
-        row = {
-            "date": date_str,
-            "open": float(values["1. open"]),
-            "high": float(values["2. high"]),
-            "low": float(values["3. low"]),
-            "close": float(values["4. close"]),
-            "volume": int(values["5. volume"])
-        }
-        rows.append(row)
+    df = pd.DataFrame({
+        "date": dates[order].astype("datetime64[ns]"),
+        **{name: column[order] for name, column in columns.items()},
+        "volume": volume[order]
+    })
 
+    print(f"Parsed {len(df)} rows for {symbol}")
 
-    df = pd.DataFrame(rows)
-    df["date"] = pd.to_datetime(df["date"])
+    return df
 
-    df = df.sort_values("date").reset_index(drop=True)
 
-    print(f"Parsed {len(df)} rows for {symbol}")
+def load_parsed_columns(filepath: Path, symbol: str, since: Optional[str] = None) -> pd.DataFrame:
+    print(f"Reading parsed columns from {filepath.name}...")
+    df = raw_archive.read_columns(filepath)
 
+    if since is not None:
+        df = df[df["date"] > pd.Timestamp(since)].reset_index(drop=True)
+
+    print(f"Loaded {len(df)} rows for {symbol}")
     return df
 
 
@@ -68,9 +129,11 @@ def calculate_daily_change(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def validate_with_pydantic(df: pd.DataFrame, symbol: str) -> List[StockDailyData]:
+def validate_with_pydantic(df: pd.DataFrame, symbol: str,
+                           extraction_timestamp: Optional[datetime] = None) -> List[StockDailyData]:
 
     print(f"Validating data with Pydantic...")
+    extraction_timestamp = extraction_timestamp or datetime.now()
     validated_records = []
     errors = 0
 
@@ -85,7 +148,7 @@ def validate_with_pydantic(df: pd.DataFrame, symbol: str) -> List[StockDailyData
                 close_price=row["close"],
                 volume=row["volume"],
                 daily_change_percentage=row["daily_change_percentage"],
-                extraction_timestamp=datetime.now()
+                extraction_timestamp=extraction_timestamp
             )
 
             validated_records.append(stock_data)
@@ -99,36 +162,119 @@ def validate_with_pydantic(df: pd.DataFrame, symbol: str) -> List[StockDailyData
     return validated_records
 
 
-def transform_stock_data(filepath: Path, symbol: str) -> pd.DataFrame:
+def validate_columns(df: pd.DataFrame, symbol: str, extraction_timestamp: Optional[datetime] = None,
+                     series: Series = DAILY) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+        Columnar equivalent of validate_with_pydantic: applies the
+        StockDailyData rules as boolean masks over whole columns. Intraday
+        rows keep their time stamps in "date".
+
+        Returns (valid rows in OUTPUT_COLUMNS shape, rejected input rows with a
+        "reason" column).
+    """
+    print(f"Validating data (vectorized)...")
+    extraction_timestamp = extraction_timestamp or datetime.now()
+
+    symbol_ok = 1 <= len(symbol) <= MAX_SYMBOL_LENGTH
+
+    # a NaN compares False, so it fails "> 0" just like in pydantic
+    checks = [
+        (pd.Series(not symbol_ok, index=df.index),
+         f"symbol must be 1-{MAX_SYMBOL_LENGTH} characters"),
+        (df["date"].isna(), "date is missing"),
+        (~(df["open"] > 0), "open_price must be greater than 0"),
+        (~(df["high"] > 0), "high_price must be greater than 0"),
+        (~(df["low"] > 0), "low_price must be greater than 0"),
+        (~(df["close"] > 0), "close_price must be greater than 0"),
+        (df["low"] > df["high"], "low_price cannot be greater than high_price"),
+        (~(df["volume"] >= 0), "volume must be greater than or equal to 0"),
+    ]
+    if df["volume"].dtype.kind == "f":
+        # parsed volumes are integers; a float column (e.g. from a NaN) may
+        # hold fractions or infinities, which the model's int field rejects
+        checks.append(((df["volume"] % 1 != 0) & df["volume"].notna(), "volume must be a whole number"))
+
+    rejected_mask = pd.Series(False, index=df.index)
+    for mask, _ in checks:
+        rejected_mask |= mask
+
+    valid = df.loc[~rejected_mask]
+    df_validated = pd.DataFrame({
+        "symbol": symbol,
+        "date": valid["date"] if series.intraday else valid["date"].dt.date,
+        "open_price": valid["open"],
+        "high_price": valid["high"],
+        "low_price": valid["low"],
+        "close_price": valid["close"],
+        "volume": valid["volume"],
+        "daily_change_percentage": valid["daily_change_percentage"],
+        "extraction_timestamp": pd.Timestamp(extraction_timestamp).as_unit("ns"),
+    }, columns=OUTPUT_COLUMNS).reset_index(drop=True)
+
+    rejected = df.loc[rejected_mask].copy()
+    if not rejected.empty:
+        reasons = pd.Series("", index=rejected.index)
+        for mask, reason in checks:
+            hit = mask[rejected_mask]
+            reasons[hit] = reasons[hit] + reason + "; "
+        # every rejected row has at least one reason; drop the trailing "; "
+        rejected["reason"] = reasons.str[:-2]
+
+        for idx, reason in rejected["reason"].head(MAX_REPORTED_ERRORS).items():
+            print(f"Validation error on row {idx}: {reason}")
+        if len(rejected) > MAX_REPORTED_ERRORS:
+            print(f"... and {len(rejected) - MAX_REPORTED_ERRORS} more")
+
+    print(f"Validated {len(df_validated)} records ({len(rejected)} errors)")
+
+    return df_validated, rejected
+
+
+def records_to_frame(records: List[StockDailyData]) -> pd.DataFrame:
+    validated_dicts = [record.model_dump() for record in records]
+    return pd.DataFrame(validated_dicts)[OUTPUT_COLUMNS]
+
+
+def transform_stock_data(filepath: Path, symbol: str, since: Optional[str] = None,
+                         strict_model: bool = False, series: Series = DAILY,
+                         extraction_timestamp: Optional[datetime] = None) -> pd.DataFrame:
+    """
+        strict_model=True validates every row through the StockDailyData
+        model instead of the columnar checks (same result, much slower).
+    """
     print(f"TRANSFORMING: {symbol}")
 
-    raw_data = load_raw_json(filepath)
+    if strict_model and series.intraday:
+        raise ValueError("strict model validation only covers daily bars")
 
-    df = parse_alpha_vantage_data(raw_data, symbol)
+    columnar_path = filepath if raw_archive.is_columnar(filepath) else raw_archive.columnar_sidecar(filepath)
 
-    df["symbol"] = symbol
+    with metrics.timer(symbol, "parse_seconds"):
+        if columnar_path:
+            df = load_parsed_columns(columnar_path, symbol, since)
+        else:
+            raw_data = load_raw_json(filepath)
+            df = parse_alpha_vantage_data(raw_data, symbol, since, series)
+
+    if df.empty:
+        return pd.DataFrame()
 
-    df = calculate_daily_change(df)
+    metrics.add(symbol, "rows_parsed", len(df))
+    df["symbol"] = symbol
 
-    validated_records = validate_with_pydantic(df, symbol)
+    with metrics.timer(symbol, "validate_seconds"):
+        df = calculate_daily_change(df)
 
-    if validated_records:
-        validated_dicts = [record.model_dump() for record in validated_records]
-        df_validated = pd.DataFrame(validated_dicts)
+        if strict_model:
+            validated_records = validate_with_pydantic(df, symbol, extraction_timestamp)
+            df_validated = records_to_frame(validated_records) if validated_records else pd.DataFrame()
+        else:
+            df_validated, _ = validate_columns(df, symbol, extraction_timestamp, series)
 
-        column_order = [
-            "symbol",
-            "date",
-            "open_price",
-            "high_price",
-            "low_price",
-            "close_price",
-            "volume",
-            "daily_change_percentage",
-            "extraction_timestamp"
-        ]
-        df_validated = df_validated[column_order]
+    metrics.add(symbol, "rows_valid", len(df_validated))
+    metrics.add(symbol, "rows_rejected", len(df) - len(df_validated))
 
+    if not df_validated.empty:
         print(f"Transformation complete: {len(df_validated)} rows")
         return df_validated
     else:
@@ -136,29 +282,150 @@ def transform_stock_data(filepath: Path, symbol: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def transform_all_stocks(extracted_files: dict) -> dict:
-    print("STARTING DATA TRANSFORMATION")
-
-    transformed_data = {}
+def frame_to_columns(df: pd.DataFrame, time_unit: str = "D") -> Optional[dict]:
+    """
+        Compact form of a transformed frame for passing between processes:
+        one NumPy array per column and the per-symbol scalars stored once,
+        instead of pickling object columns of date/datetime values. Dates
+        are kept at the series' resolution (day, or second for intraday).
+    """
+    if df.empty:
+        return None
+
+    return {
+        "symbol": df["symbol"].iat[0],
+        "date": pd.to_datetime(df["date"]).to_numpy().astype(f"datetime64[{time_unit}]"),
+        "open_price": df["open_price"].to_numpy(),
+        "high_price": df["high_price"].to_numpy(),
+        "low_price": df["low_price"].to_numpy(),
+        "close_price": df["close_price"].to_numpy(),
+        "volume": df["volume"].to_numpy(),
+        "daily_change_percentage": df["daily_change_percentage"].to_numpy(),
+        "extraction_timestamp": df["extraction_timestamp"].iat[0],
+    }
+
+
+def columns_to_frame(columns: Optional[dict]) -> pd.DataFrame:
+    if columns is None:
+        return pd.DataFrame()
 
-    for symbol, filepath in extracted_files.items():
+    dates = columns["date"]
+    # one time stamp for the symbol, or one per row (replay keeps each raw file's)
+    extracted = columns["extraction_timestamp"]
+    return pd.DataFrame({
+        **columns,
+        # datetime64[D] -> datetime.date objects, as transform_stock_data
+        # returns; intraday time stamps stay datetime64
+        "date": dates.astype(object) if dates.dtype == "datetime64[D]" else dates.astype("datetime64[ns]"),
+        "extraction_timestamp": (np.asarray(extracted).astype("datetime64[ns]") if np.ndim(extracted)
+                                 else pd.Timestamp(extracted).as_unit("ns")),
+    }, columns=OUTPUT_COLUMNS)
+
+
+def transform_worker(filepath: Path, symbol: str, since: Optional[str], strict_model: bool,
+                     series: Series = DAILY, extraction_timestamp: Optional[datetime] = None
+                     ) -> Tuple[Optional[dict], Optional[str], str, dict]:
+    """
+        Process-pool entry point. Returns (columns, error, captured output,
+        the symbol's metrics); failures stay isolated to their symbol.
+    """
+    output = io.StringIO()
+    # a forked worker starts with a copy of the parent's metrics
+    metrics.take_symbol(symbol)
+
+    with contextlib.redirect_stdout(output):
         try:
-            df = transform_stock_data(filepath, symbol)
-
-            if not df.empty:
-                transformed_data[symbol] = df
-                print(f"\nSample data for {symbol}:")
-                print(df.head(3).to_string())
-                print(f"\n Stats:")
-                print(f"   Rows: {len(df)}")
-                print(f"   Date range: {df['date'].min()} to {df['date'].max()}")
-                print(f"   Avg daily change: {df['daily_change_percentage'].mean():.2f}%")
-
+            df = transform_stock_data(filepath, symbol, since, strict_model, series, extraction_timestamp)
+            return frame_to_columns(df, series.time_unit), None, output.getvalue(), metrics.take_symbol(symbol)
         except Exception as e:
-            print(f"Failed to transform {symbol}: {e}")
+            return None, str(e), output.getvalue(), metrics.take_symbol(symbol)
+
+
+def report_transformed(symbol: str, df: pd.DataFrame, since: Optional[str]) -> bool:
+    if df.empty and since is not None:
+        print(f"{symbol} is up to date (last stored {since})")
+        return True
+
+    if df.empty:
+        return False
+
+    print(f"\nSample data for {symbol}:")
+    print(df.head(3).to_string())
+    print(f"\n Stats:")
+    print(f"   Rows: {len(df)}")
+    print(f"   Date range: {df['date'].min()} to {df['date'].max()}")
+    print(f"   Avg daily change: {df['daily_change_percentage'].mean():.2f}%")
+    return True
+
+
+def transform_all_stocks(extracted_files: dict, watermarks: Optional[Dict[str, str]] = None,
+                         strict_model: bool = False, workers: Optional[int] = None,
+                         series: Series = DAILY) -> "StockPanel":
+    """
+        watermarks maps symbol -> last stored date (or bar time); only newer
+        rows are kept.
+
+        Returns a panel.StockPanel: a mapping of symbol -> DataFrame that
+        holds every symbol in compact columns and builds a symbol's frame
+        only when it is read. A symbol that is already up to date maps to
+        an empty DataFrame.
+
+        Symbols are transformed on a pool of `workers` processes (default
+        config.TRANSFORM_WORKERS); workers=1 runs serially in this process.
+    """
+    # panel.py builds on this module
+    from panel import StockPanel
+
+    print(f"STARTING DATA TRANSFORMATION ({series.name})")
+
+    watermarks = watermarks or {}
+    workers = config.TRANSFORM_WORKERS if workers is None else workers
+    workers = min(workers, len(extracted_files))
+    # every row of the run gets the same extraction time stamp
+    transformed_data = StockPanel(datetime.now(), series.time_unit)
+    extraction_timestamp = transformed_data.extraction_timestamp.to_pydatetime()
+
+    if workers <= 1:
+        for symbol, filepath in extracted_files.items():
+            since = watermarks.get(symbol)
+            try:
+                df = transform_stock_data(filepath, symbol, since, strict_model, series, extraction_timestamp)
+                if report_transformed(symbol, df, since):
+                    transformed_data.add(symbol, df)
+
+            except Exception as e:
+                print(f"Failed to transform {symbol}: {e}")
+
+    else:
+        print(f"transforming on {workers} processes")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                symbol: pool.submit(transform_worker, filepath, symbol, watermarks.get(symbol), strict_model,
+                                    series, extraction_timestamp)
+                for symbol, filepath in extracted_files.items()
+            }
+
+            for symbol, future in futures.items():
+                try:
+                    columns, error, output, symbol_metrics = future.result()
+                except Exception as e:
+                    # the worker process itself died
+                    columns, error, output, symbol_metrics = None, str(e), "", None
+
+                print(output, end="")
+                metrics.merge_symbol(symbol, symbol_metrics)
+
+                if error:
+                    print(f"Failed to transform {symbol}: {error}")
+                    continue
+
+                # the columns go into the panel as they are; the frame is
+                # only built for the report
+                if report_transformed(symbol, columns_to_frame(columns), watermarks.get(symbol)):
+                    transformed_data.add_columns(symbol, columns)
 
     print("TRANSFORMATION COMPLETE")
     print(f"Successfully transformed: {len(transformed_data)}/{len(extracted_files)} stocks")
+    print(f"in memory: {transformed_data.rows} rows, {transformed_data.nbytes / 1024 ** 2:.1f} MiB")
     return transformed_data
-
-